@@ -13,15 +13,76 @@ import RunControls from "./components/RunControls.tsx";
 import SendMessage from "./components/SendMessage.tsx";
 import type {
   AgentName,
+  HistorySessionNode,
   Message,
   LogMessage,
   MessageHistoryMap,
-  MessageHistoryState,
+  MessageHistoryUpdate,
+  RunStatus,
+  StateSnapshot,
 } from "./shared-types";
 
+// builds a finished session's messages from its parent's messages before the fork
+function renderSession(
+  sessions: MessageHistoryMap,
+  node: HistorySessionNode,
+): Message[] {
+  const parent = node.parent !== null ? sessions[node.parent] : undefined;
+  const fork = node.fork_timestamp;
+  const shared =
+    parent === undefined || fork === null
+      ? []
+      : parent.messages.filter((m) => m.timestamp < fork);
+  return [...shared, ...node.messages];
+}
+
+// merges a history update from the server into the sessions the client already has
+function applyHistoryUpdate(
+  prev: MessageHistoryMap | undefined,
+  prevSession: number | undefined,
+  update: MessageHistoryUpdate,
+): MessageHistoryMap {
+  const next: MessageHistoryMap =
+    update.truncated_from === 0 ? {} : { ...(prev ?? {}) };
+
+  // parents come before their children
+  const finished = Object.keys(update.sessions)
+    .map(Number)
+    .sort((a, b) => a - b);
+  for (const id of finished) {
+    const node = update.sessions[id];
+    next[id] = {
+      messages: renderSession(next, node),
+      current_session_reset_from: node.fork_timestamp ?? undefined,
+      current_session_score: node.score ?? undefined,
+    };
+  }
+
+  let base: Message[] = [];
+  if (update.truncated_from !== 0) {
+    const previous =
+      prevSession !== undefined ? next[prevSession] : undefined;
+    const previousMessages = previous?.messages ?? [];
+    const cutoff = update.truncated_from;
+    base =
+      cutoff === null
+        ? previousMessages
+        : previousMessages.filter((m) => m.timestamp < cutoff);
+  }
+
+  next[update.current_session] = {
+    messages: update.messages.length > 0 ? [...base, ...update.messages] : base,
+    current_session_reset_from: update.current_session_reset_from,
+    current_session_score: update.current_session_score,
+  };
+  return next;
+}
+
+// logs shown at most, as the server's log buffer holds
+const MAX_LOGS = 10000;
+
 const App: React.FC = () => {
   const [agents, setAgents] = useState<AgentName[]>([]);
-  const [timeStep, setTimeStep] = useState<number>(0);
   const [logs, setLogs] = useState<LogMessage[]>([]);
   const [numTasks, setNumTasks] = useState<number>(0);
   const [loopRunning, setLoopRunning] = useState<boolean>(false);
@@ -34,90 +95,62 @@ const App: React.FC = () => {
   );
   const [allTopics, setAllTopics] = useState<string[]>([]);
 
-  // timer to poll backend
-  useEffect(() => {
-    const interval = setInterval(() => {
-      setTimeStep(timeStep + 1);
-    }, 1000);
-    return () => clearInterval(interval);
-  }, [timeStep]);
-
+  // the server pushes a snapshot of its state, then a delta whenever part of it changes.
+  // EventSource reconnects by itself, and each connection starts with a fresh snapshot.
   useEffect(() => {
-    api
-      .get<AgentName[]>("/agents")
-      .then((response) => {
-        setAgents((prev) =>
-          _.isEqual(prev, response.data) ? prev : response.data,
-        );
-      })
-      .catch((error) => console.error("Error fetching agents:", error));
+    const source = new EventSource(api.defaults.baseURL + "/events");
+    // session the next history delta applies to
+    let historySession: number | undefined = undefined;
 
-    api
-      .get<Message[]>("/getMessageQueue")
-      .then((response) => {
-        setMessageQueue((prev) =>
-          _.isEqual(prev, response.data) ? prev : response.data,
-        );
-      })
-      .catch((error) => console.error("Error fetching messages:", error));
+    const onHistory = (update: MessageHistoryUpdate) => {
+      const prevSession = historySession;
+      historySession = update.current_session;
+      setSessionHistory((prev) =>
+        applyHistoryUpdate(prev, prevSession, update),
+      );
+      setCurrentSession(update.current_session);
+    };
+    const onStatus = (status: RunStatus) => {
+      setNumTasks(status.num_tasks);
+      setLoopRunning(status.loop_running);
+    };
 
-    api
-      .get<LogMessage[]>("/logs")
-      .then((response) =>
-        setLogs((prev) =>
-          _.isEqual(prev, response.data) ? prev : response.data,
-        ),
-      )
-      .catch((error) => console.error("Error fetching logs:", error));
+    source.addEventListener("snapshot", (event) => {
+      const snapshot: StateSnapshot = JSON.parse(event.data);
+      setAgents((prev) =>
+        _.isEqual(prev, snapshot.team.agents) ? prev : snapshot.team.agents,
+      );
+      setAllTopics((prev) =>
+        _.isEqual(prev, snapshot.team.topics) ? prev : snapshot.team.topics,
+      );
+      historySession = undefined;
+      onHistory(snapshot.history);
+      setMessageQueue(snapshot.queue);
+      onStatus(snapshot.status);
+      setLogs(snapshot.logs);
+    });
+    source.addEventListener("history", (event) =>
+      onHistory(JSON.parse(event.data)),
+    );
+    source.addEventListener("queue", (event) =>
+      setMessageQueue(JSON.parse(event.data)),
+    );
+    source.addEventListener("status", (event) =>
+      onStatus(JSON.parse(event.data)),
+    );
+    source.addEventListener("logs", (event) => {
+      const newLogs: LogMessage[] = JSON.parse(event.data);
+      // the server only keeps recent logs as well
+      setLogs((prev) => [...prev, ...newLogs].slice(-MAX_LOGS));
+    });
+    source.onerror = (error) => console.error("Event stream error:", error);
 
-    api
-      .get<number>("/num_tasks")
-      .then((response) =>
-        setNumTasks((prev) =>
-          _.isEqual(prev, response.data) ? prev : response.data,
-        ),
-      )
-      .catch((error) => console.error("Error fetching tasks:", error));
-
-    api
-      .get<MessageHistoryState>("/getSessionHistory")
-      .then((response) => {
-        const historyState = response.data;
-
-        setSessionHistory((prev) =>
-          _.isEqual(prev, historyState.message_history)
-            ? prev
-            : historyState.message_history,
-        );
-        setCurrentSession((prev) =>
-          _.isEqual(prev, historyState.current_session)
-            ? prev
-            : historyState.current_session,
-        );
-      })
-      .catch((error) => console.error("Error fetching history:", error));
-
-    api
-      .get<boolean>("/loop_status")
-      .then((response) => {
-        setLoopRunning((prev) =>
-          _.isEqual(prev, response.data) ? prev : response.data,
-        );
-      })
-      .catch((error) => console.error("Error fetching loop_status:", error));
-
-    api
-      .get<string[]>("/topics")
-      .then((response) => {
-        setAllTopics((prev) =>
-          _.isEqual(prev, response.data) ? prev : response.data,
-        );
-      })
-      .catch((error) => console.error("Error fetching topics:", error));
-  }, [timeStep]);
+    return () => source.close();
+  }, []);
 
+  // the pushed deltas update the view
   const onProcessNext = useCallback(() => {
-    step(() => setTimeStep((prev) => prev + 1));
+    step();
   }, []);
 
   const onDropNext = useCallback(() => {
@@ -125,15 +158,10 @@ const App: React.FC = () => {
       .post("/drop")
       .then((response) => {
         console.log("Message dropped:", response.data);
-        setTimeStep((prev) => prev + 1);
       })
       .catch((error) => console.error("Error dropping next:", error));
   }, []);
 
-  const onSend = useCallback(() => {
-    setTimeStep((prev) => prev + 1);
-  }, []);
-
   const setLoop = useCallback((state: "start" | "stop") => {
     if (state === "start") {
       api
@@ -200,7 +228,6 @@ const App: React.FC = () => {
             >
               <SendMessage
                 agents={memoizedAgents}
-                onSend={onSend}
                 topics={memoizedTopics}
               />
               <MessageQueue
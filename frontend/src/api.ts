@@ -9,12 +9,12 @@ export const api = axios.create({
   baseURL: url,
 });
 
-export const step = async (effectFn: () => void) => {
+export const step = async (effectFn?: () => void) => {
   api
     .post("/step")
     .then((response) => {
       console.log("Message processed:", response.data);
-      effectFn();
+      effectFn?.();
     })
     .catch((error) => console.error("Error processing next:", error));
 };
@@ -24,7 +24,7 @@ const LogList: React.FC<LogListProps> = ({ logs }) => {
         <h3 className="text-lg">Logs</h3>
       </button>
 
-      {show && logs.map((log, index) => <LogDisplay key={index} log={log} />)}
+      {show && logs.map((log) => <LogDisplay key={log.seq} log={log} />)}
     </div>
   );
 };
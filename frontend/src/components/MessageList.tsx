@@ -44,7 +44,7 @@ const MessageList: React.FC<MessageListProps> = memo(({ messageHistory }) => {
       <div className="space-y-1">
         {messageHistory.map((message) => (
           <MessageCard
-            key={`message.id-${message.timestamp}`}
+            key={`${message.id}-${message.timestamp}`}
             editId={message.timestamp}
             timestamp={message.timestamp}
             message={message}
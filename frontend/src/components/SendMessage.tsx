@@ -11,7 +11,6 @@ import DisplayMessage from "./MessageDisplays/DisplayMessage";
 
 interface SendMessageProps {
   agents: AgentName[];
-  onSend: () => void;
   topics: string[];
 }
 
@@ -108,7 +107,6 @@ const SendMessage: React.FC<SendMessageProps> = memo((props) => {
         })
         .then(() => {
           setErrorMessage("");
-          props.onSend();
           setNewMessage(
             makeDefaultMessage(messageInfoDict[selectedMessageType]),
           );
@@ -126,7 +124,6 @@ const SendMessage: React.FC<SendMessageProps> = memo((props) => {
         })
         .then(() => {
           setErrorMessage("");
-          props.onSend();
           setNewMessage(
             makeDefaultMessage(messageInfoDict[selectedMessageType]),
           );
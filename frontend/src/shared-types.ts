@@ -16,7 +16,8 @@ export interface Message {
   sender: string | null;
   drop?: boolean;
   timestamp: number;
-  id: number; // python object id
+  id: string; // runtime message id, or made from the timestamp for responses and thoughts
+  hash: string; // content hash, same for identical messages across sessions and runs
 }
 
 export interface MessageHistoryState {
@@ -28,6 +29,40 @@ export interface MessageHistoryMap {
   [sessionId: number]: MessageHistory;
 }
 
+// a finished session, sharing its parent's messages before fork_timestamp
+export interface HistorySessionNode {
+  parent: number | null;
+  fork_timestamp: number | null;
+  messages: Message[];
+  score: ScoreResult | null;
+}
+
+export interface MessageHistoryUpdate {
+  current_session: number;
+  version: number;
+  sessions: { [sessionId: number]: HistorySessionNode };
+  truncated_from: number | null;
+  messages: Message[];
+  last_timestamp: number | null;
+  has_more: boolean;
+  current_session_reset_from?: number;
+  current_session_score?: ScoreResult;
+}
+
+export interface RunStatus {
+  num_tasks: number;
+  loop_running: boolean;
+}
+
+// first event of the /events stream
+export interface StateSnapshot {
+  team: { agents: AgentName[]; topics: string[] };
+  history: MessageHistoryUpdate;
+  queue: Message[];
+  status: RunStatus;
+  logs: LogMessage[];
+}
+
 export interface ScoreResult {
   passed: boolean;
   first_timestamp: number | undefined;
@@ -43,6 +78,7 @@ export interface MessageHistory {
 }
 
 export interface LogMessage {
+  seq: number;
   message: string;
   level: string;
   name: string;
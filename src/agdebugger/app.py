@@ -1,14 +1,24 @@
 import logging
 import os
-from typing import List
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Tuple
 
 from autogen_core import EVENT_LOGGER_NAME
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from .backend import BackendRuntimeManager
-from .intervention_utils import write_file_async
+from .blobs import BLOB_STORE, hash_bytes
+from .checkpoint import CheckpointPolicy, CheckpointRetention
+from .compression import CompressionMiddleware
+from .encoding import NDJSON_MEDIA_TYPE, EncodedBody, EncodedJSONResponse, ResponseCache, iter_ndjson
+from .history import Direction
+from .history_log import HistoryLog
+from .intervention_utils import write_file_with_blobs_async
+from .log import RingBufferHandler
+from .metrics import PrometheusWriter
 from .serialization import deserialize
 from .types import (
     EditHistoryMessage,
@@ -23,13 +33,49 @@ logger = logging.getLogger(EVENT_LOGGER_NAME)
 logger.setLevel(logging.DEBUG)
 
 
-async def get_server(module_str: str, message_history=None, state_cache=None) -> FastAPI:
+def messages_etag(messages: List[Dict[str, Any]]) -> str:
+    """ETag of a list of serialized messages, from their ids, content hashes and timestamps."""
+    parts = [f"{m['id']}:{m['hash']}:{m['timestamp']}" for m in messages]
+    return '"' + hash_bytes("\n".join(parts).encode("utf-8")) + '"'
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def encoded_response(request: Request, encoded: EncodedBody) -> Response:
+    """Responds 304 if the client already has this body (by its ETag), otherwise with the body."""
+    if encoded.etag is None:
+        return EncodedJSONResponse(encoded.body)
+    if request.headers.get("if-none-match") == encoded.etag:
+        return Response(status_code=304, headers={"ETag": encoded.etag})
+    return EncodedJSONResponse(encoded.body, headers={"ETag": encoded.etag})
+
+
+async def get_server(
+    module_str: str,
+    message_history=None,
+    state_cache=None,
+    background_checkpoints: bool = False,
+    checkpoint_policy: CheckpointPolicy | None = None,
+    checkpoint_budget: int | None = None,
+    checkpoint_retention: CheckpointRetention | None = None,
+    history_log: HistoryLog | None = None,
+    log_handler: RingBufferHandler | None = None,
+    checkpoint_spill_path: str | None = None,
+) -> FastAPI:
     origins = [
         "http://localhost",
         "http://localhost:5173",
         "http://localhost:*",
     ]
-    app = FastAPI()
+
+    @asynccontextmanager
+    async def lifespan(_: FastAPI):
+        yield
+        backend.close()
+
+    app = FastAPI(lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=origins,
@@ -37,6 +83,8 @@ async def get_server(module_str: str, message_history=None, state_cache=None) ->
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    # large history and state responses compress well
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
     api = FastAPI(root_path="/api")
     app.mount("/api", api)
     ui_folder_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "web/dist")
@@ -45,9 +93,34 @@ async def get_server(module_str: str, message_history=None, state_cache=None) ->
 
     # load app and make backend
     loaded_gc = await load_app(module_str)
-    backend = BackendRuntimeManager(loaded_gc, logger, message_history, state_cache)
+    backend = BackendRuntimeManager(
+        loaded_gc,
+        logger,
+        message_history,
+        state_cache,
+        background_checkpoints,
+        checkpoint_policy,
+        checkpoint_budget,
+        checkpoint_retention,
+        history_log,
+        log_handler,
+        checkpoint_spill_path,
+    )
     await backend.async_initialize()
 
+    # encoded bodies of the larger responses, reused until the state they show changes
+    response_cache = ResponseCache()
+
+    def history_version() -> Tuple[int, int]:
+        return (backend.session_counter, backend.intervention_handler.history.version)
+
+    def cached_response(
+        request: Request, key: Any, version: Any, build: Callable[[], Any], messages: Callable[[Any], Any] | None = None
+    ) -> Response:
+        # with `messages`, the response gets an ETag from the messages in it
+        etag = None if messages is None else lambda content: messages_etag(messages(content))
+        return encoded_response(request, response_cache.get(key, version, build, etag))
+
     @api.get("/agents")
     async def get_agent_list() -> List[str]:
         if not backend.ready:
@@ -55,19 +128,136 @@ async def get_server(module_str: str, message_history=None, state_cache=None) ->
             return []
         return backend.agent_names
 
+    @api.get("/events")
+    async def events() -> StreamingResponse:
+        # server-sent events: a snapshot of the UI state, then deltas as it changes
+        return StreamingResponse(
+            backend.events.stream(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @api.get("/snapshot")
+    async def snapshot(request: Request, since: int | None = None) -> Response:
+        # refreshes the versions, so the ETag below is current
+        content = backend.get_snapshot(since)
+        etag = backend.versioned_state.etag
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return EncodedJSONResponse(content, headers={"ETag": etag})
+
     @api.get("/getMessageQueue")
-    async def get_messages():
-        message_queue = [message_to_json(msg) for msg in backend.message_queue_list]
-        return message_queue
+    async def get_messages(request: Request) -> Response:
+        return cached_response(
+            request,
+            "queue",
+            backend.versioned_state.section_version("queue"),
+            lambda: [message_to_json(msg) for msg in backend.message_queue_list],
+            lambda queue: queue,
+        )
 
     @api.get("/getSessionHistory")
-    async def getSessionHistory():
-        saved_sessions = backend.read_current_session_history()
-
-        return {
-            "current_session": backend.session_counter,
-            "message_history": saved_sessions,
-        }
+    async def getSessionHistory(
+        request: Request, session: int | None = None, since: int | None = None, limit: int | None = None
+    ) -> Response:
+        # streamed record by record to clients that accept NDJSON, see `iter_history_updates`
+        if wants_ndjson(request):
+            records = backend.iter_history_updates(-1 if session is None else session, since, limit)
+            return StreamingResponse(iter_ndjson(records), media_type=NDJSON_MEDIA_TYPE)
+
+        # with a cursor, only send what changed since the client's last poll
+        if session is not None:
+            return cached_response(
+                request,
+                ("session_history", session, since, limit),
+                history_version(),
+                lambda: backend.get_history_updates(session, since, limit),
+            )
+
+        return cached_response(
+            request,
+            "session_history",
+            history_version(),
+            lambda: {
+                "current_session": backend.session_counter,
+                "message_history": backend.read_current_session_history(),
+            },
+        )
+
+    @api.get("/history")
+    async def history_view(
+        request: Request,
+        agent: str | None = None,
+        topic: str | None = None,
+        direction: Direction = "all",
+        start: int | None = None,
+        end: int | None = None,
+        limit: int | None = None,
+    ) -> Response:
+        return cached_response(
+            request,
+            ("history", agent, topic, direction, start, end, limit),
+            history_version(),
+            lambda: backend.get_history_view(agent, topic, direction, start, end, limit),
+            lambda view: view["messages"],
+        )
+
+    @api.get("/history/range")
+    async def history_range(
+        request: Request, start: int | None = None, end: int | None = None, limit: int | None = None
+    ) -> Response:
+        if wants_ndjson(request):
+            # one message per line
+            messages = backend.intervention_handler.history.range_json(start, end, limit)
+            return StreamingResponse(iter_ndjson(messages), media_type=NDJSON_MEDIA_TYPE)
+
+        return cached_response(
+            request,
+            ("history_range", start, end, limit),
+            history_version(),
+            lambda: backend.get_history_range(start, end, limit),
+            lambda page: page["messages"],
+        )
+
+    @api.get("/history/query")
+    async def query_history(
+        request: Request,
+        sender: str | None = None,
+        recipient: str | None = None,
+        topic: str | None = None,
+        type: str | None = None,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> Response:
+        return cached_response(
+            request,
+            ("history_query", sender, recipient, topic, type, start, end),
+            history_version(),
+            lambda: backend.query_history(sender, recipient, topic, type, start, end),
+            lambda messages: messages,
+        )
+
+    @api.get("/history/identical/{content_hash}")
+    async def identical_messages(content_hash: str) -> List[Dict[str, int]]:
+        return backend.find_identical_messages(content_hash)
+
+    @api.get("/history/indexes")
+    async def history_indexes() -> Dict[str, List[str]]:
+        return backend.get_history_index_keys()
+
+    @api.get("/search")
+    async def search_history(request: Request, q: str, limit: int | None = None) -> Response:
+        return cached_response(
+            request,
+            ("search", q, limit),
+            history_version(),
+            lambda: backend.search_history(q, limit),
+            lambda messages: messages,
+        )
+
+    @api.get("/stats")
+    async def history_stats(request: Request) -> Response:
+        return cached_response(request, "stats", history_version(), backend.get_history_stats)
 
     @api.get("/num_tasks")
     async def get_outstanding_tasks() -> int:
@@ -115,7 +305,8 @@ async def get_server(module_str: str, message_history=None, state_cache=None) ->
     async def get_config(name: str):
         try:
             config = await backend.get_agent_config(name)
-            return config
+            # agent state can be large, so it is encoded without copying it through jsonable_encoder
+            return EncodedJSONResponse({"config": config.config, "state": config.state})
         except Exception as e:
             print("Error getting state: ", e)
             return {"status": "error", "message": str(e)}
@@ -170,13 +361,43 @@ async def get_server(module_str: str, message_history=None, state_cache=None) ->
         return {"status": "ok"}
 
     @api.get("/logs")
-    async def get_logs():
-        return backend.log_handler.get_log_messages()
+    async def get_logs(after: int | None = None, limit: int | None = None) -> Response:
+        # the buffered records with sequence numbers after `after`; the last one's is the next cursor.
+        # not cached: each poll passes a new cursor, so no entry would be reused
+        return EncodedJSONResponse(backend.log_handler.get_log_messages(after, limit))
+
+    @api.get("/metrics/checkpoints")
+    async def checkpoint_metrics(sizes: bool = True) -> Dict[str, Any]:
+        return backend.get_checkpoint_metrics(include_sizes=sizes)
+
+    @api.get("/metrics")
+    async def prometheus_metrics() -> Response:
+        return Response(backend.get_checkpoint_metrics_prometheus(), media_type=PrometheusWriter.CONTENT_TYPE)
+
+    @api.get("/blob/{blob_hash}")
+    async def get_blob(blob_hash: str, thumbnail: int | None = None) -> Response:
+        if blob_hash not in BLOB_STORE:
+            raise HTTPException(status_code=404, detail=f"Blob {blob_hash} not found")
+
+        # blobs are content addressed, so they never change
+        headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+        if thumbnail is not None:
+            try:
+                return Response(BLOB_STORE.thumbnail(blob_hash, thumbnail), media_type="image/png", headers=headers)
+            except Exception as e:
+                raise HTTPException(status_code=415, detail=f"Unable to make thumbnail: {e}") from e
+
+        return StreamingResponse(
+            BLOB_STORE.iter_chunks(blob_hash), media_type=BLOB_STORE.media_type(blob_hash), headers=headers
+        )
 
     @api.post("/save_to_file")
     async def save_to_file():
-        await write_file_async("history.pickle", backend.intervention_handler.history)
-        await write_file_async("cache.pickle", backend.agent_checkpoints)
+        await backend.flush_checkpoints()
+        if backend.history_log is not None:
+            backend.history_log.sync()
+        await write_file_with_blobs_async("history.pickle", backend.intervention_handler.history)
+        await write_file_with_blobs_async("cache.pickle", backend.agent_checkpoints)
 
         return {"status": "ok"}
 
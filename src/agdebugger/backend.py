@@ -1,10 +1,11 @@
 import asyncio
 import logging
-from typing import Any, Dict, List
+import sys
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Set, Tuple
 
 from autogen_agentchat.teams import BaseGroupChat
 from autogen_core import AgentId, DefaultTopicId, SingleThreadedAgentRuntime, TopicId
-from autogen_core._queue import Queue
 from autogen_core._single_threaded_agent_runtime import (
     PublishMessageEnvelope,
     ResponseMessageEnvelope,
@@ -12,12 +13,29 @@ from autogen_core._single_threaded_agent_runtime import (
     SendMessageEnvelope,
 )
 
+from .blobs import BLOB_STORE, externalize_blobs, iter_blob_refs
+from .checkpoint import CheckpointPolicy, CheckpointRetention, CheckpointStore, CheckpointWriter
+from .events import (
+    HISTORY_TRUNCATED,
+    LOG_EMITTED,
+    LOOP_CHANGED,
+    MESSAGE_ADDED,
+    QUEUE_CHANGED,
+    EventChannel,
+    VersionedState,
+)
+from .history import INDEX_FIELDS, Direction
+from .history_log import HistoryLog
 from .intervention import AgDebuggerInterventionHandler
-from .log import ListHandler  # , LogToHistoryHandler
+from .log import RingBufferHandler  # , LogToHistoryHandler
+from .metrics import CheckpointMetrics, PrometheusWriter
+from .replay import replay_messages
 from .serialization import get_message_type_descriptions
+from .sessions import SessionTree
 from .types import (
     AgentInfo,
     AGEPublishMessage,
+    AGEResponseMessage,
     AGESendMessage,
     MessageHistorySession,
     ScoreResult,
@@ -29,6 +47,32 @@ async def wait_for_future(fut):  # type: ignore
     await fut
 
 
+# the same queue class as the runtime's: it declares an asyncio queue, and uses autogen's copy before 3.13
+if TYPE_CHECKING or sys.version_info >= (3, 13):
+    from asyncio import Queue
+else:
+    from autogen_core._queue import Queue
+
+MessageEnvelope = PublishMessageEnvelope | SendMessageEnvelope | ResponseMessageEnvelope
+
+
+class NotifyingQueue(Queue[MessageEnvelope]):
+    """Runtime message queue that reports each message put into or taken from it."""
+
+    def __init__(self, on_change: Callable[[], None]) -> None:
+        super().__init__()
+        self.on_change = on_change
+
+    def _put(self, item: MessageEnvelope) -> None:
+        super()._put(item)
+        self.on_change()
+
+    def _get(self) -> MessageEnvelope:
+        item = super()._get()
+        self.on_change()
+        return item
+
+
 class BackendRuntimeManager:
     def __init__(
         self,
@@ -36,18 +80,62 @@ class BackendRuntimeManager:
         logger: logging.Logger,
         message_history=None,
         state_cache=None,
+        background_checkpoints: bool = False,
+        checkpoint_policy: CheckpointPolicy | None = None,
+        checkpoint_budget: int | None = None,
+        checkpoint_retention: CheckpointRetention | None = None,
+        history_log: HistoryLog | None = None,
+        log_handler: RingBufferHandler | None = None,
+        checkpoint_spill_path: str | None = None,
     ):
         self._groupchat = groupchat
         self.message_info = get_message_type_descriptions()
-        self.prior_histories: Dict[int, MessageHistorySession] = {}
+        self.prior_histories = SessionTree()
         self.session_counter = 0
         self.current_session_reset_from: int | None = None
-        self.agent_checkpoints = {} if state_cache is None else state_cache
+        self.agent_checkpoints = CheckpointStore.from_snapshots(
+            {} if state_cache is None else state_cache,
+            memory_budget=checkpoint_budget,
+            spill_path=checkpoint_spill_path,
+        )
+        self.checkpoint_writer = CheckpointWriter(
+            self.agent_checkpoints,
+            background=background_checkpoints,
+            policy=checkpoint_policy,
+            retention=checkpoint_retention,
+            history_log=history_log,
+        )
+        # timestamp of the last message delivered to each agent, to tell which agents changed since a checkpoint
+        self._agent_last_message: Dict[str, int] = {}
+        # agents that received messages since their state was last captured
+        self._unsaved_agents: Set[str] = set()
+        self._capture_counts = {"agents_saved": 0, "agents_total": 0}
+        # blobs of the agent states last sent to the UI, by agent
+        self._agent_state_blobs: Dict[str, Set[str]] = {}
+        self.checkpoint_metrics = CheckpointMetrics()
+        self._restore_counts = {"agents_loaded": 0, "agents_skipped": 0}
         self.run_context: RunContext | None = None
-        self.intervention_handler = AgDebuggerInterventionHandler(self.checkpoint_agents, message_history)
+        self.intervention_handler = AgDebuggerInterventionHandler(self.checkpoint_agents, message_history, history_log)
+        # a new log starts with whatever history and checkpoints were loaded
+        self.history_log = history_log
+        if history_log is not None and history_log.empty:
+            history_log.write_baseline(self.intervention_handler.history, self.agent_checkpoints)
         self.all_topics: List[str] = []
-        self.log_handler = ListHandler()
+        self.log_handler = RingBufferHandler() if log_handler is None else log_handler
+        self.log_handler.on_emit = lambda: self.intervention_handler.emit(LOG_EMITTED)
         logger.addHandler(self.log_handler)
+        # pushes state changes to the UI
+        self.events = EventChannel()
+        self.intervention_handler.listeners.append(self.events.emit)
+        self._pushed_history: Tuple[int, int | None] = (-1, None)
+        self._pushed_status: Dict[str, Any] | None = None
+        # sequence number of the last log record pushed
+        self._pushed_logs = -1
+        self._add_event_sections()
+        # the same state, versioned for polling clients
+        self.versioned_state = VersionedState()
+        self.intervention_handler.listeners.append(self.versioned_state.emit)
+        self._add_versioned_sections()
         self.ready = False
 
         print("Initial Backend loaded.")
@@ -68,6 +156,12 @@ class BackendRuntimeManager:
         if self.runtime._intervention_handlers is None:
             self.runtime._intervention_handlers = []
         self.runtime._intervention_handlers.append(self.intervention_handler)
+        self.watch_message_queue()
+
+        # create the team's agents up front so every checkpoint holds their state, including the
+        # initial one. Otherwise restoring a checkpoint from before an agent first ran would leave it as is.
+        for agent_name in self.agent_names:
+            await self.runtime._get_agent(AgentId(agent_name, self.agent_key))
 
         # load the last checkpoint - N.B. might be earlier than last message so we get the max key
         if len(self.intervention_handler.history) > 0:
@@ -75,9 +169,13 @@ class BackendRuntimeManager:
             print("resetting to checkpoint: ", last_checkpoint_time)
             checkpoint = self.agent_checkpoints.get(last_checkpoint_time)
             if checkpoint is not None:
+                start = time.perf_counter()
                 await self.runtime.load_state(checkpoint)
+                self.checkpoint_metrics.restore.observe(time.perf_counter() - start)
+                self.checkpoint_writer.mark_settled(last_checkpoint_time)
 
         self.ready = True
+        self.versioned_state.invalidate("agents", "topics")
         print("Finished backend async load")
 
     @property
@@ -115,6 +213,7 @@ class BackendRuntimeManager:
 
     def start_processing(self) -> None:
         self.runtime.start()
+        self.intervention_handler.emit(LOOP_CHANGED)
 
     async def process_next(self):
         await self.runtime.process_next()
@@ -124,29 +223,542 @@ class BackendRuntimeManager:
         # OR maybe below to stop immediatley
         # await self.runtime.stop()
 
-    async def checkpoint_agents(self, timestamp: int) -> None:
-        checkpoint = await self.runtime.save_state()
-        self.agent_checkpoints[timestamp] = checkpoint
+        # stopping replaces the runtime's queue
+        self.watch_message_queue()
+        self.intervention_handler.emit(LOOP_CHANGED)
+
+    def _new_message_queue(self) -> NotifyingQueue:
+        return NotifyingQueue(lambda: self.intervention_handler.emit(QUEUE_CHANGED))
+
+    def watch_message_queue(self) -> None:
+        """Swaps the runtime's message queue for one that raises queue change events."""
+        queue = self.runtime._message_queue
+        if isinstance(queue, NotifyingQueue):
+            return
+        watched = self._new_message_queue()
+        while not queue.empty():
+            watched.put_nowait(queue.get_nowait())
+        self.runtime._message_queue = watched
+
+    def _add_event_sections(self) -> None:
+        """Registers the parts of the state pushed to the UI, see `EventChannel`."""
+
+        def history_delta() -> Dict[str, Any] | None:
+            update = self.get_history_updates(*self._pushed_history)
+            self._pushed_history = (update["current_session"], update["last_timestamp"])
+            if not update["messages"] and not update["sessions"] and update["truncated_from"] is None:
+                return None
+            return update
+
+        def history_snapshot() -> Dict[str, Any]:
+            update = self.get_history_updates(-1)
+            self._pushed_history = (update["current_session"], update["last_timestamp"])
+            return update
+
+        def queue_snapshot() -> List[Dict[str, Any]]:
+            return [message_to_json(msg) for msg in self.message_queue_list]
+
+        def status_delta() -> Dict[str, Any] | None:
+            status = {"num_tasks": self.unprocessed_messages_count, "loop_running": self.is_processing}
+            if status == self._pushed_status:
+                return None
+            self._pushed_status = status
+            return status
+
+        def status_snapshot() -> Dict[str, Any]:
+            self._pushed_status = None
+            return status_delta()  # type: ignore[return-value]
+
+        def logs_delta() -> List[Any] | None:
+            new_logs = self.log_handler.get_log_messages(after=self._pushed_logs)
+            if not new_logs:
+                return None
+            self._pushed_logs = new_logs[-1]["seq"]
+            return new_logs
+
+        def logs_snapshot() -> List[Any]:
+            self._pushed_logs = -1
+            return logs_delta() or []
+
+        def team_snapshot() -> Dict[str, Any]:
+            return {"agents": self.agent_names if self.ready else [], "topics": self.all_topics}
+
+        self.events.add_section("team", lambda: None, team_snapshot)
+        self.events.add_section("history", history_delta, history_snapshot, [MESSAGE_ADDED, HISTORY_TRUNCATED])
+        self.events.add_section("queue", queue_snapshot, queue_snapshot, [QUEUE_CHANGED])
+        self.events.add_section("status", status_delta, status_snapshot, [QUEUE_CHANGED, LOOP_CHANGED])
+        self.events.add_section("logs", logs_delta, logs_snapshot, [LOG_EMITTED])
+
+    def _add_versioned_sections(self) -> None:
+        """Registers the sections of `/snapshot`, see `VersionedState`."""
+        state = self.versioned_state
+        state.add_section("agents", lambda: self.agent_names if self.ready else [])
+        state.add_section("topics", lambda: list(self.all_topics))
+        state.add_section(
+            "queue", lambda: [message_to_json(msg) for msg in self.message_queue_list], [QUEUE_CHANGED]
+        )
+        state.add_section(
+            "counters",
+            lambda: {
+                "num_tasks": self.unprocessed_messages_count,
+                "session": self.session_counter,
+                "history_version": self.intervention_handler.history.version,
+                "last_log_seq": self.log_handler.last_seq,
+            },
+            [QUEUE_CHANGED, MESSAGE_ADDED, HISTORY_TRUNCATED, LOG_EMITTED],
+        )
+        state.add_section("loop_running", lambda: self.is_processing, [LOOP_CHANGED])
+
+    def get_snapshot(self, since: int | None = None) -> Dict[str, Any]:
+        """
+        Returns the agents, queue, counters, loop status and topics in one response, with the
+        state version and a version per section. With `since`, only the sections changed after
+        that state version are included. The counters tell when to fetch history or logs.
+        """
+        return self.versioned_state.since(since)
+
+    async def checkpoint_agents(
+        self, timestamp: int, message: AGEPublishMessage | AGESendMessage | AGEResponseMessage
+    ) -> None:
+        """
+        Captures the state of the agents that received messages since the last checkpoint. The
+        others carry over from the previous checkpoint, so it still holds the full runtime state.
+        """
+        if self.checkpoint_writer.should_write(timestamp, message):
+            start = time.perf_counter()
+            # agents with handlers still running may change after the snapshot, so they stay unsaved
+            running = await self.running_agents()
+            checkpoint = await self.save_unsaved_agents()
+            capture_seconds = time.perf_counter() - start
+            self.checkpoint_metrics.save.observe(capture_seconds)
+            self.checkpoint_writer.write(
+                timestamp,
+                checkpoint,
+                capture_seconds=capture_seconds,
+                settled=running is not None and len(running) == 0,
+                partial=True,
+            )
+            if running is not None:
+                self._unsaved_agents = {str(agent_id) for agent_id in running}
+
+        await self.record_delivery(timestamp, message)
+
+    async def save_unsaved_agents(self) -> Dict[str, Any]:
+        latest = self.agent_checkpoints.latest_timestamp
+        checkpointed = set() if latest is None else self.agent_checkpoints.manifest(latest).keys()
+
+        states: Dict[str, Any] = {}
+        for agent_id in self.runtime._instantiated_agents:
+            agent = str(agent_id)
+            if agent in self._unsaved_agents or agent not in checkpointed:
+                start = time.perf_counter()
+                states[agent] = dict(await self.runtime.agent_save_state(agent_id))
+                self.checkpoint_metrics.agent_save[agent].observe(time.perf_counter() - start)
+
+        self._capture_counts["agents_saved"] += len(states)
+        self._capture_counts["agents_total"] += len(self.runtime._instantiated_agents)
+        return states
+
+    async def message_recipients(
+        self, message: AGEPublishMessage | AGESendMessage | AGEResponseMessage
+    ) -> List[AgentId]:
+        """Returns the agents that a message is delivered to."""
+        match message:
+            case AGEPublishMessage(topic_id=topic_id, sender=sender):
+                return await self._topic_recipients(topic_id, sender)
+            case AGESendMessage(recipient=recipient) | AGEResponseMessage(recipient=recipient):
+                return [] if recipient is None else [recipient]
+        return []
+
+    async def running_agents(self) -> Set[AgentId] | None:
+        """
+        Returns the agents whose message handlers are still running, or None if that cannot be told
+        from the runtime's delivery tasks.
+        """
+        running: Set[AgentId] = set()
+        for task in list(self.runtime._background_tasks):
+            frame = task.get_coro().cr_frame  # type: ignore[union-attr]
+            if frame is None:
+                # finished, waiting for its done callback
+                continue
+            match frame.f_locals.get("message_envelope"):
+                case SendMessageEnvelope(recipient=recipient):
+                    running.add(recipient)
+                case PublishMessageEnvelope(topic_id=topic_id, sender=sender):
+                    running.update(await self._topic_recipients(topic_id, sender))
+                case ResponseMessageEnvelope():
+                    # only resolves the future the requesting handler (in its own task) waits on
+                    pass
+                case _:
+                    return None
+        return running
+
+    async def _topic_recipients(self, topic_id: TopicId, sender: AgentId | None) -> List[AgentId]:
+        recipients = await self.runtime._subscription_manager.get_subscribed_recipients(topic_id)
+        # the runtime does not deliver a publish back to its sender
+        return [r for r in recipients if r != sender]
+
+    async def record_delivery(
+        self, timestamp: int, message: AGEPublishMessage | AGESendMessage | AGEResponseMessage
+    ) -> None:
+        for agent_id in await self.message_recipients(message):
+            self._agent_last_message[str(agent_id)] = timestamp
+            self._unsaved_agents.add(str(agent_id))
+
+    async def flush_checkpoints(self) -> None:
+        """Waits for all pending background checkpoint writes."""
+        await self.checkpoint_writer.barrier()
+
+    async def truncate_checkpoints(self, cutoff: int) -> None:
+        await self.checkpoint_writer.truncate(cutoff)
+        retention = self.checkpoint_writer.retention
+        if retention is not None and self.current_session_reset_from is not None:
+            # the current branch is restored from the checkpoint at or before its reset point
+            retention.pin(self.current_session_reset_from)
+        if self.history_log is not None:
+            self.history_log.truncate_checkpoints(cutoff)
+
+    def close(self) -> None:
+        # pending checkpoints are written to the history log before it closes
+        self.checkpoint_writer.close()
+        self.agent_checkpoints.close()
+        if self.history_log is not None:
+            self.history_log.close()
+        self.log_handler.close()
+
+    async def restore_checkpoint(self, timestamp: int) -> None:
+        """
+        Loads agent state as it was right before the message at `timestamp` was delivered. If that
+        timestamp has no checkpoint, the nearest earlier one is loaded and the recorded messages in
+        between are replayed.
+
+        Replay is exact when messages were stepped through one at a time. When the loop runs freely,
+        handlers that were still running when the nearest checkpoint was taken may be only partly
+        reflected in it, so replayed state can differ for those agents.
+        """
+        await self.checkpoint_writer.barrier(timestamp)
+
+        base_timestamp = self.agent_checkpoints.nearest_at_or_before(timestamp)
+        if base_timestamp is None:
+            print("[WARN] Was unable to find agent state checkpoint for time ", timestamp)
+            return
+
+        start = time.perf_counter()
+        await self.load_changed_agents(base_timestamp)
+        if base_timestamp < timestamp:
+            replayed = self.intervention_handler.history.range(base_timestamp, timestamp)
+            for m in replayed:
+                await self.record_delivery(m.timestamp, m.message)
+            await replay_messages(self.runtime, replayed)
+        self.checkpoint_metrics.restore.observe(time.perf_counter() - start)
+
+    async def load_changed_agents(self, timestamp: int) -> None:
+        """
+        Loads the checkpoint at `timestamp` into the runtime, skipping agents whose live state is
+        known to equal their checkpointed state: same blob hash as the last settled checkpoint and
+        no message delivered to them since.
+        """
+        writer = self.checkpoint_writer
+        manifest = self.agent_checkpoints.manifest(timestamp)
+        for agent, blob_hash in manifest.items():
+            agent_id = AgentId.from_str(agent)
+            if agent_id.type not in self.runtime._known_agent_names:
+                continue
+
+            unchanged = (
+                writer.settled_timestamp is not None
+                and writer.settled_manifest.get(agent) == blob_hash
+                and self._agent_last_message.get(agent, -1) < writer.settled_timestamp
+            )
+            if unchanged:
+                self._restore_counts["agents_skipped"] += 1
+                continue
+
+            start = time.perf_counter()
+            state = self.agent_checkpoints.load_blob(blob_hash, agent)
+            await self.runtime.agent_load_state(agent_id, state)
+            self.checkpoint_metrics.agent_restore[agent].observe(time.perf_counter() - start)
+            self._restore_counts["agents_loaded"] += 1
+
+        writer.mark_settled(timestamp)
+        self._agent_last_message = {}
+        self._unsaved_agents = set()
+
+    def get_checkpoint_metrics(self, include_sizes: bool = True) -> Dict[str, Any]:
+        metrics = {
+            "background": self.checkpoint_writer.background,
+            "timings": self.checkpoint_writer.timings_dict(),
+            "durations": self.checkpoint_metrics.to_dict(),
+            "memory_budget": self.agent_checkpoints.memory_budget,
+            "resident_bytes": self.agent_checkpoints.nbytes,
+            "tiers": self.agent_checkpoints.tier_stats(),
+            "restore": dict(self._restore_counts),
+            "capture": dict(self._capture_counts),
+            "num_checkpoints": len(self.agent_checkpoints),
+            "num_blobs": self.agent_checkpoints.num_blobs,
+        }
+        if include_sizes:
+            # pickled size of each agent's state at every checkpointed timestamp
+            metrics["snapshot_sizes"] = {
+                ts: self.agent_checkpoints.state_sizes(ts) for ts in sorted(self.agent_checkpoints.keys())
+            }
+        return metrics
+
+    def get_checkpoint_metrics_prometheus(self) -> str:
+        store = self.agent_checkpoints
+        latest = store.latest_timestamp
+        latest_sizes = {} if latest is None else store.state_sizes(latest)
+        metrics = self.checkpoint_metrics
+
+        writer = PrometheusWriter()
+        writer.summary("checkpoint_save_seconds", "Time to capture a checkpoint.", [({}, metrics.save)])
+        writer.summary(
+            "checkpoint_restore_seconds", "Time to restore agents from a checkpoint.", [({}, metrics.restore)]
+        )
+        writer.summary(
+            "checkpoint_agent_save_seconds",
+            "Time to save one agent's state.",
+            [({"agent": agent}, stats) for agent, stats in metrics.agent_save.items()],
+        )
+        writer.summary(
+            "checkpoint_agent_restore_seconds",
+            "Time to load one agent's state.",
+            [({"agent": agent}, stats) for agent, stats in metrics.agent_restore.items()],
+        )
+        writer.metric(
+            "checkpoint_agent_state_bytes",
+            "gauge",
+            "Pickled size of each agent's state in the latest checkpoint.",
+            [({"agent": agent}, size) for agent, size in latest_sizes.items()],
+        )
+        writer.metric(
+            "checkpoint_resident_bytes",
+            "gauge",
+            "Bytes of checkpoint data per storage tier.",
+            [({"tier": tier}, stats["bytes"]) for tier, stats in store.tier_stats().items()],
+        )
+        writer.metric("checkpoints", "gauge", "Number of stored checkpoints.", [({}, len(store))])
+        writer.metric("checkpoint_blobs", "gauge", "Number of distinct agent state blobs.", [({}, store.num_blobs)])
+        return writer.render()
 
     def get_current_history(self):
-        return [message_to_json(m.message, m.timestamp) for m in self.intervention_handler.history]
+        return self.intervention_handler.history.to_json()
+
+    def get_history_updates(self, session: int, since: int | None = None, limit: int | None = None) -> Dict[str, Any]:
+        """
+        Returns what changed in the session history since a client last saw it: the client sends
+        the session it was viewing and the last timestamp it has.
+
+        - `sessions`: sessions that finished since (the client's own session included), as
+          session tree nodes: parent, fork timestamp and the messages from the fork on. The
+          client renders a session from its parent's messages before the fork.
+        - `truncated_from`: if set, the client drops its current-session messages from this
+          timestamp on, as a revert replaced them. 0 means the client starts over.
+        - `messages`: up to `limit` current-session messages after the client's cursor
+        """
+        history = self.intervention_handler.history
+        current = self.session_counter
+
+        truncated_from: int | None = None
+        if session < 0 or session > current:
+            # unknown client state, send everything
+            sessions = dict(self.prior_histories.nodes)
+            truncated_from = 0
+            since = None
+        else:
+            sessions = {k: self.prior_histories.node(k) for k in range(session, current)}
+            reset_points: List[int] = [
+                ts for k in range(session + 1, current + 1) if (ts := self.session_reset_from(k)) is not None
+            ]
+            if reset_points:
+                reset_from = min(reset_points)
+                truncated_from = reset_from
+                since = reset_from - 1 if since is None else min(since, reset_from - 1)
+
+        messages = history.range_json(None if since is None else since + 1, None, limit)
+        last_timestamp = messages[-1]["timestamp"] if messages else since
+        return {
+            "current_session": current,
+            "version": history.version,
+            "sessions": sessions,
+            "truncated_from": truncated_from,
+            "messages": messages,
+            "last_timestamp": last_timestamp,
+            "has_more": history.count(None if last_timestamp is None else last_timestamp + 1) > 0,
+            "current_session_reset_from": self.current_session_reset_from,
+            "current_session_score": self.current_score,
+        }
+
+    def iter_history_updates(
+        self, session: int, since: int | None = None, limit: int | None = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        `get_history_updates` as a sequence of records, for streaming. The first has `kind`
+        "update" and holds the update without its sessions and messages. It is followed by each
+        finished session ("session") with its messages ("message"), then by the current session's
+        messages.
+        """
+        update = self.get_history_updates(session, since, limit)
+        sessions = update.pop("sessions")
+        messages = update.pop("messages")
+        yield {"kind": "update", **update}
+        for session_id, node in sessions.items():
+            yield {
+                "kind": "session",
+                "session": session_id,
+                "parent": node.parent,
+                "fork_timestamp": node.fork_timestamp,
+                "score": node.score,
+            }
+            for message in node.messages:
+                yield {"kind": "message", "session": session_id, "message": message}
+        for message in messages:
+            yield {"kind": "message", "session": update["current_session"], "message": message}
+
+    def get_history_range(
+        self, start: int | None = None, end: int | None = None, limit: int | None = None
+    ) -> Dict[str, Any]:
+        """Returns a page of current-session messages with `start <= timestamp < end`."""
+        history = self.intervention_handler.history
+        messages = history.range_json(start, end, limit)
+        next_start = None
+        if messages and history.count(messages[-1]["timestamp"] + 1, end) > 0:
+            next_start = messages[-1]["timestamp"] + 1
+        return {"version": history.version, "messages": messages, "next": next_start}
+
+    def session_reset_from(self, session: int) -> int | None:
+        """Returns the timestamp a session's history was reset from."""
+        if session == self.session_counter:
+            return self.current_session_reset_from
+        return self.prior_histories.node(session).fork_timestamp
 
     def get_current_history_raw_type(self):
         return self.intervention_handler.history
 
+    def query_history(
+        self,
+        sender: str | None = None,
+        recipient: str | None = None,
+        topic: str | None = None,
+        message_type: str | None = None,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Returns the current session's messages matching all given filters, see `HistoryStore.query`."""
+        return self.intervention_handler.history.query_json(sender, recipient, topic, message_type, start, end)
+
+    def get_history_index_keys(self) -> Dict[str, List[str]]:
+        history = self.intervention_handler.history
+        return {field: history.keys(field) for field in INDEX_FIELDS}
+
+    def subscribed_topics(self, agent: str) -> List[str]:
+        """Returns the topic types in the current history that an agent type is subscribed to."""
+        subscriptions = self.runtime._subscription_manager.subscriptions
+        topics = []
+        for topic_type in self.intervention_handler.history.keys("topic"):
+            topic_id = TopicId(topic_type, self.agent_key)
+            for subscription in subscriptions:
+                if subscription.is_match(topic_id) and subscription.map_to_agent(topic_id).type == agent:
+                    topics.append(topic_type)
+                    break
+        return topics
+
+    def get_history_view(
+        self,
+        agent: str | None = None,
+        topic: str | None = None,
+        direction: Direction = "all",
+        start: int | None = None,
+        end: int | None = None,
+        limit: int | None = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns a page of one agent's messages and/or one topic's traffic in the current
+        session, see `HistoryStore.view`. `next` is the start of the following page.
+        """
+        history = self.intervention_handler.history
+        subscribed = () if agent is None else self.subscribed_topics(agent)
+        # one message past the page tells where the next one starts
+        messages = history.view_json(agent, subscribed, direction, topic, start, end, None if limit is None else limit + 1)
+        next_start = None
+        if limit is not None and len(messages) > limit:
+            next_start = messages[limit]["timestamp"]
+            messages = messages[:limit]
+        return {"version": history.version, "messages": messages, "next": next_start}
+
+    def get_agent_history(self, agent: str, direction: Direction = "all") -> List[Dict[str, Any]]:
+        """Returns the messages an agent type sent, received or both in the current session."""
+        messages: List[Dict[str, Any]] = self.get_history_view(agent=agent, direction=direction)["messages"]
+        return messages
+
+    def get_topic_history(self, topic: str) -> List[Dict[str, Any]]:
+        """Returns the messages published to a topic type in the current session."""
+        messages: List[Dict[str, Any]] = self.get_history_view(topic=topic)["messages"]
+        return messages
+
+    def search_history(self, query: str, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        Returns the current-session messages whose text matches a query, in timestamp order. A
+        query matches words, `"quoted phrases"` and `prefix*` words; a leading `^` anchors a word
+        or phrase to the start of the message text.
+        """
+        return self.intervention_handler.history.search_json(query, limit)
+
+    def find_identical_messages(self, content_hash: str) -> List[Dict[str, int]]:
+        """
+        Returns the sessions and timestamps of the messages with a content hash, across finished
+        sessions and the current one. Messages a session shares with its parent are reported once,
+        under the session that recorded them.
+        """
+        found: List[Dict[str, int]] = []
+        for session, node in self.prior_histories.nodes.items():
+            found.extend(
+                {"session": session, "timestamp": m["timestamp"]}
+                for m in node.messages
+                if m.get("hash") == content_hash
+            )
+        history = self.intervention_handler.history
+        found.extend(
+            {"session": self.session_counter, "timestamp": m["timestamp"]}
+            for m in history.range_json(self.current_session_reset_from)
+            if m["hash"] == content_hash
+        )
+        return found
+
+    def get_history_stats(self) -> Dict[str, Any]:
+        """Returns aggregate statistics of the current session's messages."""
+        return self.intervention_handler.history.columns.stats()
+
     def save_history_session_from_reset(self, new_reset_from: int) -> None:
-        self.prior_histories[self.session_counter] = MessageHistorySession(
-            messages=self.get_current_history(),
-            current_session_reset_from=self.current_session_reset_from,
-            next_session_starts_at=None,
-            current_session_score=self.current_score,
+        # only the messages since this session forked from its parent are stored
+        self.prior_histories.add(
+            self.session_counter,
+            parent=self.session_counter - 1 if self.session_counter > 0 else None,
+            fork_timestamp=self.current_session_reset_from,
+            messages=self.intervention_handler.history.range_json(self.current_session_reset_from),
+            score=self.current_score,
         )
 
         self.session_counter += 1
         self.current_session_reset_from = new_reset_from
 
+    def release_unreferenced_blobs(self) -> int:
+        """
+        Drops the in-memory blobs that no session, queued message or agent state shown to the UI
+        refers to, e.g. those of messages that were serialized but never kept. Returns the number
+        dropped. Blobs of live messages are stored again whenever they are serialized.
+        """
+        live: Set[str] = set()
+        for node in self.prior_histories.nodes.values():
+            live.update(iter_blob_refs(node.messages))
+        live.update(iter_blob_refs(self.intervention_handler.history.range_json()))
+        live.update(iter_blob_refs([message_to_json(msg) for msg in self.message_queue_list]))
+        for hashes in self._agent_state_blobs.values():
+            live.update(hashes)
+        return BLOB_STORE.retain(live)
+
     def read_current_session_history(self):
-        saved_sessions = self.prior_histories.copy()
+        saved_sessions = dict(self.prior_histories)
 
         # save current messages
         saved_sessions[self.session_counter] = MessageHistorySession(
@@ -161,7 +773,8 @@ class BackendRuntimeManager:
         agent_id = await self.runtime.get(agent_name, key=self.agent_key)
 
         if agent_id in self.runtime._instantiated_agents:
-            agent_state = await self.runtime.agent_save_state(agent_id)
+            agent_state = externalize_blobs(await self.runtime.agent_save_state(agent_id), BLOB_STORE)
+            self._agent_state_blobs[agent_name] = set(iter_blob_refs(agent_state))
         else:
             agent_state = "Agent not instantiated yet!"
 
@@ -200,7 +813,7 @@ class BackendRuntimeManager:
 
         current_queue[edit_idx].message = new_message
 
-        newQueue = Queue()
+        newQueue = self._new_message_queue()
         for item in current_queue:
             await newQueue.put(item)
         self.runtime._message_queue = newQueue
@@ -216,6 +829,8 @@ class BackendRuntimeManager:
 
         self.save_history_session_from_reset(cutoff_timestamp)
         self.intervention_handler.purge_history_after_cutoff(cutoff_timestamp)
+        await self.truncate_checkpoints(cutoff_timestamp + 1)
+        self.release_unreferenced_blobs()
 
         # edit actual message and add to queue
         if new_message is None:
@@ -234,11 +849,7 @@ class BackendRuntimeManager:
             )
 
         # NOTE: reset can be slow if heavy state so performing after message is sent.
-        checkpoint = self.agent_checkpoints.get(cutoff_timestamp, None)
-        if checkpoint is not None:
-            await self.runtime.load_state(checkpoint)
-        else:
-            print("[WARN] Was unable to find agent state checkpoint for time ", cutoff_timestamp)
+        await self.restore_checkpoint(cutoff_timestamp)
 
 
     async def revert_message(self, cutoff_timestamp: int):
@@ -254,15 +865,6 @@ class BackendRuntimeManager:
         self.intervention_handler.purge_history_after_cutoff(cutoff_timestamp + 1)
 
         # Prune checkpoints to match truncated history
-        self.agent_checkpoints = {
-            ts: checkpoint 
-            for ts, checkpoint in self.agent_checkpoints.items() 
-            if ts < cutoff_timestamp + 1
-        }
-
-        checkpoint = self.agent_checkpoints.get(cutoff_timestamp, None)
-        if checkpoint is not None:
-            await self.runtime.load_state(checkpoint)
-        else:
-            print("[WARN] Was unable to find agent state checkpoint for time ", cutoff_timestamp)
-        
\ No newline at end of file
+        await self.truncate_checkpoints(cutoff_timestamp + 1)
+        self.release_unreferenced_blobs()
+        await self.restore_checkpoint(cutoff_timestamp)
@@ -0,0 +1,275 @@
+"""Content-addressed storage for large binary payloads (images, base64 data) referenced from history and checkpoints"""
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+import pickle
+import re
+import threading
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Tuple
+
+from autogen_core import Image
+
+# strings at least this long that decode as base64 are stored as blobs
+MIN_BLOB_BYTES = 4096
+
+_BASE64_RE = re.compile(r"[A-Za-z0-9+/]+={0,2}")
+_DATA_URI_RE = re.compile(r"data:([\w.+-]+/[\w.+-]+);base64,")
+
+_MAGIC_MEDIA_TYPES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"RIFF", "image/webp"),
+]
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def guess_media_type(data: bytes) -> str:
+    for magic, media_type in _MAGIC_MEDIA_TYPES:
+        if data.startswith(magic):
+            return media_type
+    return "application/octet-stream"
+
+
+def decode_base64_text(text: str, min_bytes: int = MIN_BLOB_BYTES) -> Tuple[bytes, str] | None:
+    """
+    Returns the decoded bytes and media type of a large base64 string or data URI, or None if
+    the string is short or not base64.
+    """
+    if len(text) < min_bytes:
+        return None
+
+    media_type = None
+    payload = text
+    match = _DATA_URI_RE.match(text)
+    if match is not None:
+        media_type = match.group(1)
+        payload = text[match.end() :]
+
+    if len(payload) % 4 != 0 or _BASE64_RE.fullmatch(payload) is None:
+        return None
+    try:
+        data = base64.b64decode(payload, validate=True)
+    except binascii.Error:
+        return None
+    return data, media_type or guess_media_type(data)
+
+
+class BlobStore:
+    """
+    Stores blobs by the hash of their content, so a screenshot shared between many messages
+    and agent states is kept once. Blobs are held in memory, or written to `directory` and read
+    back on demand when one is given.
+    """
+
+    def __init__(self, directory: str | None = None, min_bytes: int = MIN_BLOB_BYTES) -> None:
+        self.directory = directory
+        self.min_bytes = min_bytes
+        self._blobs: Dict[str, bytes] = {}
+        self._media_types: Dict[str, str] = {}
+        self._thumbnails: Dict[Tuple[str, int], bytes] = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, blob_hash: object) -> bool:
+        if blob_hash in self._media_types:
+            return True
+        if not isinstance(blob_hash, str) or self.directory is None:
+            return False
+        try:
+            return os.path.exists(self._path(blob_hash))
+        except KeyError:
+            return False
+
+    def __len__(self) -> int:
+        return len(self._media_types)
+
+    def put(self, data: bytes, media_type: str | None = None) -> str:
+        blob_hash = hash_bytes(data)
+        with self._lock:
+            if blob_hash not in self._media_types:
+                self._media_types[blob_hash] = media_type or guess_media_type(data)
+                if self.directory is None:
+                    self._blobs[blob_hash] = data
+                else:
+                    os.makedirs(self.directory, exist_ok=True)
+                    with open(self._path(blob_hash), "wb") as f:
+                        f.write(data)
+        return blob_hash
+
+    def get(self, blob_hash: str) -> bytes:
+        with self.open(blob_hash) as f:
+            return f.read()
+
+    def media_type(self, blob_hash: str) -> str:
+        media_type = self._media_types.get(blob_hash)
+        if media_type is None:
+            with self.open(blob_hash) as f:
+                media_type = self._media_types[blob_hash] = guess_media_type(f.read(16))
+        return media_type
+
+    def open(self, blob_hash: str) -> BinaryIO:
+        if blob_hash in self._blobs:
+            return io.BytesIO(self._blobs[blob_hash])
+        if blob_hash not in self:
+            raise KeyError(f"Blob {blob_hash} not found")
+        return open(self._path(blob_hash), "rb")
+
+    def iter_chunks(self, blob_hash: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with self.open(blob_hash) as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def thumbnail(self, blob_hash: str, max_size: int = 256) -> bytes:
+        """Returns a PNG no larger than `max_size` on either side of an image blob."""
+        key = (blob_hash, max_size)
+        thumbnail = self._thumbnails.get(key)
+        if thumbnail is None:
+            from PIL import Image as PILImage
+
+            with self.open(blob_hash) as f:
+                image = PILImage.open(f)
+                image.thumbnail((max_size, max_size))
+                buffer = io.BytesIO()
+                image.save(buffer, format="PNG")
+            thumbnail = self._thumbnails[key] = buffer.getvalue()
+        return thumbnail
+
+    def put_text(self, text: str) -> Dict[str, Any] | None:
+        """Stores a large base64 string and returns a reference to it, or None if it is not one."""
+        decoded = decode_base64_text(text, self.min_bytes)
+        if decoded is None:
+            return None
+        data, media_type = decoded
+        blob_hash = self.put(data, media_type)
+        return {
+            "type": "BlobRef",
+            "hash": blob_hash,
+            "media_type": media_type,
+            "size": len(data),
+            "data_uri": text.startswith("data:"),
+        }
+
+    def get_text(self, ref: Dict[str, Any]) -> str:
+        encoded = base64.b64encode(self.get(ref["hash"])).decode("ascii")
+        if ref.get("data_uri"):
+            return f"data:{ref['media_type']};base64,{encoded}"
+        return encoded
+
+    def retain(self, live: Iterable[str]) -> int:
+        """
+        Drops the blobs held in memory that are not in `live`, and their thumbnails. Returns the
+        number dropped. Blobs written to the directory are kept, as saved files refer to them.
+        """
+        live = set(live)
+        with self._lock:
+            dropped = [blob_hash for blob_hash in self._blobs if blob_hash not in live]
+            for blob_hash in dropped:
+                del self._blobs[blob_hash]
+                del self._media_types[blob_hash]
+            self._thumbnails = {key: data for key, data in self._thumbnails.items() if key[0] in live}
+        return len(dropped)
+
+    def _path(self, blob_hash: str) -> str:
+        # hashes are hex, which also keeps request paths from escaping the directory
+        if not re.fullmatch(r"[0-9a-f]+", blob_hash):
+            raise KeyError(f"Invalid blob hash {blob_hash}")
+        return os.path.join(self.directory, blob_hash)  # type: ignore[arg-type]
+
+
+def externalize_blobs(value: Any, store: BlobStore) -> Any:
+    """Replaces large base64 strings in JSON-like data with blob references."""
+    if isinstance(value, str):
+        ref = store.put_text(value)
+        return value if ref is None else ref
+    if isinstance(value, dict):
+        return {k: externalize_blobs(v, store) for k, v in value.items()}
+    if isinstance(value, list):
+        return [externalize_blobs(v, store) for v in value]
+    return value
+
+
+def iter_blob_refs(value: Any) -> Iterator[str]:
+    """Yields the hashes of the blob references in JSON-like data."""
+    if isinstance(value, dict):
+        if value.get("type") == "BlobRef" and "hash" in value:
+            yield value["hash"]
+            return
+        for v in value.values():
+            yield from iter_blob_refs(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from iter_blob_refs(v)
+
+
+def internalize_blobs(value: Any, store: BlobStore) -> Any:
+    """Inverse of `externalize_blobs`: replaces blob references with the original strings."""
+    if isinstance(value, dict):
+        if value.get("type") == "BlobRef" and "hash" in value:
+            return store.get_text(value)
+        return {k: internalize_blobs(v, store) for k, v in value.items()}
+    if isinstance(value, list):
+        return [internalize_blobs(v, store) for v in value]
+    return value
+
+
+class BlobPickler(pickle.Pickler):
+    """Pickles images and large base64 strings as references into a BlobStore."""
+
+    def __init__(self, file: BinaryIO, store: BlobStore, protocol: int = pickle.HIGHEST_PROTOCOL) -> None:
+        super().__init__(file, protocol=protocol)
+        self.store = store
+
+    def persistent_id(self, obj: Any) -> Any:
+        if isinstance(obj, Image):
+            return ("image", self.store.put(base64.b64decode(obj.to_base64()), "image/png"))
+        if isinstance(obj, str) and len(obj) >= self.store.min_bytes:
+            ref = self.store.put_text(obj)
+            if ref is not None:
+                return ("text", ref["hash"], ref["media_type"], ref["data_uri"])
+        return None
+
+
+class BlobUnpickler(pickle.Unpickler):
+    def __init__(self, file: BinaryIO, store: BlobStore) -> None:
+        super().__init__(file)
+        self.store = store
+
+    def persistent_load(self, pid: Any) -> Any:
+        match pid:
+            case ("image", blob_hash):
+                return Image.from_base64(base64.b64encode(self.store.get(blob_hash)).decode("ascii"))
+            case ("text", blob_hash, media_type, data_uri):
+                return self.store.get_text({"hash": blob_hash, "media_type": media_type, "data_uri": data_uri})
+        raise pickle.UnpicklingError(f"Unknown blob reference {pid}")
+
+
+def dumps_with_blobs(obj: Any, store: BlobStore) -> bytes:
+    buffer = io.BytesIO()
+    BlobPickler(buffer, store).dump(obj)
+    return buffer.getvalue()
+
+
+def loads_with_blobs(data: bytes, store: BlobStore) -> Any:
+    return BlobUnpickler(io.BytesIO(data), store).load()
+
+
+def blob_dir_for(path: str) -> str:
+    """Directory holding the blobs referenced by a pickle file written with `dumps_with_blobs`."""
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "blobs")
+
+
+def load_pickle_with_blobs(path: str) -> Any:
+    """Loads a pickle file, resolving blob references from the blobs directory next to it."""
+    with open(path, "rb") as f:
+        return BlobUnpickler(f, BlobStore(blob_dir_for(path))).load()
+
+
+# shared store for serialized history and agent states served to the UI
+BLOB_STORE = BlobStore()
@@ -0,0 +1,926 @@
+"""Content-addressed, delta-encoded storage for agent state checkpoints"""
+
+import asyncio
+import bisect
+import copy
+import logging
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, MutableMapping, Set, Tuple
+
+from autogen_agentchat.teams._group_chat._events import GroupChatRequestPublish, GroupChatStart
+
+from .blobs import hash_bytes
+from .history_log import HistoryLog
+from .types import AGEPublishMessage, AGEResponseMessage, AGESendMessage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Replace:
+    value: Any
+
+
+@dataclass
+class ListAppend:
+    items: List[Any]
+
+
+@dataclass
+class DictDelta:
+    changed: Dict[str, Any]
+    removed: List[str]
+    nested: Dict[str, "StateDelta"]
+
+
+StateDelta = Replace | ListAppend | DictDelta
+
+
+def diff_state(old: Any, new: Any) -> StateDelta | None:
+    """
+    Computes the delta that turns `old` into `new`, or None if they are equal.
+
+    Dicts are diffed key by key and lists that only grew at the end (model contexts,
+    message threads) are stored as the appended items.
+    """
+    if old is new:
+        return None
+
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed: Dict[str, Any] = {}
+        nested: Dict[str, StateDelta] = {}
+        for key, value in new.items():
+            if key not in old:
+                changed[key] = value
+                continue
+            delta = diff_state(old[key], value)
+            if isinstance(delta, Replace):
+                changed[key] = delta.value
+            elif delta is not None:
+                nested[key] = delta
+        removed = [key for key in old if key not in new]
+
+        if not changed and not removed and not nested:
+            return None
+        return DictDelta(changed=changed, removed=removed, nested=nested)
+
+    if isinstance(old, list) and isinstance(new, list):
+        prefix_len = len(old)
+        if len(new) >= prefix_len and new[:prefix_len] == old:
+            if len(new) == prefix_len:
+                return None
+            return ListAppend(items=new[prefix_len:])
+        return Replace(value=new)
+
+    if type(old) is type(new) and old == new:
+        return None
+    return Replace(value=new)
+
+
+def apply_state_diff(base: Any, delta: StateDelta | None) -> Any:
+    """
+    Applies a delta produced by `diff_state` to `base`.
+
+    `base` is updated in place where possible, so callers must pass a private copy.
+    """
+    match delta:
+        case None:
+            return base
+        case Replace(value=value):
+            return copy.deepcopy(value)
+        case ListAppend(items=items):
+            base.extend(copy.deepcopy(items))
+            return base
+        case DictDelta(changed=changed, removed=removed, nested=nested):
+            for key in removed:
+                base.pop(key, None)
+            for key, value in changed.items():
+                base[key] = copy.deepcopy(value)
+            for key, sub_delta in nested.items():
+                base[key] = apply_state_diff(base[key], sub_delta)
+            return base
+    raise TypeError(f"Unknown state delta: {delta}")
+
+
+@dataclass
+class StateBlob:
+    # full state when parent is None, otherwise a delta against the parent blob
+    parent: str | None
+    # pickled size of the payload
+    nbytes: int
+    # hot tier: the state or delta object
+    payload: Any = None
+    # warm tier: zlib-compressed pickle of the payload. Cold blobs have neither and live in the spill file.
+    compressed: bytes | None = None
+    # pickled size of the full state this blob reconstructs
+    state_nbytes: int = 0
+    # number of deltas between this blob and the full state at the end of its chain
+    depth: int = 0
+    # pickled size of those deltas, i.e. what a restore reads on top of the full state
+    chain_nbytes: int = 0
+
+    @property
+    def tier(self) -> str:
+        if self.payload is not None:
+            return "hot"
+        if self.compressed is not None:
+            return "warm"
+        return "cold"
+
+
+def dump_state(state: Any) -> bytes:
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class BlobSpillFile:
+    """Append-only SQLite file holding compressed blobs evicted from memory."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL)")
+
+    def put_many(self, blobs: List[Tuple[str, bytes]]) -> None:
+        """Writes blobs in a single transaction."""
+        self._conn.executemany("INSERT OR REPLACE INTO blobs (hash, data) VALUES (?, ?)", blobs)
+        self._conn.commit()
+
+    def get(self, blob_hash: str) -> bytes:
+        row = self._conn.execute("SELECT data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+        if row is None:
+            raise KeyError(f"Blob {blob_hash} not found in {self.path}")
+        data: bytes = row[0]
+        return data
+
+    def nbytes(self, blob_hashes: List[str]) -> int:
+        """Returns the stored size of the blobs, without reading them."""
+        total = 0
+        for blob_hash in blob_hashes:
+            row = self._conn.execute("SELECT length(data) FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+            if row is not None:
+                total += row[0]
+        return total
+
+    def delete(self, blob_hashes: List[str]) -> None:
+        self._conn.executemany("DELETE FROM blobs WHERE hash = ?", [(h,) for h in blob_hashes])
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+class CheckpointStore(MutableMapping[int, Mapping[str, Any]]):
+    """
+    Maps timestamps to full runtime state snapshots (as returned by `runtime.save_state()`)
+    while storing every distinct per-agent state only once.
+
+    Per-agent states are content addressed: a checkpoint is a manifest of agent id to blob
+    hash, so agents that did not change between timestamps (or returned to an earlier state)
+    share one blob. New blobs are stored as a delta against the agent's previous blob, so
+    growing model contexts are not copied once per message. A blob is stored as a full state
+    instead once its chain would exceed `max_chain` deltas, or once the deltas would add up to
+    more than the full state, so restoring any checkpoint reads a bounded chain.
+
+    With a memory budget, blobs are tiered by recency: the most recently used stay as objects
+    (hot, up to half the budget), older ones are kept zlib-compressed (warm) and once hot and warm
+    exceed the budget the oldest are spilled to a SQLite file (cold) and read back on demand.
+    Without a `spill_path`, the file goes in a temporary directory that `close` removes.
+
+    Snapshots are expected to be freshly built objects (as `save_state` returns), since the
+    store keeps references into them rather than copying.
+    """
+
+    def __init__(self, memory_budget: int | None = None, spill_path: str | None = None, max_chain: int = 32) -> None:
+        self._blobs: Dict[str, StateBlob] = {}
+        self._manifests: Dict[int, Dict[str, str]] = {}
+        # checkpointed timestamps in order, for bisect lookups
+        self._timestamps: List[int] = []
+        # last full state per agent, used to diff the next snapshot against
+        self._heads: Dict[str, Tuple[str, Any]] = {}
+        # per agent, the sorted timestamps at which its state changed
+        self._changes: Dict[str, List[int]] = {}
+        # hot and warm blob hashes, least recently used first
+        self._hot: OrderedDict[str, None] = OrderedDict()
+        self._warm: OrderedDict[str, None] = OrderedDict()
+        self._tier_bytes = {"hot": 0, "warm": 0, "cold": 0}
+        self.memory_budget = memory_budget
+        self.max_chain = max_chain
+        self._spill_path = spill_path
+        self._spill: BlobSpillFile | None = None
+        # temporary directory of the spill file when no spill path was given, removed on close
+        self._spill_dir: str | None = None
+        # checkpoints may be written from a background thread (see CheckpointWriter)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_snapshots(cls, snapshots: Mapping[int, Mapping[str, Any]], **kwargs: Any) -> "CheckpointStore":
+        if isinstance(snapshots, CheckpointStore):
+            if kwargs.get("memory_budget") is not None:
+                snapshots.set_memory_budget(kwargs["memory_budget"], kwargs.get("spill_path"))
+            return snapshots
+
+        store = cls(**kwargs)
+        for timestamp in sorted(snapshots.keys()):
+            store[timestamp] = snapshots[timestamp]
+        return store
+
+    def __setitem__(self, timestamp: int, snapshot: Mapping[str, Any]) -> None:
+        with self._lock:
+            self._set_manifest(timestamp, {agent: self._add_blob(agent, state) for agent, state in snapshot.items()})
+            self._enforce_budget()
+
+    def set_partial(self, timestamp: int, states: Mapping[str, Any]) -> None:
+        """
+        Adds a checkpoint holding new states for only some agents. Agents not in `states` keep the
+        blob they had in the latest earlier checkpoint.
+        """
+        with self._lock:
+            previous = self.nearest_at_or_before(timestamp)
+            manifest = {} if previous is None else dict(self._manifests[previous])
+            manifest.update({agent: self._add_blob(agent, state) for agent, state in states.items()})
+            self._set_manifest(timestamp, manifest)
+            self._enforce_budget()
+
+    def last_changed(self, agent: str, timestamp: int | None = None) -> int | None:
+        """Returns the latest checkpoint (at or before `timestamp`) in which the agent's state changed."""
+        with self._lock:
+            changes = self._changes.get(agent, [])
+            index = len(changes) if timestamp is None else bisect.bisect_right(changes, timestamp)
+            return changes[index - 1] if index > 0 else None
+
+    def __getitem__(self, timestamp: int) -> Dict[str, Any]:
+        with self._lock:
+            manifest = self._manifests[timestamp]
+            return {agent: self.load_blob(blob_hash, agent) for agent, blob_hash in manifest.items()}
+
+    def __delitem__(self, timestamp: int) -> None:
+        # blobs are only dropped by collect_garbage since other blobs may be deltas against them
+        with self._lock:
+            del self._manifests[timestamp]
+            del self._timestamps[bisect.bisect_left(self._timestamps, timestamp)]
+            self._rebuild_change_index()
+
+    def __iter__(self) -> Iterator[int]:
+        with self._lock:
+            return iter(list(self._timestamps))
+
+    def __len__(self) -> int:
+        return len(self._manifests)
+
+    def __contains__(self, timestamp: object) -> bool:
+        return timestamp in self._manifests
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(timestamps={len(self._manifests)}, blobs={len(self._blobs)})"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self.__dict__.copy()
+            # heads are full copies of the latest states, rebuild them on load instead of pickling
+            state["_heads"] = {}
+            del state["_lock"]
+            # the spill file is not part of the pickle, so cold blobs are written out compressed
+            state["_spill"] = None
+            state["_spill_path"] = None
+            state["_spill_dir"] = None
+            state["_blobs"] = {
+                blob_hash: blob
+                if blob.tier != "cold"
+                else StateBlob(
+                    parent=blob.parent,
+                    nbytes=blob.nbytes,
+                    compressed=self._read_compressed(blob_hash),
+                    state_nbytes=blob.state_nbytes,
+                )
+                for blob_hash, blob in self._blobs.items()
+            }
+            state["_warm"] = OrderedDict(
+                (blob_hash, None) for blob_hash, blob in state["_blobs"].items() if blob.tier == "warm"
+            )
+            state["_tier_bytes"] = {
+                "hot": self._tier_bytes["hot"],
+                "warm": sum(len(blob.compressed) for blob in state["_blobs"].values() if blob.compressed is not None),
+                "cold": 0,
+            }
+            return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+        if "_spill_dir" not in state:
+            self._spill_dir = None
+        if "_timestamps" not in state:
+            self._timestamps = sorted(self._manifests)
+        if "_changes" not in state:
+            self._rebuild_change_index()
+        if "max_chain" not in state:
+            # stores pickled before chains were bounded have no chain lengths yet
+            self.max_chain = 32
+            self._update_chains()
+
+    @property
+    def num_blobs(self) -> int:
+        return len(self._blobs)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory: pickled size of hot blobs plus compressed size of warm blobs."""
+        return self._tier_bytes["hot"] + self._tier_bytes["warm"]
+
+    def tier_stats(self) -> Dict[str, Dict[str, int]]:
+        """Returns the number of blobs and bytes held in each storage tier."""
+        with self._lock:
+            counts = {"hot": 0, "warm": 0, "cold": 0}
+            for blob in self._blobs.values():
+                counts[blob.tier] += 1
+            return {tier: {"blobs": counts[tier], "bytes": self._tier_bytes[tier]} for tier in counts}
+
+    @property
+    def latest_timestamp(self) -> int | None:
+        with self._lock:
+            return self._timestamps[-1] if self._timestamps else None
+
+    def set_memory_budget(self, memory_budget: int | None, spill_path: str | None = None) -> None:
+        with self._lock:
+            self.memory_budget = memory_budget
+            if spill_path is not None:
+                self._spill_path = spill_path
+            self._enforce_budget()
+
+    def close(self) -> None:
+        """
+        Closes the spill file, and removes it if the store created it. Spilled checkpoints can no
+        longer be read afterwards.
+        """
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+            if self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+                self._spill_path = None
+
+    def nearest_at_or_before(self, timestamp: int) -> int | None:
+        """Returns the latest checkpointed timestamp that is not after `timestamp`."""
+        with self._lock:
+            index = bisect.bisect_right(self._timestamps, timestamp)
+            return self._timestamps[index - 1] if index > 0 else None
+
+    def state_sizes(self, timestamp: int) -> Dict[str, int]:
+        """Returns the pickled size of each agent's full state in a checkpoint."""
+        with self._lock:
+            return {
+                agent: self._blobs[blob_hash].state_nbytes for agent, blob_hash in self._manifests[timestamp].items()
+            }
+
+    def manifest(self, timestamp: int) -> Dict[str, str]:
+        """Returns the agent id to blob hash map of a checkpoint."""
+        return self._manifests[timestamp]
+
+    def load_blob(self, blob_hash: str, agent: str | None = None) -> Any:
+        """Reconstructs the full agent state stored under a blob hash."""
+        with self._lock:
+            if agent is not None:
+                head = self._heads.get(agent)
+                if head is not None and head[0] == blob_hash:
+                    return copy.deepcopy(head[1])
+
+            payloads: List[Any] = []
+            current: str | None = blob_hash
+            while current is not None:
+                payloads.append(self._payload(current))
+                current = self._blobs[current].parent
+
+        state = copy.deepcopy(payloads[-1])
+        for delta in reversed(payloads[:-1]):
+            state = apply_state_diff(state, delta)
+        return state
+
+    def truncate(self, cutoff: int) -> None:
+        """
+        Removes all checkpoints at or after the cutoff timestamp and drops blobs that are no
+        longer referenced.
+        """
+        with self._lock:
+            self._manifests = {ts: manifest for ts, manifest in self._manifests.items() if ts < cutoff}
+            del self._timestamps[bisect.bisect_left(self._timestamps, cutoff) :]
+            for changes in self._changes.values():
+                del changes[bisect.bisect_left(changes, cutoff) :]
+            self.collect_garbage()
+
+    def collect_garbage(self) -> None:
+        """Drops blobs that no remaining checkpoint depends on."""
+        with self._lock:
+            live = set()
+            for manifest in self._manifests.values():
+                for blob_hash in manifest.values():
+                    current: str | None = blob_hash
+                    while current is not None and current not in live:
+                        live.add(current)
+                        current = self._blobs[current].parent
+
+            dead = [blob_hash for blob_hash in self._blobs if blob_hash not in live]
+            self._release_blobs(dead)
+            for blob_hash in dead:
+                del self._blobs[blob_hash]
+
+            self._heads = {agent: head for agent, head in self._heads.items() if head[0] in live}
+
+    def drop(self, timestamps: Iterable[int]) -> None:
+        """
+        Removes the given checkpoints and frees their blobs. Deltas of the remaining checkpoints
+        are rebased onto their nearest remaining ancestor first, so intermediate states can be freed.
+        """
+        with self._lock:
+            for timestamp in timestamps:
+                self._manifests.pop(timestamp, None)
+            self._timestamps = sorted(self._manifests)
+            self._rebuild_change_index()
+            self._rebase_orphaned_deltas()
+            self.collect_garbage()
+            self._enforce_budget()
+
+    def _set_manifest(self, timestamp: int, manifest: Dict[str, str]) -> None:
+        previous = self.nearest_at_or_before(timestamp)
+        previous_manifest = {} if previous is None else self._manifests[previous]
+        for agent, blob_hash in manifest.items():
+            if previous_manifest.get(agent) != blob_hash:
+                changes = self._changes.setdefault(agent, [])
+                if changes and changes[-1] >= timestamp:
+                    bisect.insort(changes, timestamp)
+                else:
+                    changes.append(timestamp)
+        if timestamp not in self._manifests:
+            if self._timestamps and self._timestamps[-1] > timestamp:
+                bisect.insort(self._timestamps, timestamp)
+            else:
+                self._timestamps.append(timestamp)
+        self._manifests[timestamp] = manifest
+
+    def _rebuild_change_index(self) -> None:
+        self._changes = {}
+        previous: Dict[str, str] = {}
+        for timestamp in self._timestamps:
+            manifest = self._manifests[timestamp]
+            for agent, blob_hash in manifest.items():
+                if previous.get(agent) != blob_hash:
+                    self._changes.setdefault(agent, []).append(timestamp)
+            previous = manifest
+
+    def _rebase_orphaned_deltas(self) -> None:
+        referenced = {blob_hash for manifest in self._manifests.values() for blob_hash in manifest.values()}
+
+        rebased: Dict[str, str | None] = {}
+        for blob_hash in referenced:
+            parent = self._blobs[blob_hash].parent
+            ancestor = parent
+            while ancestor is not None and ancestor not in referenced:
+                ancestor = self._blobs[ancestor].parent
+            if ancestor != parent:
+                rebased[blob_hash] = ancestor
+
+        # compute all new payloads before changing any chain they are read through
+        payloads: Dict[str, Tuple[str | None, Any]] = {}
+        for blob_hash, ancestor in rebased.items():
+            state = self.load_blob(blob_hash)
+            delta = None if ancestor is None else diff_state(self.load_blob(ancestor), state)
+            payloads[blob_hash] = (None, state) if delta is None else (ancestor, delta)
+
+        self._release_blobs(list(payloads.keys()))
+        for blob_hash, (parent, payload) in payloads.items():
+            blob = self._blobs[blob_hash]
+            blob.parent, blob.payload, blob.compressed = parent, payload, None
+            blob.nbytes = len(dump_state(payload))
+            self._hot[blob_hash] = None
+            self._tier_bytes["hot"] += blob.nbytes
+        if payloads:
+            self._update_chains()
+
+    def _update_chains(self) -> None:
+        """Recomputes the chain length and size of every blob, after their parents changed."""
+        done: Set[str] = set()
+        for blob_hash in self._blobs:
+            path: List[str] = []
+            current: str | None = blob_hash
+            while current is not None and current not in done:
+                path.append(current)
+                current = self._blobs[current].parent
+            for link in reversed(path):
+                blob = self._blobs[link]
+                if blob.parent is None:
+                    blob.depth, blob.chain_nbytes = 0, 0
+                else:
+                    parent = self._blobs[blob.parent]
+                    blob.depth, blob.chain_nbytes = parent.depth + 1, parent.chain_nbytes + blob.nbytes
+                done.add(link)
+
+    def _release_blobs(self, blob_hashes: List[str]) -> None:
+        """Frees the tier storage of blobs, leaving them without data."""
+        spilled = []
+        for blob_hash in blob_hashes:
+            blob = self._blobs[blob_hash]
+            tier = blob.tier
+            if tier == "hot":
+                del self._hot[blob_hash]
+                self._tier_bytes["hot"] -= blob.nbytes
+            elif tier == "warm":
+                del self._warm[blob_hash]
+                self._tier_bytes["warm"] -= len(blob.compressed)  # type: ignore[arg-type]
+            else:
+                spilled.append(blob_hash)
+            blob.payload, blob.compressed = None, None
+        if spilled and self._spill is not None:
+            self._tier_bytes["cold"] -= self._spill.nbytes(spilled)
+            self._spill.delete(spilled)
+
+    def _add_blob(self, agent: str, state: Any) -> str:
+        head = self._head(agent)
+        delta = None if head is None else diff_state(head[1], state)
+        if head is not None and delta is None:
+            return head[0]
+
+        data = dump_state(state)
+        blob_hash = hash_bytes(data)
+        if blob_hash not in self._blobs:
+            blob = StateBlob(parent=None, nbytes=len(data), payload=state, state_nbytes=len(data))
+            if head is not None:
+                parent = self._blobs[head[0]]
+                delta_nbytes = len(dump_state(delta))
+                chain_nbytes = parent.chain_nbytes + delta_nbytes
+                # past either bound, a full state is cheaper to restore than the chain
+                if parent.depth < self.max_chain and chain_nbytes <= len(data):
+                    blob = StateBlob(
+                        parent=head[0],
+                        nbytes=delta_nbytes,
+                        payload=delta,
+                        state_nbytes=len(data),
+                        depth=parent.depth + 1,
+                        chain_nbytes=chain_nbytes,
+                    )
+            self._blobs[blob_hash] = blob
+            self._hot[blob_hash] = None
+            self._tier_bytes["hot"] += blob.nbytes
+
+        self._heads[agent] = (blob_hash, state)
+        return blob_hash
+
+    def _head(self, agent: str) -> Tuple[str, Any] | None:
+        head = self._heads.get(agent)
+        if head is None:
+            # rebuild from the latest change of this agent (after load or truncation); later
+            # checkpoints that have the agent share that blob
+            changes = self._changes.get(agent)
+            if not changes:
+                return None
+            blob_hash = self._manifests[changes[-1]][agent]
+            head = (blob_hash, self.load_blob(blob_hash))
+            self._heads[agent] = head
+        return head
+
+    def _payload(self, blob_hash: str) -> Any:
+        blob = self._blobs[blob_hash]
+        if blob.payload is not None:
+            self._hot.move_to_end(blob_hash)
+            return blob.payload
+        if blob.compressed is not None:
+            self._warm.move_to_end(blob_hash)
+        return pickle.loads(zlib.decompress(self._read_compressed(blob_hash)))
+
+    def _read_compressed(self, blob_hash: str) -> bytes:
+        blob = self._blobs[blob_hash]
+        if blob.compressed is not None:
+            return blob.compressed
+        if blob.payload is not None:
+            return zlib.compress(dump_state(blob.payload))
+        if self._spill is None:
+            raise KeyError(f"Blob {blob_hash} was spilled but no spill file is open")
+        return self._spill.get(blob_hash)
+
+    def _enforce_budget(self) -> None:
+        if self.memory_budget is None:
+            return
+
+        while self._hot and self._tier_bytes["hot"] > self.memory_budget // 2:
+            blob_hash, _ = self._hot.popitem(last=False)
+            blob = self._blobs[blob_hash]
+            blob.compressed = zlib.compress(dump_state(blob.payload))
+            blob.payload = None
+            self._warm[blob_hash] = None
+            self._tier_bytes["hot"] -= blob.nbytes
+            self._tier_bytes["warm"] += len(blob.compressed)
+
+        spilled: List[Tuple[str, bytes]] = []
+        while self._warm and self.nbytes > self.memory_budget:
+            blob_hash, _ = self._warm.popitem(last=False)
+            blob = self._blobs[blob_hash]
+            compressed: bytes = blob.compressed  # type: ignore[assignment]
+            spilled.append((blob_hash, compressed))
+            blob.compressed = None
+            self._tier_bytes["warm"] -= len(compressed)
+            self._tier_bytes["cold"] += len(compressed)
+        if spilled:
+            self._open_spill().put_many(spilled)
+
+    def _open_spill(self) -> BlobSpillFile:
+        if self._spill is None:
+            if self._spill_path is None:
+                self._spill_dir = tempfile.mkdtemp(prefix="agdebugger-")
+                self._spill_path = os.path.join(self._spill_dir, "checkpoints.sqlite")
+            self._spill = BlobSpillFile(self._spill_path)
+        return self._spill
+
+
+@dataclass
+class CheckpointTimings:
+    count: int = 0
+    # time spent inside the intervention handler before the message is delivered
+    hot_path_seconds: float = 0.0
+    # time spent storing checkpoints on the background worker instead of the hot path
+    offloaded_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        count = max(self.count, 1)
+        return {
+            "count": self.count,
+            "hot_path_seconds": self.hot_path_seconds,
+            "offloaded_seconds": self.offloaded_seconds,
+            "hot_path_seconds_per_message": self.hot_path_seconds / count,
+            "saved_seconds_per_message": self.offloaded_seconds / count,
+        }
+
+
+class CheckpointWriter:
+    """
+    Writes runtime snapshots into a CheckpointStore, either inline or on a single background
+    worker thread so diffing and hashing large states does not delay message delivery.
+
+    Background writes keep submission order. Anything reading checkpoints must first call
+    `barrier` so pending writes up to the timestamp of interest have landed. Stored checkpoints
+    are also appended to `history_log`, by the same thread that stores them.
+    """
+
+    def __init__(
+        self,
+        store: CheckpointStore,
+        background: bool = False,
+        policy: "CheckpointPolicy | None" = None,
+        retention: "CheckpointRetention | None" = None,
+        history_log: HistoryLog | None = None,
+    ) -> None:
+        self.store = store
+        self.history_log = history_log
+        self.background = background
+        self.policy = CheckpointPolicy() if policy is None else policy
+        self.retention = retention
+        # updated by the background worker too, so only read through `timings_dict`
+        self.timings = CheckpointTimings()
+        self._timings_lock = threading.Lock()
+        # timestamp of the most recent write, which may still be pending in the background
+        self.last_timestamp = store.latest_timestamp
+        # manifest of the last checkpoint taken while no handler was running, i.e. one that matches
+        # the live agents exactly. Used to skip reloading agents that have not changed since.
+        self.settled_timestamp: int | None = None
+        self.settled_manifest: Dict[str, str] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._pending: Dict[int, Future[None]] = {}
+
+        if background:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agdebugger-checkpoint")
+
+    def should_write(self, timestamp: int, message: AGEPublishMessage | AGESendMessage | AGEResponseMessage) -> bool:
+        return self.policy.should_checkpoint(timestamp, message, self.last_timestamp, self.store.nbytes)
+
+    def write(
+        self,
+        timestamp: int,
+        snapshot: Mapping[str, Any],
+        capture_seconds: float = 0.0,
+        settled: bool = False,
+        partial: bool = False,
+    ) -> None:
+        """
+        Stores a snapshot taken at `timestamp`. With `partial`, the snapshot only holds the agents
+        that changed and the others carry over from the previous checkpoint.
+        """
+        self.last_timestamp = timestamp
+        with self._timings_lock:
+            self.timings.count += 1
+            self.timings.hot_path_seconds += capture_seconds
+
+        if self._executor is None:
+            start = time.perf_counter()
+            self._store(timestamp, snapshot, settled, partial)
+            with self._timings_lock:
+                self.timings.hot_path_seconds += time.perf_counter() - start
+            return
+
+        self._pending = {ts: fut for ts, fut in self._pending.items() if not fut.done()}
+        self._pending[timestamp] = self._executor.submit(
+            self._write_in_background, timestamp, snapshot, settled, partial
+        )
+
+    def timings_dict(self) -> Dict[str, float]:
+        with self._timings_lock:
+            return self.timings.to_dict()
+
+    def mark_settled(self, timestamp: int) -> None:
+        """Records that the live agents now match the checkpoint at `timestamp`, e.g. after loading it."""
+        self.settled_timestamp = timestamp
+        self.settled_manifest = dict(self.store.manifest(timestamp))
+
+    async def barrier(self, timestamp: int | None = None) -> None:
+        """
+        Waits for pending writes up to and including `timestamp` (all writes if None). Pending
+        writes after `timestamp` are cancelled if they have not started yet, as they belong to
+        history that is about to be truncated.
+        """
+        pending, self._pending = self._pending, {}
+        for ts, fut in pending.items():
+            if timestamp is not None and ts > timestamp:
+                fut.cancel()
+
+        running = [asyncio.wrap_future(fut) for fut in pending.values() if not fut.cancelled()]
+        if running:
+            await asyncio.gather(*running)
+        # the policy counts from the last checkpoint actually taken, not a cancelled or failed one;
+        # writes submitted while waiting are still pending and newer than the store
+        self.last_timestamp = max(self._pending, default=self.store.latest_timestamp)
+
+    def close(self) -> None:
+        """Waits for pending background writes and stops the worker."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def truncate(self, cutoff: int) -> None:
+        """Drops all checkpoints at or after the cutoff timestamp, including pending ones."""
+        await self.barrier(cutoff - 1)
+        self.store.truncate(cutoff)
+        self.last_timestamp = self.store.latest_timestamp
+        if self.retention is not None:
+            self.retention.unpin_from(cutoff)
+
+    def _store(self, timestamp: int, snapshot: Mapping[str, Any], settled: bool, partial: bool) -> None:
+        if partial:
+            self.store.set_partial(timestamp, snapshot)
+        else:
+            self.store[timestamp] = snapshot
+        if self.history_log is not None:
+            self.history_log.append_checkpoint(timestamp, snapshot)
+        if settled:
+            self.mark_settled(timestamp)
+        if self.retention is not None:
+            self.retention.apply(self.store, timestamp)
+
+    def _write_in_background(self, timestamp: int, snapshot: Mapping[str, Any], settled: bool, partial: bool) -> None:
+        start = time.perf_counter()
+        try:
+            self._store(timestamp, snapshot, settled, partial)
+        except Exception:
+            logger.exception("Failed to store checkpoint for time %s", timestamp)
+        with self._timings_lock:
+            self.timings.offloaded_seconds += time.perf_counter() - start
+
+
+# messages that start a new turn of the team or of one agent
+TURN_BOUNDARY_TYPES = (GroupChatStart, GroupChatRequestPublish)
+
+_BYTE_UNITS = {"": 1, "B": 1, "KB": 1024, "MB": 1024**2, "GB": 1024**3}
+
+
+def parse_bytes(value: str) -> int:
+    """Parses sizes such as 4096, 512KB, 256MB or 2GB."""
+    value = value.strip().upper()
+    digits = value.rstrip("KMGB")
+    unit = value[len(digits) :]
+    if not digits or unit not in _BYTE_UNITS:
+        raise ValueError(f"Invalid size: {value}")
+    return int(float(digits) * _BYTE_UNITS[unit])
+
+
+@dataclass
+class CheckpointPolicy:
+    """
+    Decides which intercepted messages get an agent state checkpoint. Reverting to a timestamp
+    without one restores the nearest earlier checkpoint and replays history from there.
+
+    - every_n: checkpoint once N messages have passed since the last checkpoint
+    - turn_boundaries: checkpoint on GroupChatStart and GroupChatRequestPublish
+    - max_bytes: once the store holds this many bytes, only checkpoint on turn boundaries
+    """
+
+    every_n: int | None = 1
+    turn_boundaries: bool = False
+    max_bytes: int | None = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "CheckpointPolicy":
+        """
+        Parses a comma separated policy spec, e.g. "all", "every:10", "turns",
+        "every:20,turns" or "budget:512MB".
+        """
+        policy = cls(every_n=None)
+        for part in spec.split(","):
+            name, _, arg = part.strip().partition(":")
+            match name:
+                case "all":
+                    policy.every_n = 1
+                case "every":
+                    policy.every_n = int(arg)
+                case "turns":
+                    policy.turn_boundaries = True
+                case "budget":
+                    policy.max_bytes = parse_bytes(arg)
+                    if policy.every_n is None:
+                        policy.every_n = 1
+                case _:
+                    raise ValueError(f"Unknown checkpoint policy: {part}")
+        return policy
+
+    def should_checkpoint(
+        self,
+        timestamp: int,
+        message: AGEPublishMessage | AGESendMessage | AGEResponseMessage,
+        last_checkpoint: int | None,
+        store_bytes: int,
+    ) -> bool:
+        if last_checkpoint is None:
+            return True
+
+        is_boundary = isinstance(message.message, TURN_BOUNDARY_TYPES)
+        if self.max_bytes is not None and store_bytes >= self.max_bytes:
+            return is_boundary
+        if self.turn_boundaries and is_boundary:
+            return True
+        return self.every_n is not None and timestamp - last_checkpoint >= self.every_n
+
+
+class CheckpointRetention:
+    """
+    Thins old checkpoints so their number grows logarithmically with run length: all of the
+    last `keep_recent` timestamps are kept, then one per 2 timestamps for the next 2 * keep_recent,
+    one per 4 for the next 4 * keep_recent, and so on.
+
+    Within each bucket the earliest checkpoint is kept, so a checkpoint that survives one round
+    of thinning also survives later ones. Pinned timestamps (the points history was reset from)
+    and the first checkpoint always keep the nearest checkpoint at or before them, so reverts
+    within any branch can still be restored.
+    """
+
+    def __init__(self, keep_recent: int = 50) -> None:
+        if keep_recent < 1:
+            raise ValueError("keep_recent must be at least 1")
+        self.keep_recent = keep_recent
+        self.pinned: Set[int] = set()
+        self._last_applied: int | None = None
+
+    def pin(self, timestamp: int) -> None:
+        self.pinned.add(timestamp)
+
+    def unpin_from(self, cutoff: int) -> None:
+        """Drops the pins at or after the cutoff timestamp, whose history was truncated."""
+        self.pinned = {ts for ts in self.pinned if ts < cutoff}
+
+    def select(self, timestamps: Iterable[int], head: int) -> List[int]:
+        """Returns the timestamps to drop when the newest timestamp is `head`."""
+        ordered = sorted(timestamps)
+        keep: Set[int] = set(ordered[:1])
+        for pinned in self.pinned:
+            index = bisect.bisect_right(ordered, pinned)
+            if index > 0:
+                keep.add(ordered[index - 1])
+
+        buckets: Set[Tuple[int, int]] = set()
+        for ts in ordered:
+            age = head - ts
+            if age < self.keep_recent:
+                keep.add(ts)
+                continue
+            # tier k covers ages [R * (2**k - 1), R * (2**(k+1) - 1)) with one checkpoint per 2**k timestamps
+            level = (age // self.keep_recent + 1).bit_length() - 1
+            bucket = (level, ts >> level)
+            if bucket not in buckets:
+                buckets.add(bucket)
+                keep.add(ts)
+
+        return [ts for ts in ordered if ts not in keep]
+
+    def apply(self, store: CheckpointStore, head: int) -> None:
+        # thinning rebases deltas, so it is batched to once per half window of new timestamps
+        if self._last_applied is not None and head - self._last_applied < max(1, self.keep_recent // 2):
+            return
+        self._last_applied = head
+        dropped = self.select(list(store.keys()), head)
+        if dropped:
+            store.drop(dropped)
@@ -1,5 +1,5 @@
 import asyncio
-import pickle
+import os
 import webbrowser
 
 import typer
@@ -7,6 +7,10 @@ import uvicorn
 from typing_extensions import Annotated
 
 from .app import get_server
+from .blobs import load_pickle_with_blobs
+from .checkpoint import CheckpointPolicy, CheckpointRetention, parse_bytes
+from .history_log import HistoryLog, archive_history_log, is_history_log, read_history_log
+from .log import RingBufferHandler
 
 cli_app = typer.Typer()
 
@@ -21,6 +25,16 @@ def run(
     launch: Annotated[bool, typer.Option("--launch")] = False,
     history: str | None = None,
     cache: str | None = None,
+    background_checkpoints: Annotated[bool, typer.Option("--background-checkpoints")] = False,
+    checkpoint_policy: str = "all",
+    checkpoint_budget: str | None = None,
+    checkpoint_spill: str | None = None,
+    checkpoint_keep_recent: int | None = None,
+    history_log: str | None = None,
+    log_capacity: int = 10000,
+    log_level: str = "DEBUG",
+    log_names: str | None = None,
+    log_file: str | None = None,
 ):
     """
     Run the AGEDebugger app.
@@ -34,26 +48,109 @@ def run(
         open (bool, optional): Whether to open the UI in the browser. Defaults to False.
         history (str, optional): Path to a history file to load.
         cache (str, optional): Path to a cache file to load.
+        background_checkpoints (bool, optional): Store agent state checkpoints on a background thread. Defaults to False.
+        checkpoint_policy (str, optional): Which messages get a checkpoint, e.g. "all", "every:10", "turns" or "budget:512MB". Defaults to "all".
+        checkpoint_budget (str, optional): Memory for checkpoints, e.g. "512MB". Older checkpoints are compressed and then spilled to disk to stay under it.
+        checkpoint_spill (str, optional): Path of the file checkpoints are spilled to under a budget. A temporary file, removed on exit, if not set.
+        checkpoint_keep_recent (int, optional): Keep every checkpoint of the last N messages and progressively fewer before that. Keeps all checkpoints if not set.
+        history_log (str, optional): Path of a log that every message and checkpoint is appended to as it happens. If the log exists, the session it holds is recovered and continued; if a different history is loaded, the existing log is moved to `<path>.<n>` first.
+        log_capacity (int, optional): Number of recent log records kept for the UI. Defaults to 10000.
+        log_level (str, optional): Lowest level of the log records kept. Defaults to DEBUG.
+        log_names (str, optional): Comma-separated logger names to keep records of, with their child loggers. Keeps all if not set.
+        log_file (str, optional): Path of a rotating file that log records dropped from the buffer are written to.
         scorer (str, optional): name of score function
     """
     loaded_history = None
     loaded_cache = None
+    # a history log is resumed when it is the source of the loaded history, otherwise it starts over
+    resume_log = False
+    if history is None and history_log is not None and is_history_log(history_log):
+        history = history_log
+
     if history is not None:
-        with open(history, "rb") as f:
-            loaded_history = pickle.load(f)
+        if is_history_log(history):
+            recovered = read_history_log(history)
+            print(f"Recovered {len(recovered.messages)} messages from history log {history}")
+            loaded_history = recovered.messages
+            loaded_cache = recovered.checkpoints
+            if history_log is None:
+                history_log = history
+            resume_log = os.path.abspath(history) == os.path.abspath(history_log)
+        else:
+            loaded_history = load_pickle_with_blobs(history)
 
     if cache is not None:
-        with open(cache, "rb") as f:
-            loaded_cache = pickle.load(f)
+        loaded_cache = load_pickle_with_blobs(cache)
+
+    policy = CheckpointPolicy.parse(checkpoint_policy)
+    budget = None if checkpoint_budget is None else parse_bytes(checkpoint_budget)
+    retention = None if checkpoint_keep_recent is None else CheckpointRetention(checkpoint_keep_recent)
+    log = None
+    if history_log is not None:
+        if not resume_log:
+            # the log holds another session, keep it for recovery rather than overwrite it
+            archived = archive_history_log(history_log)
+            if archived is not None:
+                print(f"[WARN] History log {history_log} holds another session, moved it to {archived}")
+        log = HistoryLog(history_log, reset=not resume_log)
+    log_handler = RingBufferHandler(
+        capacity=log_capacity,
+        level=log_level.upper(),
+        names=None if log_names is None else [name.strip() for name in log_names.split(",") if name.strip()],
+        spill_path=log_file,
+    )
 
     if launch:
         webbrowser.open(f"http://{host}:{port}")
 
-    asyncio.run(async_run(module, loaded_history, loaded_cache, host, port, workers, reload))
+    asyncio.run(
+        async_run(
+            module,
+            loaded_history,
+            loaded_cache,
+            host,
+            port,
+            workers,
+            reload,
+            background_checkpoints,
+            policy,
+            budget,
+            retention,
+            log,
+            log_handler,
+            checkpoint_spill,
+        )
+    )
 
 
-async def async_run(module, loaded_history, loaded_cache, host, port, workers, reload):
-    server_app = await get_server(module, loaded_history, loaded_cache)
+async def async_run(
+    module,
+    loaded_history,
+    loaded_cache,
+    host,
+    port,
+    workers,
+    reload,
+    background_checkpoints,
+    checkpoint_policy,
+    checkpoint_budget,
+    checkpoint_retention,
+    history_log,
+    log_handler,
+    checkpoint_spill_path,
+):
+    server_app = await get_server(
+        module,
+        loaded_history,
+        loaded_cache,
+        background_checkpoints,
+        checkpoint_policy,
+        checkpoint_budget,
+        checkpoint_retention,
+        history_log,
+        log_handler,
+        checkpoint_spill_path,
+    )
 
     config = uvicorn.Config(
         server_app,
@@ -0,0 +1,242 @@
+"""Columnar projection of the message history for fast aggregate statistics"""
+
+import math
+from array import array
+from collections import Counter
+from typing import Any, Dict, Iterator, List
+
+from pydantic import BaseModel
+
+from .types import AGEPublishMessage, AGEResponseMessage, AGESendMessage
+
+# envelope kinds, by their id in the kind column
+KINDS = ("publish", "send", "response")
+
+# no sender, recipient or topic
+MISSING = -1
+
+
+def iter_content_text(value: Any, depth: int = 0) -> Iterator[str]:
+    """
+    Yields the text of a message: its `content`, or the content of the messages nested in it
+    (e.g. the messages of a group chat start). Other string fields such as sources and type
+    tags, images and binary content are skipped.
+    """
+    if isinstance(value, str):
+        yield value
+    elif depth >= 8:
+        return
+    elif isinstance(value, BaseModel):
+        # models iterate as (field name, value) pairs
+        fields = dict(value)
+        if "content" in fields:
+            yield from iter_content_text(fields["content"], depth + 1)
+            return
+        for field in fields.values():
+            if not isinstance(field, str):
+                yield from iter_content_text(field, depth + 1)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from iter_content_text(item, depth + 1)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from iter_content_text(item, depth + 1)
+
+
+def content_length(value: Any) -> int:
+    """Returns the number of text characters in a message, as found by `iter_content_text`."""
+    return sum(len(text) for text in iter_content_text(value))
+
+
+class SymbolTable:
+    """Maps names to small integer ids, in order of first use."""
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def id(self, name: str | None) -> int:
+        if name is None:
+            return MISSING
+        symbol = self._ids.get(name)
+        if symbol is None:
+            symbol = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol
+
+
+class HistoryColumns:
+    """
+    Parallel typed arrays with one row per history message: timestamp, sender, recipient,
+    topic, message type, envelope kind, content length and the wall-clock time the message was
+    recorded. Agents, topics and types are stored as ids into symbol tables, keyed by type as
+    in the history indexes.
+
+    Rows are appended and truncated along with the history. Aggregates use NumPy views of the
+    arrays when NumPy is installed and fall back to plain Python otherwise.
+    """
+
+    def __init__(self, timestamps: "array[int]") -> None:
+        # shared with the history store
+        self.timestamps = timestamps
+        self.sender = array("l")
+        self.recipient = array("l")
+        self.topic = array("l")
+        self.type = array("l")
+        self.kind = array("b")
+        self.content_length = array("q")
+        # NaN for messages loaded from a saved history, whose time is not known
+        self.recorded_at = array("d")
+        self.agents = SymbolTable()
+        self.topics = SymbolTable()
+        self.types = SymbolTable()
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def append(
+        self, message: AGEPublishMessage | AGESendMessage | AGEResponseMessage, recorded_at: float | None = None
+    ) -> None:
+        sender = None if message.sender is None else message.sender.type
+        recipient = topic = None
+        match message:
+            case AGEPublishMessage(topic_id=topic_id):
+                topic = topic_id.type
+                kind = 0
+            case AGESendMessage(recipient=recipient_id):
+                recipient = recipient_id.type
+                kind = 1
+            case AGEResponseMessage(recipient=recipient_id):
+                recipient = None if recipient_id is None else recipient_id.type
+                kind = 2
+
+        self.sender.append(self.agents.id(sender))
+        self.recipient.append(self.agents.id(recipient))
+        self.topic.append(self.topics.id(topic))
+        self.type.append(self.types.id(type(message.message).__name__))
+        self.kind.append(kind)
+        self.content_length.append(content_length(message.message))
+        self.recorded_at.append(math.nan if recorded_at is None else recorded_at)
+
+    def truncate(self, position: int) -> None:
+        """Removes the rows from `position` on. The shared timestamps are truncated by the history."""
+        for column in (
+            self.sender,
+            self.recipient,
+            self.topic,
+            self.type,
+            self.kind,
+            self.content_length,
+            self.recorded_at,
+        ):
+            del column[position:]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns message counts per sender, recipient, topic, type and kind, content lengths in
+        total and per sender, and the gaps between consecutive messages. A gap of more than one
+        timestamp is where a revert dropped messages.
+        """
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            return self._stats_python()
+        return self._stats_numpy()
+
+    def _stats_numpy(self) -> Dict[str, Any]:
+        import numpy as np
+
+        def view(column: "array[Any]") -> Any:
+            # zero-copy; must not outlive this call, as arrays cannot grow while viewed
+            if not len(column):
+                return np.zeros(0, dtype=np.dtype(column.typecode))
+            return np.frombuffer(column, dtype=np.dtype(column.typecode))
+
+        def counts(column: "array[int]", names: List[str]) -> Dict[str, int]:
+            # shift by one so MISSING lands in bin 0
+            bins = np.bincount(view(column) + 1, minlength=len(names) + 1)[1:]
+            return {names[i]: int(bins[i]) for i in np.flatnonzero(bins)}
+
+        count = len(self)
+        timestamps = view(self.timestamps)
+        lengths = view(self.content_length)
+        sender = view(self.sender) + 1
+        sender_lengths = np.bincount(sender, weights=lengths, minlength=len(self.agents) + 1)[1:]
+        sender_counts = np.bincount(sender, minlength=len(self.agents) + 1)[1:]
+
+        timestamp_gaps = np.diff(timestamps)
+        reverted = timestamp_gaps[timestamp_gaps > 1] - 1
+        seconds = np.diff(view(self.recorded_at))
+        seconds = seconds[~np.isnan(seconds)]
+
+        return {
+            "count": count,
+            "first_timestamp": int(timestamps[0]) if count else None,
+            "last_timestamp": int(timestamps[-1]) if count else None,
+            "counts": {
+                "sender": counts(self.sender, self.agents.names),
+                "recipient": counts(self.recipient, self.agents.names),
+                "topic": counts(self.topic, self.topics.names),
+                "type": counts(self.type, self.types.names),
+                "kind": counts(self.kind, list(KINDS)),
+            },
+            "content_length": {
+                "total": int(lengths.sum()),
+                "mean": float(lengths.mean()) if count else 0.0,
+                "max": int(lengths.max()) if count else 0,
+                "by_sender": {self.agents.names[i]: int(sender_lengths[i]) for i in np.flatnonzero(sender_counts)},
+            },
+            "gaps": {
+                "reverts": int(reverted.size),
+                "reverted_messages": int(reverted.sum()),
+                "mean_seconds": float(seconds.mean()) if seconds.size else None,
+                "max_seconds": float(seconds.max()) if seconds.size else None,
+            },
+        }
+
+    def _stats_python(self) -> Dict[str, Any]:
+        def counts(column: "array[int]", names: List[str]) -> Dict[str, int]:
+            return {names[symbol]: n for symbol, n in sorted(Counter(column).items()) if symbol != MISSING}
+
+        count = len(self)
+        lengths = self.content_length
+        by_sender: Dict[str, int] = {}
+        for symbol, length in zip(self.sender, lengths, strict=True):
+            if symbol != MISSING:
+                name = self.agents.names[symbol]
+                by_sender[name] = by_sender.get(name, 0) + length
+
+        timestamps = self.timestamps
+        reverted = [b - a - 1 for a, b in zip(timestamps, timestamps[1:], strict=False) if b - a > 1]
+        recorded_at = self.recorded_at
+        seconds = [
+            b - a for a, b in zip(recorded_at, recorded_at[1:], strict=False) if not (math.isnan(a) or math.isnan(b))
+        ]
+
+        return {
+            "count": count,
+            "first_timestamp": timestamps[0] if count else None,
+            "last_timestamp": timestamps[-1] if count else None,
+            "counts": {
+                "sender": counts(self.sender, self.agents.names),
+                "recipient": counts(self.recipient, self.agents.names),
+                "topic": counts(self.topic, self.topics.names),
+                "type": counts(self.type, self.types.names),
+                "kind": counts(self.kind, list(KINDS)),
+            },
+            "content_length": {
+                "total": sum(lengths),
+                "mean": sum(lengths) / count if count else 0.0,
+                "max": max(lengths, default=0),
+                "by_sender": by_sender,
+            },
+            "gaps": {
+                "reverts": len(reverted),
+                "reverted_messages": sum(reverted),
+                "mean_seconds": sum(seconds) / len(seconds) if seconds else None,
+                "max_seconds": max(seconds, default=None),
+            },
+        }
@@ -0,0 +1,237 @@
+"""Negotiated zstd, brotli or gzip compression of responses"""
+
+import zlib
+from typing import Callable, Dict, List, Protocol, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # type: ignore[assignment]
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore[assignment]
+
+# media types that are streamed to the browser as they come, or are compressed already
+EXCLUDED_CONTENT_TYPES = (
+    "text/event-stream",
+    "application/gzip",
+    "application/zip",
+    "application/zstd",
+    "image/*",
+    "audio/*",
+    "video/*",
+    "font/woff",
+    "font/woff2",
+)
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes:
+        """Compresses a chunk, and flushes it so the client can decode it as it arrives."""
+        ...
+
+    def finish(self, data: bytes) -> bytes:
+        """Compresses the last chunk and ends the stream."""
+        ...
+
+
+class GzipCompressor:
+    def __init__(self, level: int = 6) -> None:
+        # wbits 16 + 15 writes a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = 5) -> None:
+        if brotli is None:
+            raise ImportError("brotli compression needs the brotli package")
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._compressor.process(data) + self._compressor.flush())
+
+    def finish(self, data: bytes) -> bytes:
+        return bytes(self._compressor.process(data) + self._compressor.finish())
+
+
+class ZstdCompressor:
+    def __init__(self, level: int = 3) -> None:
+        if zstandard is None:
+            raise ImportError("zstd compression needs the zstandard package")
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self._compressor.compress(data) + self._compressor.flush(self._flush_block))
+
+    def finish(self, data: bytes) -> bytes:
+        return bytes(self._compressor.compress(data) + self._compressor.flush())
+
+
+def available_encodings() -> List[str]:
+    """Returns the supported content encodings, most preferred first."""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parses an Accept-Encoding header into quality values by encoding."""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str, encodings: List[str]) -> str | None:
+    """Returns the encoding with the highest quality the client accepts, by preference on ties."""
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_excluded(content_type: str, excluded: Tuple[str, ...]) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type in excluded or media_type.partition("/")[0] + "/*" in excluded
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least `minimum_size` bytes with the best encoding both sides
+    support: zstd and brotli when their packages are installed, gzip otherwise. Streamed
+    responses are compressed chunk by chunk, so they are never buffered whole. Server-sent
+    events and already compressed media types are sent as they are.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        compresslevel: int = 6,
+        exclude_content_types: Tuple[str, ...] = EXCLUDED_CONTENT_TYPES,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_content_types = exclude_content_types
+        self.encodings = available_encodings()
+        self.compressors: Dict[str, Callable[[], Compressor]] = {
+            "gzip": lambda: GzipCompressor(compresslevel),
+            "br": BrotliCompressor,
+            "zstd": ZstdCompressor,
+        }
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        encoding = None
+        if scope["type"] == "http":
+            encoding = negotiate_encoding(Headers(scope=scope).get("Accept-Encoding", ""), self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(
+            send, encoding, self.compressors[encoding], self.minimum_size, self.exclude_content_types
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class CompressionResponder:
+    """
+    Compresses the body messages of one response as the app sends them. The response start is
+    held back until the first body message shows whether the response is compressed.
+    """
+
+    def __init__(
+        self,
+        send: Send,
+        encoding: str,
+        compressor: Callable[[], Compressor],
+        minimum_size: int,
+        exclude_content_types: Tuple[str, ...],
+    ) -> None:
+        self._send = send
+        self.encoding = encoding
+        self.make_compressor = compressor
+        self.minimum_size = minimum_size
+        self.exclude_content_types = exclude_content_types
+        self._start: Message | None = None
+        # None until the first body message decides it
+        self._compressor: Compressor | None = None
+        self._passthrough = False
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            self._passthrough = (
+                "content-encoding" in headers
+                or message["status"] == 206
+                or is_excluded(headers.get("content-type", ""), self.exclude_content_types)
+            )
+            if self._passthrough:
+                await self._send(message)
+            else:
+                self._start = message
+            return
+
+        if self._passthrough or message["type"] != "http.response.body":
+            await self._flush_start()
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        compressor = self._compressor
+        if compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                self._passthrough = True
+                await self._flush_start()
+                await self._send(message)
+                return
+            compressor = self._compressor = self.make_compressor()
+
+        body = compressor.compress(body) if more_body else compressor.finish(body)
+        if self._start is not None:
+            headers = MutableHeaders(raw=self._start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            headers["Content-Encoding"] = self.encoding
+            del headers["Content-Length"]
+            if not more_body and not self._start.get("trailers", False):
+                # the whole body is in this message, so its length is known
+                headers["Content-Length"] = str(len(body))
+        await self._flush_start()
+        await self._send({**message, "body": body})
+
+    async def _flush_start(self) -> None:
+        if self._start is not None:
+            start, self._start = self._start, None
+            await self._send(start)
@@ -0,0 +1,144 @@
+"""JSON encoding of API responses, with orjson when it is installed"""
+
+import dataclasses
+import datetime
+import decimal
+import enum
+import json
+import pathlib
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, Iterable, Mapping, NamedTuple, Tuple
+
+from fastapi import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        # nested values are converted as they are reached, without copying like `asdict`
+        return {f.name: getattr(value, f.name) for f in dataclasses.fields(value)}
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (uuid.UUID, pathlib.PurePath)):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        # as jsonable_encoder does: whole numbers stay ints
+        exponent = value.as_tuple().exponent
+        return int(value) if isinstance(exponent, int) and exponent >= 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Encodes a response body. Dataclasses (e.g. `MessageHistorySession`, `ScoreResult`) and
+    pydantic models are encoded directly rather than converted by `jsonable_encoder` first,
+    and dict keys such as session ids become strings.
+    """
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def iter_ndjson(records: Iterable[Any], chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """
+    Encodes records as newline-delimited JSON, in chunks of about `chunk_size` bytes. Only one
+    chunk is held at a time, and the first ones go out before the rest are encoded.
+    """
+    chunk = bytearray()
+    for record in records:
+        chunk += dumps(record)
+        chunk += b"\n"
+        if len(chunk) >= chunk_size:
+            yield bytes(chunk)
+            chunk.clear()
+    if chunk:
+        yield bytes(chunk)
+
+
+class EncodedJSONResponse(Response):
+    """JSON response whose content is encoded by `dumps`, or is already encoded bytes."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+class EncodedBody(NamedTuple):
+    body: bytes
+    etag: str | None
+
+
+class ResponseCache:
+    """
+    Encoded response bodies by request key, each valid for the state version it was encoded
+    at. A request for a newer version re-encodes. The least recently used bodies are evicted
+    once the total size exceeds `max_bytes`.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Tuple[Hashable, EncodedBody]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        key: Hashable,
+        version: Hashable,
+        build: Callable[[], Any],
+        etag: Callable[[Any], str] | None = None,
+    ) -> EncodedBody:
+        """Returns the encoded body for `key` at `version`, calling `build` for its content if needed."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        content = build()
+        encoded = EncodedBody(dumps(content), None if etag is None else etag(content))
+        self._discard(key)
+        self._entries[key] = (version, encoded)
+        self.nbytes += len(encoded.body)
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            self._discard(next(iter(self._entries)))
+        return encoded
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses}
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= len(entry[1].body)
@@ -0,0 +1,225 @@
+"""Changes of the debugger state, pushed to UI clients or versioned for clients that poll"""
+
+import asyncio
+import threading
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Set
+
+from .encoding import dumps
+
+# events raised by the intervention handler
+MESSAGE_ADDED = "message_added"
+HISTORY_TRUNCATED = "history_truncated"
+QUEUE_CHANGED = "queue_changed"
+LOG_EMITTED = "log_emitted"
+LOOP_CHANGED = "loop_changed"
+
+
+def sse_frame(event: str, data: Any, event_id: int | None = None) -> bytes:
+    """Encodes one server-sent event."""
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    header = "\n".join(lines).encode("utf-8")
+    # JSON has no raw newlines, so the data fits on one line
+    return header + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+@dataclass
+class Section:
+    """
+    A part of the UI state. `delta` returns what changed since it was last called (or None if
+    nothing did), `snapshot` returns the whole part and restarts the deltas from it.
+    """
+
+    name: str
+    delta: Callable[[], Any | None]
+    snapshot: Callable[[], Any]
+    events: Set[str] = field(default_factory=set)
+
+
+class Subscriber:
+    def __init__(self, max_pending: int) -> None:
+        self.queue: asyncio.Queue[bytes | None] = asyncio.Queue(max_pending)
+
+    def push(self, frame: bytes) -> None:
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # too far behind for deltas: drop them and have the client resync from a snapshot
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventChannel:
+    """
+    Fans out deltas of the debugger state to subscribed clients. Events only mark the sections
+    they affect as changed. Changed sections are sent once per event loop iteration, so a burst
+    of events (e.g. a free-running loop) costs one delta per section, and none are computed
+    while nobody is subscribed.
+
+    Each client first receives a `snapshot` of all sections, then `<section>` delta events in
+    order. A client that falls too far behind receives a fresh snapshot.
+    """
+
+    def __init__(self, max_pending: int = 1024) -> None:
+        self.sections: Dict[str, Section] = {}
+        self.max_pending = max_pending
+        self.sequence = 0
+        self._subscribers: List[Subscriber] = []
+        self._dirty: Set[str] = set()
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._scheduled = False
+
+    def add_section(
+        self,
+        name: str,
+        delta: Callable[[], Any | None],
+        snapshot: Callable[[], Any],
+        events: Iterable[str] = (),
+    ) -> None:
+        self.sections[name] = Section(name, delta, snapshot, set(events))
+
+    @property
+    def num_subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def emit(self, event: str) -> None:
+        """Marks the sections affected by an event as changed. Safe to call from any thread."""
+        with self._lock:
+            self._dirty.update(s.name for s in self.sections.values() if event in s.events)
+            if self._scheduled or not self._subscribers or self._loop is None:
+                return
+            self._scheduled = True
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._loop.call_soon(self.flush)
+        else:
+            self._loop.call_soon_threadsafe(self.flush)
+
+    def flush(self) -> None:
+        """Sends the deltas of all changed sections to the subscribers."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._scheduled = False
+        if not self._subscribers:
+            return
+
+        # in registration order, so e.g. the queue and the history stay consistent
+        for section in self.sections.values():
+            if section.name not in dirty:
+                continue
+            delta = section.delta()
+            if delta is None:
+                continue
+            self.sequence += 1
+            frame = sse_frame(section.name, delta, self.sequence)
+            for subscriber in self._subscribers:
+                subscriber.push(frame)
+
+    def snapshot_frame(self) -> bytes:
+        """Sends pending deltas to the current subscribers, then encodes a snapshot of all sections."""
+        self.flush()
+        return sse_frame("snapshot", {name: s.snapshot() for name, s in self.sections.items()}, self.sequence)
+
+    def subscribe(self) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self.max_pending)
+        subscriber.push(self.snapshot_frame())
+        self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        if subscriber in self._subscribers:
+            self._subscribers.remove(subscriber)
+
+    async def stream(self, keepalive: float = 15.0) -> AsyncIterator[bytes]:
+        """Yields server-sent event frames for one client until it disconnects."""
+        subscriber = self.subscribe()
+        try:
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle connection
+                    yield b": keepalive\n\n"
+                    continue
+                if frame is None:
+                    frame = self.snapshot_frame()
+                    # deltas queued up to now are part of the snapshot
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+
+@dataclass
+class VersionedSection:
+    name: str
+    read: Callable[[], Any]
+    events: Set[str] = field(default_factory=set)
+    value: Any = None
+    version: int = 0
+
+
+class VersionedState:
+    """
+    Sections of the debugger state with version numbers, for clients that poll. Events mark
+    the sections they affect as stale; a stale section is re-read on the next request and gets
+    a new version only if its value changed. The state version is the latest section version,
+    so it only grows, and a client that has it is up to date.
+    """
+
+    def __init__(self) -> None:
+        self.sections: Dict[str, VersionedSection] = {}
+        self.version = 0
+        self._stale: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def add_section(self, name: str, read: Callable[[], Any], events: Iterable[str] = ()) -> None:
+        self.sections[name] = VersionedSection(name, read, set(events))
+        self._stale.add(name)
+
+    def emit(self, event: str) -> None:
+        """Marks the sections affected by an event as stale. Safe to call from any thread."""
+        with self._lock:
+            self._stale.update(s.name for s in self.sections.values() if event in s.events)
+
+    def invalidate(self, *names: str) -> None:
+        with self._lock:
+            self._stale.update(names)
+
+    def refresh(self) -> None:
+        with self._lock:
+            stale, self._stale = self._stale, set()
+        for section in self.sections.values():
+            if section.name not in stale:
+                continue
+            value = section.read()
+            if section.version == 0 or value != section.value:
+                self.version += 1
+                section.value = value
+                section.version = self.version
+
+    def section_version(self, name: str) -> int:
+        self.refresh()
+        return self.sections[name].version
+
+    @property
+    def etag(self) -> str:
+        return f'"state-{self.version}"'
+
+    def since(self, version: int | None = None) -> Dict[str, Any]:
+        """Returns the state version, the version of each section, and the sections changed after `version`."""
+        self.refresh()
+        return {
+            "version": self.version,
+            "versions": {name: s.version for name, s in self.sections.items()},
+            "sections": {name: s.value for name, s in self.sections.items() if version is None or s.version > version},
+        }
@@ -0,0 +1,383 @@
+"""Indexed, append-only message history"""
+
+import bisect
+import heapq
+import time
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Sequence, Tuple, overload
+
+from .columns import HistoryColumns
+from .search import SearchIndex
+from .types import AGEPublishMessage, AGEResponseMessage, AGESendMessage, TimeStampedMessage
+from .utils import message_to_json
+
+# secondary indexes kept over the history
+INDEX_FIELDS = ("sender", "recipient", "topic", "type")
+
+# which of an agent's messages a view holds
+Direction = Literal["all", "inbox", "outbox"]
+
+
+def index_keys(message: AGEPublishMessage | AGESendMessage | AGEResponseMessage) -> Dict[str, str]:
+    """
+    Returns the secondary index keys of a history message. Agents are keyed by agent type and
+    topics by topic type, matching the names the UI shows.
+    """
+    keys = {"type": type(message.message).__name__}
+    if message.sender is not None:
+        keys["sender"] = message.sender.type
+    match message:
+        case AGEPublishMessage(topic_id=topic_id):
+            keys["topic"] = topic_id.type
+        case AGESendMessage(recipient=recipient) | AGEResponseMessage(recipient=recipient):
+            if recipient is not None:
+                keys["recipient"] = recipient.type
+    return keys
+
+
+class HistoryStore(Sequence[TimeStampedMessage]):
+    """
+    Message history in timestamp order. Timestamps are kept in a contiguous array for bisect
+    lookups and truncation, and positions are indexed by sender, recipient, topic and message
+    type for filtered queries.
+
+    The JSON form of each message is computed the first time it is read and kept until the
+    message is truncated or invalidated, so repeated polling does not re-serialize history.
+    `columns` holds a columnar projection of the messages for aggregate statistics, and
+    `text_index` an inverted index of their text for `search`.
+
+    Timestamps must increase, but need not be consecutive (a revert leaves a gap).
+    Pickles as a plain list, so saved history files keep their format.
+    """
+
+    def __init__(self, messages: Iterable[TimeStampedMessage] = ()) -> None:
+        self._messages: List[TimeStampedMessage] = []
+        self._timestamps = array("q")
+        self._indexes: Dict[str, Dict[str, List[int]]] = {field: {} for field in INDEX_FIELDS}
+        # positions of publishes by topic, then sender, for agent inboxes
+        self._published: Dict[str, Dict[str | None, List[int]]] = {}
+        self._json: List[Dict[str, Any] | None] = []
+        self._json_list: List[Dict[str, Any]] | None = None
+        self.columns = HistoryColumns(self._timestamps)
+        self.text_index = SearchIndex()
+        # incremented on every change
+        self.version = 0
+        for message in messages:
+            # loaded messages were recorded at an unknown time
+            self._append(message, None)
+
+    @overload
+    def __getitem__(self, index: int) -> TimeStampedMessage: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[TimeStampedMessage]: ...
+
+    def __getitem__(self, index: int | slice) -> TimeStampedMessage | List[TimeStampedMessage]:
+        return self._messages[index]
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[TimeStampedMessage]:
+        return iter(self._messages)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, HistoryStore):
+            return self._messages == other._messages
+        return isinstance(other, list) and self._messages == other
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self._messages!r})"
+
+    def __reduce__(self):  # type: ignore[no-untyped-def]
+        return (list, (self._messages,))
+
+    def append(self, message: TimeStampedMessage) -> None:
+        self._append(message, time.time())
+
+    def _append(self, message: TimeStampedMessage, recorded_at: float | None) -> None:
+        if self._timestamps and message.timestamp <= self._timestamps[-1]:
+            raise ValueError(f"History timestamps must increase, got {message.timestamp} after {self._timestamps[-1]}")
+
+        position = len(self._messages)
+        self._messages.append(message)
+        self._timestamps.append(message.timestamp)
+        self._json.append(None)
+        self._json_list = None
+        self.columns.append(message.message, recorded_at)
+        self.text_index.add(message.timestamp, message.message.message)
+        self.version += 1
+        keys = index_keys(message.message)
+        for field, key in keys.items():
+            self._indexes[field].setdefault(key, []).append(position)
+        if "topic" in keys:
+            self._published.setdefault(keys["topic"], {}).setdefault(keys.get("sender"), []).append(position)
+
+    def position(self, timestamp: int) -> int | None:
+        """Returns the position of the message with `timestamp`, or None if there is none."""
+        position = bisect.bisect_left(self._timestamps, timestamp)
+        if position < len(self._timestamps) and self._timestamps[position] == timestamp:
+            return position
+        return None
+
+    def get(self, timestamp: int) -> TimeStampedMessage | None:
+        position = self.position(timestamp)
+        return None if position is None else self._messages[position]
+
+    def range(self, start: int | None = None, end: int | None = None) -> List[TimeStampedMessage]:
+        """Returns the messages with `start <= timestamp < end`."""
+        lo, hi = self._bounds(start, end)
+        return self._messages[lo:hi]
+
+    def range_json(
+        self, start: int | None = None, end: int | None = None, limit: int | None = None
+    ) -> List[Dict[str, Any]]:
+        """Returns the JSON form of up to `limit` messages with `start <= timestamp < end`."""
+        lo, hi = self._bounds(start, end)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return [self.json_at(position) for position in range(lo, hi)]
+
+    def count(self, start: int | None = None, end: int | None = None) -> int:
+        """Returns the number of messages with `start <= timestamp < end`."""
+        lo, hi = self._bounds(start, end)
+        return hi - lo
+
+    def _bounds(self, start: int | None, end: int | None) -> Tuple[int, int]:
+        lo = 0 if start is None else bisect.bisect_left(self._timestamps, start)
+        hi = len(self._timestamps) if end is None else bisect.bisect_left(self._timestamps, end)
+        return lo, hi
+
+    def truncate(self, cutoff: int) -> None:
+        """Removes all messages at or after the cutoff timestamp."""
+        position = bisect.bisect_left(self._timestamps, cutoff)
+        if position == len(self._messages):
+            return
+
+        del self._messages[position:]
+        del self._timestamps[position:]
+        del self._json[position:]
+        self._json_list = None
+        self.columns.truncate(position)
+        self.text_index.truncate(cutoff)
+        self.version += 1
+        for index in self._indexes.values():
+            _truncate_index(index, position)
+        for topic in list(self._published):
+            _truncate_index(self._published[topic], position)
+            if not self._published[topic]:
+                del self._published[topic]
+
+    def json_at(self, position: int) -> Dict[str, Any]:
+        """Returns the JSON form of the message at `position`, serializing it on first use."""
+        record = self._json[position]
+        if record is None:
+            message = self._messages[position]
+            record = self._json[position] = message_to_json(message.message, message.timestamp)
+        return record
+
+    def to_json(self) -> List[Dict[str, Any]]:
+        """
+        Returns the JSON form of all messages. The list is shared until the history changes, so
+        callers must not modify it.
+        """
+        if self._json_list is None:
+            self._json_list = [self.json_at(position) for position in range(len(self._messages))]
+        return self._json_list
+
+    def invalidate(self, timestamp: int | None = None) -> None:
+        """Drops the cached JSON of one message (e.g. after editing it in place), or of all messages."""
+        if timestamp is None:
+            self._json = [None] * len(self._messages)
+        else:
+            position = self.position(timestamp)
+            if position is None:
+                return
+            self._json[position] = None
+        self._json_list = None
+        self.version += 1
+
+    def search(self, query: str, limit: int | None = None) -> List[TimeStampedMessage]:
+        """Returns the messages whose text matches a query, see `parse_query` for the syntax."""
+        return [self._messages[position] for position in self._search_positions(query, limit)]
+
+    def search_json(self, query: str, limit: int | None = None) -> List[Dict[str, Any]]:
+        return [self.json_at(position) for position in self._search_positions(query, limit)]
+
+    def _search_positions(self, query: str, limit: int | None) -> List[int]:
+        return [self.position(timestamp) for timestamp in self.text_index.search(query, limit)]  # type: ignore[misc]
+
+    def keys(self, field: str) -> List[str]:
+        """Returns the distinct values of an indexed field."""
+        return sorted(self._indexes[field])
+
+    def query(
+        self,
+        sender: str | None = None,
+        recipient: str | None = None,
+        topic: str | None = None,
+        message_type: str | None = None,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> List[TimeStampedMessage]:
+        """
+        Returns the messages matching all given filters, in timestamp order. Agents and topics
+        are matched by type; `start` and `end` bound the timestamps as in `range`.
+        """
+        positions = self._query_positions(sender, recipient, topic, message_type, start, end)
+        return [self._messages[position] for position in positions]
+
+    def query_json(
+        self,
+        sender: str | None = None,
+        recipient: str | None = None,
+        topic: str | None = None,
+        message_type: str | None = None,
+        start: int | None = None,
+        end: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Like `query`, but returns the cached JSON form of the matching messages."""
+        positions = self._query_positions(sender, recipient, topic, message_type, start, end)
+        return [self.json_at(position) for position in positions]
+
+    def view(
+        self,
+        agent: str | None = None,
+        subscribed_topics: Iterable[str] = (),
+        direction: Direction = "all",
+        topic: str | None = None,
+        start: int | None = None,
+        end: int | None = None,
+        limit: int | None = None,
+    ) -> List[TimeStampedMessage]:
+        """
+        Returns the messages an agent sent (`outbox`), received (`inbox`) or both, and/or the
+        traffic of one topic, in timestamp order. An agent receives the messages sent to it and
+        those published to `subscribed_topics` by other agents. Agents and topics are matched
+        by type. Views are merged lazily from the secondary indexes, bisected to the requested
+        range and stopped at `limit`, so their cost grows with the size of the view rather than
+        of the history.
+        """
+        positions = self._view_positions(agent, subscribed_topics, direction, topic, start, end, limit)
+        return [self._messages[position] for position in positions]
+
+    def view_json(
+        self,
+        agent: str | None = None,
+        subscribed_topics: Iterable[str] = (),
+        direction: Direction = "all",
+        topic: str | None = None,
+        start: int | None = None,
+        end: int | None = None,
+        limit: int | None = None,
+    ) -> List[Dict[str, Any]]:
+        """Like `view`, but returns the cached JSON form of the messages."""
+        positions = self._view_positions(agent, subscribed_topics, direction, topic, start, end, limit)
+        return [self.json_at(position) for position in positions]
+
+    def _view_positions(
+        self,
+        agent: str | None,
+        subscribed_topics: Iterable[str],
+        direction: Direction,
+        topic: str | None,
+        start: int | None,
+        end: int | None,
+        limit: int | None,
+    ) -> Sequence[int]:
+        if direction not in ("all", "inbox", "outbox"):
+            raise ValueError(f"Unknown view direction {direction}")
+
+        lo, hi = self._bounds(start, end)
+        if agent is None:
+            if topic is None:
+                return range(lo, hi if limit is None else min(hi, lo + limit))
+            return _merge_window([self._indexes["topic"].get(topic, [])], lo, hi, limit)
+
+        parts: List[List[int]] = []
+        if direction != "inbox":
+            if topic is None:
+                parts.append(self._indexes["sender"].get(agent, []))
+            else:
+                parts.append(self._published.get(topic, {}).get(agent, []))
+        if direction != "outbox":
+            # sends and responses have no topic
+            if topic is None:
+                parts.append(self._indexes["recipient"].get(agent, []))
+            for topic_type in dict.fromkeys(subscribed_topics):
+                if topic is not None and topic_type != topic:
+                    continue
+                # publishes are not delivered back to their sender
+                parts.extend(p for sender, p in self._published.get(topic_type, {}).items() if sender != agent)
+        return _merge_window(parts, lo, hi, limit)
+
+    def _query_positions(
+        self,
+        sender: str | None,
+        recipient: str | None,
+        topic: str | None,
+        message_type: str | None,
+        start: int | None,
+        end: int | None,
+    ) -> Iterable[int]:
+        filters = {"sender": sender, "recipient": recipient, "topic": topic, "type": message_type}
+        position_lists = [self._indexes[field].get(key, []) for field, key in filters.items() if key is not None]
+
+        lo, hi = self._bounds(start, end)
+        if not position_lists:
+            return range(lo, hi)
+
+        position_lists.sort(key=len)
+        smallest, others = position_lists[0], position_lists[1:]
+        first, last = bisect.bisect_left(smallest, lo), bisect.bisect_left(smallest, hi)
+        return _intersect_sorted(smallest[first:last], others)
+
+
+def _intersect_sorted(candidates: Sequence[int], others: List[List[int]]) -> List[int]:
+    """
+    Keeps the candidates found in every other sorted position list. Each list is searched from
+    where the previous candidate was found, so no list is copied.
+    """
+    cursors = [0] * len(others)
+    found: List[int] = []
+    for position in candidates:
+        for i, other in enumerate(others):
+            cursors[i] = bisect.bisect_left(other, position, cursors[i])
+            if cursors[i] == len(other) or other[cursors[i]] != position:
+                break
+        else:
+            found.append(position)
+    return found
+
+
+def _truncate_index(index: Dict[Any, List[int]], position: int) -> None:
+    """Drops the positions at or after `position` from an index, and the keys left without any."""
+    for key in list(index):
+        positions = index[key]
+        del positions[bisect.bisect_left(positions, position) :]
+        if not positions:
+            del index[key]
+
+
+def _merge_window(sorted_lists: List[List[int]], lo: int, hi: int, limit: int | None) -> Sequence[int]:
+    """
+    Merges the positions in `[lo, hi)` of sorted position lists, dropping duplicates, and stops
+    after `limit` positions. Only the positions up to the last one returned are visited.
+    """
+    windows = []
+    for positions in sorted_lists:
+        first, last = bisect.bisect_left(positions, lo), bisect.bisect_left(positions, hi)
+        if first < last:
+            windows.append((positions, first, last))
+    if len(windows) == 1:
+        positions, first, last = windows[0]
+        return positions[first : last if limit is None else min(last, first + limit)]
+
+    merged: List[int] = []
+    iterators = [map(positions.__getitem__, range(first, last)) for positions, first, last in windows]
+    for position in heapq.merge(*iterators):
+        if limit is not None and len(merged) >= limit:
+            break
+        if not merged or merged[-1] != position:
+            merged.append(position)
+    return merged
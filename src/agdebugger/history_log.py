@@ -0,0 +1,198 @@
+"""Append-only on-disk log of history messages and checkpoints, replayed to recover a session"""
+
+import os
+import struct
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Tuple
+
+from .blobs import BlobStore, blob_dir_for, dumps_with_blobs, loads_with_blobs
+from .types import TimeStampedMessage
+
+LOG_MAGIC = b"AGDLOG\x00\x01"
+
+# record kinds
+MESSAGE = 1
+CHECKPOINT = 2
+TRUNCATE_HISTORY = 3
+TRUNCATE_CHECKPOINTS = 4
+
+# kind, payload length, crc32 of the payload
+_FRAME = struct.Struct("<BII")
+_CUTOFF = struct.Struct("<q")
+
+
+@dataclass
+class RecoveredLog:
+    """History and full checkpoint snapshots rebuilt from a log."""
+
+    messages: List[TimeStampedMessage] = field(default_factory=list)
+    checkpoints: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+
+def is_history_log(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(LOG_MAGIC)) == LOG_MAGIC
+    except OSError:
+        return False
+
+
+def archive_history_log(path: str) -> str | None:
+    """
+    Renames a history log that holds records to a free `<path>.<n>` name, so a new log can start
+    at `path` without overwriting it. Returns the new path, or None if there was nothing to keep.
+    Blobs are shared by the logs in a directory, so the archived log still resolves them.
+    """
+    if not is_history_log(path):
+        return None
+    with open(path, "rb") as f:
+        f.seek(len(LOG_MAGIC))
+        if next(_read_records(f), None) is None:
+            return None
+
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        n += 1
+    archived = f"{path}.{n}"
+    os.replace(path, archived)
+    return archived
+
+
+def _read_records(f: BinaryIO) -> Iterator[Tuple[int, bytes, int]]:
+    """Yields (kind, payload, end offset) of each intact record, stopping at a torn or corrupt tail."""
+    offset = f.tell()
+    while True:
+        header = f.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            return
+        kind, length, checksum = _FRAME.unpack(header)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            return
+        offset += _FRAME.size + length
+        yield kind, payload, offset
+
+
+def read_history_log(path: str) -> RecoveredLog:
+    """
+    Replays a log into the history and checkpoints it describes. Partial checkpoints are merged
+    with the checkpoint before them, so each recovered checkpoint holds the full runtime state.
+    """
+    recovered = RecoveredLog()
+    store = BlobStore(blob_dir_for(path))
+    with open(path, "rb") as f:
+        if f.read(len(LOG_MAGIC)) != LOG_MAGIC:
+            raise ValueError(f"{path} is not a history log")
+
+        for kind, payload, _ in _read_records(f):
+            if kind == MESSAGE:
+                recovered.messages.append(loads_with_blobs(payload, store))
+            elif kind == CHECKPOINT:
+                timestamp, states = loads_with_blobs(payload, store)
+                latest = max(recovered.checkpoints, default=None)
+                previous = {} if latest is None else recovered.checkpoints[latest]
+                recovered.checkpoints[timestamp] = {**previous, **states}
+            elif kind == TRUNCATE_HISTORY:
+                (cutoff,) = _CUTOFF.unpack(payload)
+                recovered.messages = [m for m in recovered.messages if m.timestamp < cutoff]
+            elif kind == TRUNCATE_CHECKPOINTS:
+                (cutoff,) = _CUTOFF.unpack(payload)
+                recovered.checkpoints = {ts: s for ts, s in recovered.checkpoints.items() if ts < cutoff}
+            else:
+                print(f"[WARN] Skipping unknown record kind {kind} in history log {path}")
+    return recovered
+
+
+class HistoryLog:
+    """
+    Streams history messages, checkpoints and truncations to an append-only file, so a crashed
+    session can be rebuilt with `read_history_log`. Each record is framed with its kind, length
+    and a CRC, and flushed to the OS as it is written; the file is fsynced at most every
+    `fsync_interval` seconds.
+
+    Opening an existing log drops any torn record at its end and appends after the intact ones,
+    unless `reset` is set, which starts the log over.
+    """
+
+    def __init__(self, path: str, fsync_interval: float = 1.0, reset: bool = False) -> None:
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self.blob_store = BlobStore(blob_dir_for(path))
+        self.records = 0
+        self._last_sync = time.monotonic()
+        # checkpoints are appended from the checkpoint writer's thread
+        self._lock = threading.RLock()
+
+        self._file: BinaryIO
+        if reset or not is_history_log(path):
+            self._file = open(path, "wb")
+            self._file.write(LOG_MAGIC)
+            self.sync()
+        else:
+            self._file = open(path, "r+b")
+            self._file.seek(len(LOG_MAGIC))
+            end = len(LOG_MAGIC)
+            for _, _, record_end in _read_records(self._file):
+                self.records += 1
+                end = record_end
+            if end < os.fstat(self._file.fileno()).st_size:
+                print(f"[WARN] Dropping incomplete record at the end of history log {path}")
+                self._file.truncate(end)
+            self._file.seek(end)
+
+    @property
+    def empty(self) -> bool:
+        return self.records == 0
+
+    def append_message(self, message: TimeStampedMessage) -> None:
+        self._write(MESSAGE, dumps_with_blobs(message, self.blob_store))
+
+    def append_checkpoint(self, timestamp: int, states: Mapping[str, Any]) -> None:
+        """Records the agent states captured at `timestamp`; agents not included carry over."""
+        self._write(CHECKPOINT, dumps_with_blobs((timestamp, dict(states)), self.blob_store))
+
+    def truncate_history(self, cutoff: int) -> None:
+        self._write(TRUNCATE_HISTORY, _CUTOFF.pack(cutoff))
+
+    def truncate_checkpoints(self, cutoff: int) -> None:
+        self._write(TRUNCATE_CHECKPOINTS, _CUTOFF.pack(cutoff))
+
+    def write_baseline(
+        self, messages: Iterable[TimeStampedMessage], checkpoints: Mapping[int, Mapping[str, Any]]
+    ) -> None:
+        """Records an already loaded history and its checkpoints, in timestamp order."""
+        timestamps = sorted(checkpoints)
+        i = 0
+        for message in messages:
+            # a checkpoint is taken right before the message with its timestamp
+            while i < len(timestamps) and timestamps[i] <= message.timestamp:
+                self.append_checkpoint(timestamps[i], checkpoints[timestamps[i]])
+                i += 1
+            self.append_message(message)
+        for timestamp in timestamps[i:]:
+            self.append_checkpoint(timestamp, checkpoints[timestamp])
+        self.sync()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._file.closed:
+                self.sync()
+                self._file.close()
+
+    def _write(self, kind: int, payload: bytes) -> None:
+        # payloads are encoded by the caller, outside the lock
+        with self._lock:
+            self._file.write(_FRAME.pack(kind, len(payload), zlib.crc32(payload)) + payload)
+            self._file.flush()
+            self.records += 1
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.sync()
@@ -3,6 +3,9 @@ from typing import Any, Awaitable, Callable, List
 
 from autogen_core import AgentId, DropMessage, InterventionHandler, MessageContext
 
+from .events import HISTORY_TRUNCATED, MESSAGE_ADDED
+from .history import HistoryStore
+from .history_log import HistoryLog
 from .types import (
     AGEPublishMessage,
     AGEResponseMessage,
@@ -41,14 +44,18 @@ class AgDebuggerInterventionHandler(InterventionHandler):
 
     def __init__(
         self,
-        checkpointFunc: Callable[[int], Awaitable[None]],
+        checkpointFunc: Callable[[int, AGEPublishMessage | AGESendMessage | AGEResponseMessage], Awaitable[None]],
         history: List[TimeStampedMessage] | None = None,
+        history_log: HistoryLog | None = None,
     ) -> None:
         self.drop = False
-        self.history: List[TimeStampedMessage] = [] if history is None else history
+        self.history = HistoryStore([] if history is None else history)
+        self.history_log = history_log
         self.timestamp_counter = Counter()
         self.checkpointFunc = checkpointFunc
         self._current_score: ScoreResult | None = None
+        # called with the name of each state change, see `events`
+        self.listeners: List[Callable[[str], None]] = []
 
         if len(self.history) > 0:
             self.timestamp_counter.set(self.history[-1].timestamp + 1)
@@ -56,10 +63,18 @@ class AgDebuggerInterventionHandler(InterventionHandler):
     def invalidate_cache(self) -> None:
         self._current_score = None
 
+    def emit(self, event: str) -> None:
+        for listener in self.listeners:
+            listener(event)
+
     def handle_history_add(self, message: AGEPublishMessage | AGESendMessage | AGEResponseMessage) -> None:
         curr_timestep = self.timestamp_counter.get()
-        self.history.append(TimeStampedMessage(message=message, timestamp=curr_timestep))
+        timestamped = TimeStampedMessage(message=message, timestamp=curr_timestep)
+        self.history.append(timestamped)
+        if self.history_log is not None:
+            self.history_log.append_message(timestamped)
         self.timestamp_counter.increment()
+        self.emit(MESSAGE_ADDED)
 
     async def on_send(
         self, message: Any, *, message_context: MessageContext, recipient: AgentId
@@ -75,7 +90,7 @@ class AgDebuggerInterventionHandler(InterventionHandler):
             message_id=message_context.message_id,
         )
         self.invalidate_cache()
-        await self.checkpointFunc(self.timestamp_counter.get())
+        await self.checkpointFunc(self.timestamp_counter.get(), m)
         self.handle_history_add(m)
         return message
 
@@ -91,7 +106,7 @@ class AgDebuggerInterventionHandler(InterventionHandler):
             message_id=message_context.message_id,
         )
         self.invalidate_cache()
-        await self.checkpointFunc(self.timestamp_counter.get())
+        await self.checkpointFunc(self.timestamp_counter.get(), m)
         self.handle_history_add(m)
         return message
 
@@ -106,16 +121,19 @@ class AgDebuggerInterventionHandler(InterventionHandler):
             recipient=recipient,
         )
         self.invalidate_cache()
-        await self.checkpointFunc(self.timestamp_counter.get())
+        await self.checkpointFunc(self.timestamp_counter.get(), m)
         self.handle_history_add(m)
         return message
 
     def get_message_at_timestamp(self, timestamp: int) -> TimeStampedMessage | None:
-        return next((m for m in self.history if m.timestamp == timestamp), None)
+        return self.history.get(timestamp)
 
     def purge_history_after_cutoff(self, cutoff: int) -> None:
         """
         Remove messages from history after cutoff timestamp.
         """
-        self.history = [m for m in self.history if m.timestamp < cutoff]
+        self.history.truncate(cutoff)
+        if self.history_log is not None:
+            self.history_log.truncate_history(cutoff)
         self.invalidate_cache()
+        self.emit(HISTORY_TRUNCATED)
@@ -1,12 +1,15 @@
 import pickle
+from typing import Any
 
 import aiofiles
 from autogen_core import SingleThreadedAgentRuntime
 
+from .blobs import BlobStore, blob_dir_for, dumps_with_blobs
+from .checkpoint import CheckpointStore
 from .intervention import AgDebuggerInterventionHandler
 
 #### utils for running intervention handler from python script
-STATE_CACHE = {}
+STATE_CACHE = CheckpointStore()
 
 
 async def save_agent_state_to_cache(runtime: SingleThreadedAgentRuntime, timestep: int) -> None:
@@ -31,3 +34,10 @@ async def write_file_async(path, data):
     async with aiofiles.open(path, "wb") as f:
         buffer = pickle.dumps(data)
         await f.write(buffer)
+
+
+async def write_file_with_blobs_async(path: str, data: Any) -> None:
+    """Like write_file_async, but images and large base64 strings go to a blobs folder next to the file."""
+    buffer = dumps_with_blobs(data, BlobStore(blob_dir_for(path)))
+    async with aiofiles.open(path, "wb") as f:
+        await f.write(buffer)
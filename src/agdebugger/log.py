@@ -1,7 +1,7 @@
+import json
 import logging
-from typing import List
-
-from pydantic import BaseModel
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple
 
 # PORT-TODO -- maybe drop these messages?
 # these are here https://github.com/microsoft/autogen/blob/225eb9d0b205576dba1cfc97856d05ccce5ab71c/python/packages/autogen-magentic-one/src/autogen_magentic_one/messages.py#L43 but not sure now to import?
@@ -10,30 +10,106 @@ from pydantic import BaseModel
 # from .types import ThoughtMessage
 
 
-class LogMessage(BaseModel):
-    message: str
-    level: str
-    name: str
+class LogRecord(NamedTuple):
+    """A log entry as kept by `RingBufferHandler`."""
+
+    seq: int
     time: float
+    level: int
+    name: str
+    message: str
 
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "message": self.message,
+            "level": logging.getLevelName(self.level),
+            "name": self.name,
+            "time": self.time,
+        }
 
-class ListHandler(logging.Handler):
-    def __init__(self) -> None:
-        super().__init__()
-        self.log_messages: List[LogMessage] = []
 
-    def emit(self, record: logging.LogRecord) -> None:
-        self.log_messages.append(
-            LogMessage(
-                message=str(record.msg),
-                level=record.levelname,
-                name=record.name,
-                time=record.created,
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the last `capacity` log records, numbered by a sequence that only grows. Records
+    below the handler level, or from loggers outside `names` (logger names or their parents),
+    are dropped when emitted. With `spill_path`, records pushed out of the buffer are written
+    as JSON lines to a file that rotates at `spill_max_bytes`.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 10000,
+        level: int | str = logging.NOTSET,
+        names: Iterable[str] | None = None,
+        spill_path: str | None = None,
+        spill_max_bytes: int = 10 * 1024 * 1024,
+        spill_backups: int = 3,
+        on_emit: Callable[[], None] | None = None,
+    ) -> None:
+        super().__init__(level)
+        if capacity < 1:
+            raise ValueError("Log capacity must be at least 1")
+        self.capacity = capacity
+        self.names = None if names is None else tuple(names)
+        self.on_emit = on_emit
+        self._buffer: List[LogRecord | None] = [None] * capacity
+        # sequence number of the next record
+        self._next_seq = 0
+        self._spill: RotatingFileHandler | None = None
+        if spill_path is not None:
+            self._spill = RotatingFileHandler(
+                spill_path, maxBytes=spill_max_bytes, backupCount=spill_backups, delay=True
             )
-        )
 
-    def get_log_messages(self) -> List[LogMessage]:
-        return self.log_messages
+    def accepts(self, name: str) -> bool:
+        return self.names is None or any(name == n or name.startswith(n + ".") for n in self.names)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not self.accepts(record.name):
+            return
+        # called with the handler lock held
+        slot = self._next_seq % self.capacity
+        evicted = self._buffer[slot]
+        self._buffer[slot] = LogRecord(self._next_seq, record.created, record.levelno, record.name, str(record.msg))
+        self._next_seq += 1
+        if evicted is not None and self._spill is not None:
+            self._spill.emit(logging.makeLogRecord({"msg": json.dumps(evicted.to_json()), "levelno": evicted.level}))
+        if self.on_emit is not None:
+            self.on_emit()
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the latest record, -1 if there is none."""
+        return self._next_seq - 1
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest record still in the buffer."""
+        return max(0, self._next_seq - self.capacity)
+
+    @property
+    def count(self) -> int:
+        """Number of records in the buffer."""
+        return self._next_seq - self.first_seq
+
+    def records(self, after: int | None = None, limit: int | None = None) -> List[LogRecord]:
+        """Returns up to `limit` buffered records with sequence numbers greater than `after`, oldest first."""
+        self.acquire()
+        try:
+            start = self.first_seq if after is None else max(after + 1, self.first_seq)
+            end = self._next_seq if limit is None else min(self._next_seq, start + max(limit, 0))
+            return [self._buffer[seq % self.capacity] for seq in range(start, end)]  # type: ignore[misc]
+        finally:
+            self.release()
+
+    def get_log_messages(self, after: int | None = None, limit: int | None = None) -> List[Dict[str, Any]]:
+        return [record.to_json() for record in self.records(after, limit)]
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+        super().close()
 
 
 # class LogToHistoryHandler(logging.Handler):
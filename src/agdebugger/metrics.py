@@ -0,0 +1,94 @@
+"""Counters for checkpoint costs and a Prometheus text exposition of them"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+
+@dataclass
+class DurationStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seconds: float = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "total_seconds": self.total_seconds,
+            "mean_seconds": self.total_seconds / max(self.count, 1),
+            "max_seconds": self.max_seconds,
+            "last_seconds": self.last_seconds,
+        }
+
+
+class CheckpointMetrics:
+    """Durations of checkpoint saves and restores, overall and per agent."""
+
+    def __init__(self) -> None:
+        self.save = DurationStats()
+        self.restore = DurationStats()
+        self.agent_save: Dict[str, DurationStats] = defaultdict(DurationStats)
+        self.agent_restore: Dict[str, DurationStats] = defaultdict(DurationStats)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "save": self.save.to_dict(),
+            "restore": self.restore.to_dict(),
+            "agent_save": {agent: stats.to_dict() for agent, stats in self.agent_save.items()},
+            "agent_restore": {agent: stats.to_dict() for agent, stats in self.agent_restore.items()},
+        }
+
+
+# (labels, value) pairs of one metric
+Samples = Iterable[Tuple[Mapping[str, str], float]]
+
+
+class PrometheusWriter:
+    """Builds a Prometheus text format (version 0.0.4) exposition."""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, prefix: str = "agdebugger_") -> None:
+        self.prefix = prefix
+        self._lines: List[str] = []
+
+    def metric(self, name: str, metric_type: str, help_text: str, samples: Samples) -> None:
+        name = self.prefix + name
+        self._lines.append(f"# HELP {name} {help_text}")
+        self._lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            self._lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    def summary(self, name: str, help_text: str, stats: Iterable[Tuple[Mapping[str, str], DurationStats]]) -> None:
+        """Writes duration stats as a summary with _count and _sum series."""
+        full_name = self.prefix + name
+        self._lines.append(f"# HELP {full_name} {help_text}")
+        self._lines.append(f"# TYPE {full_name} summary")
+        for labels, stat in stats:
+            label_text = _format_labels(labels)
+            self._lines.append(f"{full_name}_count{label_text} {stat.count}")
+            self._lines.append(f"{full_name}_sum{label_text} {_format_value(stat.total_seconds)}")
+
+    def render(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+def _format_labels(labels: Mapping[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label_value(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,113 @@
+"""Rebuilds agent state between checkpoints by re-delivering recorded history messages"""
+
+import weakref
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Tuple
+
+from autogen_core import AgentId, CancellationToken, MessageContext, SingleThreadedAgentRuntime, TopicId
+from autogen_core._message_handler_context import MessageHandlerContext
+
+from .types import AGEPublishMessage, AGEResponseMessage, AGESendMessage, TimeStampedMessage
+
+
+class RecordedResponses:
+    """Recorded responses to direct messages, keyed by (responder, requester)."""
+
+    def __init__(self, messages: List[TimeStampedMessage]) -> None:
+        self._responses: Dict[Tuple[str, str], Deque[Any]] = defaultdict(deque)
+        for m in messages:
+            if isinstance(m.message, AGEResponseMessage) and m.message.recipient is not None:
+                self._responses[(str(m.message.sender), str(m.message.recipient))].append(m.message.message)
+
+    def pop(self, responder: AgentId, requester: AgentId | None) -> Any:
+        responses = self._responses.get((str(responder), str(requester)))
+        if not responses:
+            raise LookupError(f"No recorded response from {responder} to {requester} before the replay target")
+        return responses.popleft()
+
+
+# set while a replay delivers messages; handlers run in its context, other callers never see it
+_replay: ContextVar[RecordedResponses | None] = ContextVar("agdebugger_replay", default=None)
+_routed_runtimes: "weakref.WeakSet[SingleThreadedAgentRuntime]" = weakref.WeakSet()
+
+
+def _route_replayed_calls(runtime: SingleThreadedAgentRuntime) -> None:
+    """
+    Wraps the runtime's publish and send, once, so calls made by replayed handlers are absorbed
+    while calls from anywhere else, e.g. the UI during a replay, reach the runtime as usual.
+    """
+    if runtime in _routed_runtimes:
+        return
+    _routed_runtimes.add(runtime)
+    publish_message = runtime.publish_message
+    send_message = runtime.send_message
+
+    async def route_publish(message: Any, topic_id: TopicId, **kwargs: Any) -> None:
+        if _replay.get() is None:
+            return await publish_message(message, topic_id, **kwargs)
+        return None
+
+    async def route_send(message: Any, recipient: AgentId, *, sender: AgentId | None = None, **kwargs: Any) -> Any:
+        responses = _replay.get()
+        if responses is None:
+            return await send_message(message, recipient, sender=sender, **kwargs)
+        return responses.pop(recipient, sender)
+
+    runtime.publish_message = route_publish  # type: ignore[method-assign]
+    runtime.send_message = route_send  # type: ignore[method-assign]
+
+
+async def replay_messages(runtime: SingleThreadedAgentRuntime, messages: List[TimeStampedMessage]) -> None:
+    """
+    Re-delivers recorded messages to their recipients, in timestamp order, to bring agent state
+    forward from a restored checkpoint.
+
+    Messages that agents send or publish while handling them are not queued again since they
+    are already part of the recorded history. Direct sends made by handlers are answered with
+    the recorded response instead of being delivered. Sends and publishes made outside the
+    replay, while it runs, are delivered as usual.
+    """
+    _route_replayed_calls(runtime)
+    token = _replay.set(RecordedResponses(messages))
+    try:
+        for m in messages:
+            match m.message:
+                case AGESendMessage(message=message, sender=sender, recipient=recipient, message_id=message_id):
+                    context = MessageContext(
+                        sender=sender,
+                        topic_id=None,
+                        is_rpc=True,
+                        cancellation_token=CancellationToken(),
+                        message_id=message_id,
+                    )
+                    await _deliver(runtime, recipient, message, context, m.timestamp)
+                case AGEPublishMessage(message=message, sender=sender, topic_id=topic_id, message_id=message_id):
+                    context = MessageContext(
+                        sender=sender,
+                        topic_id=topic_id,
+                        is_rpc=False,
+                        cancellation_token=CancellationToken(),
+                        message_id=message_id,
+                    )
+                    recipients = await runtime._subscription_manager.get_subscribed_recipients(topic_id)
+                    for recipient in recipients:
+                        if sender is not None and recipient == sender:
+                            continue
+                        await _deliver(runtime, recipient, message, context, m.timestamp)
+                case AGEResponseMessage():
+                    # consumed by the replayed send that is waiting for it
+                    pass
+    finally:
+        _replay.reset(token)
+
+
+async def _deliver(
+    runtime: SingleThreadedAgentRuntime, recipient: AgentId, message: Any, context: MessageContext, timestamp: int
+) -> None:
+    agent = await runtime._get_agent(recipient)
+    with MessageHandlerContext.populate_context(agent.id):
+        try:
+            await agent.on_message(message, ctx=context)
+        except Exception as e:
+            print(f"[WARN] Replay of message {timestamp} to {recipient} failed: {e}")
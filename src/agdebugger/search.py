@@ -0,0 +1,152 @@
+"""Incremental inverted index over the text of history messages"""
+
+import bisect
+import re
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Set
+
+from .columns import iter_content_text
+
+_TOKEN_RE = re.compile(r"\w+")
+_QUERY_RE = re.compile(r'(\^?)"([^"]*)"?|(\^?)(\S+)')
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.casefold() for token in _TOKEN_RE.findall(text)]
+
+
+@dataclass
+class SearchTerm:
+    """Consecutive tokens to match, e.g. a phrase or a single word."""
+
+    tokens: List[str]
+    # the last token matches any token it is a prefix of
+    prefix: bool = False
+    # only match at the start of the message text
+    anchored: bool = False
+
+
+def parse_query(query: str) -> List[SearchTerm]:
+    """
+    Parses a search query into terms that must all match. A term is a word, or a phrase in
+    double quotes. A trailing `*` makes the last word of a term a prefix, and a leading `^`
+    anchors a term to the start of the message text, e.g. `^"I typed" weath*`.
+    """
+    terms = []
+    for match in _QUERY_RE.finditer(query):
+        quoted_anchor, phrase, anchor, word = match.groups()
+        text = phrase if phrase is not None else word
+        prefix = text.endswith("*")
+        tokens = tokenize(text)
+        if tokens:
+            terms.append(SearchTerm(tokens, prefix=prefix, anchored=bool(quoted_anchor or anchor)))
+    return terms
+
+
+class SearchIndex:
+    """
+    Maps tokens of message text to the timestamps and token positions they occur at, for word,
+    prefix and phrase search. Messages are added in timestamp order, and truncating removes the
+    postings of the dropped messages only, so both stay cheap on long histories.
+    """
+
+    def __init__(self) -> None:
+        # token -> timestamp -> positions of the token in that message
+        self._postings: Dict[str, Dict[int, List[int]]] = {}
+        # sorted, for prefix lookups
+        self._vocabulary: List[str] = []
+        self._timestamps = array("q")
+        self._document_tokens: List[Set[str]] = []
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def add(self, timestamp: int, message: Any) -> None:
+        """Indexes the text of a message (the inner message of a history record)."""
+        self.add_text(timestamp, iter_content_text(message))
+
+    def add_text(self, timestamp: int, texts: Iterable[str]) -> None:
+        tokens: Set[str] = set()
+        position = 0
+        for text in texts:
+            for token in tokenize(text):
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    bisect.insort(self._vocabulary, token)
+                postings.setdefault(timestamp, []).append(position)
+                tokens.add(token)
+                position += 1
+            # keep phrases from matching across separate texts
+            position += 1
+
+        self._timestamps.append(timestamp)
+        self._document_tokens.append(tokens)
+
+    def truncate(self, cutoff: int) -> None:
+        """Removes all messages at or after the cutoff timestamp."""
+        start = bisect.bisect_left(self._timestamps, cutoff)
+        for timestamp, tokens in zip(self._timestamps[start:], self._document_tokens[start:], strict=True):
+            for token in tokens:
+                postings = self._postings[token]
+                del postings[timestamp]
+                if not postings:
+                    del self._postings[token]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+        del self._timestamps[start:]
+        del self._document_tokens[start:]
+
+    def search(self, query: str, limit: int | None = None) -> List[int]:
+        """Returns the timestamps of the messages matching all terms of a query, in order."""
+        terms = parse_query(query)
+        if not terms:
+            return []
+
+        matches: Set[int] | None = None
+        # most selective terms first, so later ones check fewer candidates
+        for term in sorted(terms, key=lambda t: (t.prefix, -len(t.tokens))):
+            matches = self._match(term, matches)
+            if not matches:
+                return []
+
+        timestamps = sorted(matches or ())
+        return timestamps if limit is None else timestamps[:limit]
+
+    def tokens_with_prefix(self, prefix: str) -> List[str]:
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + "\U0010ffff")
+        return self._vocabulary[start:end]
+
+    def _match(self, term: SearchTerm, candidates: Set[int] | None) -> Set[int]:
+        # positions of each token of the term, by timestamp
+        token_postings: List[Dict[int, List[int]]] = []
+        for i, token in enumerate(term.tokens):
+            if term.prefix and i == len(term.tokens) - 1:
+                merged: Dict[int, List[int]] = {}
+                for expansion in self.tokens_with_prefix(token):
+                    for timestamp, positions in self._postings[expansion].items():
+                        merged.setdefault(timestamp, []).extend(positions)
+                token_postings.append(merged)
+            else:
+                token_postings.append(self._postings.get(token, {}))
+
+        smallest = min(token_postings, key=len)
+        matches = set(smallest) if candidates is None else {ts for ts in candidates if ts in smallest}
+        for postings in token_postings:
+            matches = {ts for ts in matches if ts in postings}
+
+        if len(term.tokens) == 1 and not term.anchored:
+            return matches
+        return {ts for ts in matches if self._has_phrase(ts, token_postings, term.anchored)}
+
+    @staticmethod
+    def _has_phrase(timestamp: int, token_postings: List[Dict[int, List[int]]], anchored: bool) -> bool:
+        following = [set(postings[timestamp]) for postings in token_postings[1:]]
+        starts = [0] if anchored else token_postings[0][timestamp]
+        for start in starts:
+            if start in token_postings[0][timestamp] and all(
+                start + offset in positions for offset, positions in enumerate(following, 1)
+            ):
+                return True
+        return False
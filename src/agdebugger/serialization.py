@@ -1,6 +1,6 @@
 import json
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Any, Dict, List
 
 from autogen_agentchat.messages import (
     AgentEvent,
@@ -32,6 +32,8 @@ from autogen_core.models import (
     UserMessage,
 )
 
+from .blobs import BLOB_STORE, externalize_blobs, internalize_blobs
+
 
 @dataclass
 class FieldInfo:
@@ -157,7 +159,8 @@ def serialize(message: ChatMessage | AgentEvent | LLMMessage | None) -> dict:
         if message is None:
             return {"type": "None"}
 
-        serialized_message = message.model_dump()
+        # images and other large base64 fields are sent as references to /blob/{hash}
+        serialized_message: Dict[str, Any] = externalize_blobs(message.model_dump(), BLOB_STORE)
 
         # get name in case doesnt exist
         type_name = type(message).__name__
@@ -174,6 +177,7 @@ def deserialize(
     try:
         if isinstance(message_dict, str):
             message_dict = json.loads(message_dict)
+        message_dict = internalize_blobs(message_dict, BLOB_STORE)
 
         message_type = message_dict["type"]  # type: ignore
 
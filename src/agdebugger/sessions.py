@@ -0,0 +1,85 @@
+"""Tree of finished history sessions that share the messages before their fork point"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Mapping
+
+from .types import HistorySessionNode, MessageHistorySession, ScoreResult
+
+
+class SessionTree(Mapping[int, MessageHistorySession]):
+    """
+    Finished sessions, keyed by session id. Each session records its parent and the timestamp
+    it forked from it (its reset point), and keeps only its messages from that timestamp on;
+    the messages before it are those of the parent. Memory grows with the number of distinct
+    messages rather than with the number of reverts.
+
+    Looking up a session renders its full message list from the chain of its ancestors. The
+    last few rendered sessions are cached.
+    """
+
+    def __init__(self, cache_size: int = 4) -> None:
+        self.nodes: Dict[int, HistorySessionNode] = {}
+        self.cache_size = cache_size
+        self._rendered: OrderedDict[int, MessageHistorySession] = OrderedDict()
+
+    def __getitem__(self, session: int) -> MessageHistorySession:
+        rendered = self._rendered.get(session)
+        if rendered is None:
+            node = self.nodes[session]
+            rendered = MessageHistorySession(
+                messages=self.render_messages(session),
+                current_session_reset_from=node.fork_timestamp,
+                next_session_starts_at=None,
+                current_session_score=node.score,
+            )
+            self._rendered[session] = rendered
+            if len(self._rendered) > self.cache_size:
+                self._rendered.popitem(last=False)
+        else:
+            self._rendered.move_to_end(session)
+        return rendered
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.nodes)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def add(
+        self,
+        session: int,
+        parent: int | None,
+        fork_timestamp: int | None,
+        messages: List[Dict[str, Any]],
+        score: ScoreResult | None = None,
+    ) -> HistorySessionNode:
+        """Adds a finished session; `messages` are its messages at or after `fork_timestamp`."""
+        if parent is not None and parent not in self.nodes:
+            raise KeyError(f"Unknown parent session {parent}")
+        node = self.nodes[session] = HistorySessionNode(
+            parent=parent, fork_timestamp=fork_timestamp, messages=messages, score=score
+        )
+        self._rendered.pop(session, None)
+        return node
+
+    def node(self, session: int) -> HistorySessionNode:
+        return self.nodes[session]
+
+    def render_messages(self, session: int | None, end: int | None = None) -> List[Dict[str, Any]]:
+        """Returns the full message list of a session, up to (excluding) timestamp `end`."""
+        # walk up to the root, narrowing the part each ancestor contributes
+        chain = []
+        while session is not None:
+            node = self.nodes[session]
+            chain.append((node, end))
+            if node.fork_timestamp is not None:
+                end = node.fork_timestamp if end is None else min(end, node.fork_timestamp)
+            session = node.parent
+
+        messages: List[Dict[str, Any]] = []
+        for node, node_end in reversed(chain):
+            if node_end is None:
+                messages.extend(node.messages)
+            else:
+                messages.extend(m for m in node.messages if m["timestamp"] < node_end)
+        return messages
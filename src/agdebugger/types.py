@@ -1,35 +1,85 @@
 from dataclasses import dataclass
-from typing import Any, Dict, List, Mapping, Optional
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 from autogen_core import AgentId, TopicId
 from pydantic import BaseModel
 
+# A team has a handful of agents and topics, but every history record refers to some. Records
+# share one instance per distinct id, which also lets pickle write each id once per file.
+_AGENT_IDS: Dict[AgentId, AgentId] = {}
+_TOPIC_IDS: Dict[TopicId, TopicId] = {}
 
-@dataclass
-class AGEPublishMessage:
+
+def intern_agent_id(agent_id: AgentId | None) -> AgentId | None:
+    if agent_id is None:
+        return None
+    return _AGENT_IDS.setdefault(agent_id, agent_id)
+
+
+def intern_topic_id(topic_id: TopicId) -> TopicId:
+    return _TOPIC_IDS.setdefault(topic_id, topic_id)
+
+
+class _Record:
+    """
+    Base of the slotted history records. They pickle as a constructor call with positional
+    field values, which is smaller than a field name dict and re-interns ids on load. History
+    files pickled before records had slots carry a dict, and are restored by `__setstate__`.
+    """
+
+    __slots__ = ()
+
+    def __reduce__(self) -> Tuple[Any, Tuple[Any, ...]]:
+        return (type(self), tuple(getattr(self, name) for name in self.__match_args__))  # type: ignore[attr-defined]
+
+    def __setstate__(self, state: Any) -> None:
+        if isinstance(state, tuple):
+            # (dict state, slots state) as pickled by object.__reduce_ex__
+            state = {**(state[0] or {}), **(state[1] or {})}
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        post_init = getattr(self, "__post_init__", None)
+        if post_init is not None:
+            post_init()
+
+
+@dataclass(slots=True)
+class AGEPublishMessage(_Record):
     message: Any
     sender: AgentId | None
     topic_id: TopicId
     message_id: str
 
+    def __post_init__(self) -> None:
+        self.sender = intern_agent_id(self.sender)
+        self.topic_id = intern_topic_id(self.topic_id)
 
-@dataclass
-class AGESendMessage:
+
+@dataclass(slots=True)
+class AGESendMessage(_Record):
     message: Any
     sender: AgentId | None
     recipient: AgentId
     message_id: str
 
+    def __post_init__(self) -> None:
+        self.sender = intern_agent_id(self.sender)
+        self.recipient = intern_agent_id(self.recipient)  # type: ignore[assignment]
 
-@dataclass
-class AGEResponseMessage:
+
+@dataclass(slots=True)
+class AGEResponseMessage(_Record):
     message: Any
     sender: AgentId | None
     recipient: AgentId | None
 
+    def __post_init__(self) -> None:
+        self.sender = intern_agent_id(self.sender)
+        self.recipient = intern_agent_id(self.recipient)
 
-@dataclass
-class TimeStampedMessage:
+
+@dataclass(slots=True)
+class TimeStampedMessage(_Record):
     message: AGEPublishMessage | AGESendMessage | AGEResponseMessage
     timestamp: int
 
@@ -65,6 +115,15 @@ class MessageHistorySession:
     current_session_score: ScoreResult | None
 
 
+@dataclass
+class HistorySessionNode:
+    parent: int | None
+    # the parent's messages before this timestamp are shared, `messages` holds the rest
+    fork_timestamp: int | None
+    messages: List[Dict[str, Any]]
+    score: ScoreResult | None
+
+
 @dataclass
 class ContentMessage:
     timestamp: int
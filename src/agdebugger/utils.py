@@ -1,9 +1,11 @@
 import importlib
 import inspect
+import json
 import os
 import sys
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Any, Callable, Dict
+from typing import Any, Callable, Dict, Tuple
 
 from autogen_agentchat.teams import BaseGroupChat
 from autogen_core import Agent, AgentId
@@ -13,6 +15,7 @@ from autogen_core._single_threaded_agent_runtime import (
     SendMessageEnvelope,
 )
 
+from .blobs import hash_bytes
 from .serialization import serialize
 from .types import AGEPublishMessage, AGEResponseMessage, AGESendMessage, ThoughtMessage
 
@@ -35,6 +38,45 @@ def inner_message_to_json(msg: Any) -> Dict[str, Any]:
     return serialize(msg)
 
 
+def content_hash(message_json: Any) -> str:
+    """
+    Returns a hash of a serialized message that is stable across processes and runs. Large
+    binary fields are blob references by then, so they are hashed by their content hash.
+    """
+    canonical = json.dumps(message_json, sort_keys=True, separators=(",", ":"), default=str)
+    return hash_bytes(canonical.encode("utf-8"))
+
+
+# serialized inner messages by message id, shared by the queue and history views
+_SERIALIZED_CACHE_SIZE = 1024
+_serialized: OrderedDict[str, Tuple[Any, Dict[str, Any], str]] = OrderedDict()
+
+
+def serialize_with_hash(message: Any, message_id: str | None = None) -> Tuple[Dict[str, Any], str]:
+    """
+    Returns the JSON form of an inner message and its content hash. Results are memoized by
+    message id; an edited message keeps its id but is a new object, so it is serialized again.
+    """
+    if message_id is not None:
+        cached = _serialized.get(message_id)
+        if cached is not None and cached[0] is message:
+            _serialized.move_to_end(message_id)
+            return cached[1], cached[2]
+
+    message_json = inner_message_to_json(message)
+    digest = content_hash(message_json)
+    if message_id is not None:
+        _serialized[message_id] = (message, message_json, digest)
+        if len(_serialized) > _SERIALIZED_CACHE_SIZE:
+            _serialized.popitem(last=False)
+    return message_json, digest
+
+
+def _fallback_id(kind: str, msg: Any, timestamp: int | None) -> str:
+    # timestamps are unique within a session; queued messages are told apart by object
+    return f"{kind}-{timestamp}" if timestamp is not None else f"{kind}-object-{id(msg)}"
+
+
 def message_to_json(
     msg: (
         PublishMessageEnvelope
@@ -47,53 +89,67 @@ def message_to_json(
     ),
     timestamp: int | None = None,
 ) -> Dict[str, Any]:
+    """
+    Serializes a queued or recorded message. `id` is the runtime's message id; responses and
+    thoughts have none, so theirs is made from their timestamp, or for queued messages from the
+    object, and stays unique even for identical messages. `hash` identifies identical messages
+    across sessions and runs.
+    """
     # if not is_dataclass(msg):
     #     raise ValueError(f"Expected a dataclass, got {type(msg)}")
 
     match msg:
-        case PublishMessageEnvelope(message=message, sender=sender) | AGEPublishMessage(
-            message=message, sender=sender
+        case PublishMessageEnvelope(message=message, sender=sender, message_id=message_id) | AGEPublishMessage(
+            message=message, sender=sender, message_id=message_id
         ):
+            message_json, digest = serialize_with_hash(message, message_id)
             return {
-                "message": inner_message_to_json(message),
+                "message": message_json,
                 "sender": str(sender) if sender is not None else None,
                 "recipient": None,
                 "type": "PublishMessageEnvelope",
                 "timestamp": timestamp,
-                "id": id(message),  # TODO: look into messsage.id
+                "id": message_id,
+                "hash": digest,
             }
 
         case SendMessageEnvelope(
-            message=message, sender=sender, recipient=recipient
-        ) | AGESendMessage(message=message, sender=sender, recipient=recipient):
+            message=message, sender=sender, recipient=recipient, message_id=message_id
+        ) | AGESendMessage(message=message, sender=sender, recipient=recipient, message_id=message_id):
+            message_json, digest = serialize_with_hash(message, message_id)
             return {
-                "message": inner_message_to_json(message),
+                "message": message_json,
                 "sender": sender.type if sender is not None else None,
                 "recipient": str(recipient),
                 "type": "SendMessageEnvelope",
                 "timestamp": timestamp,
-                "id": id(message),  # TODO: look into messsage.id
+                "id": message_id,
+                "hash": digest,
             }
         case ResponseMessageEnvelope(
             message=message, sender=sender, recipient=recipient
         ) | AGEResponseMessage(message=message, sender=sender, recipient=recipient):
+            message_json, digest = serialize_with_hash(message)
             return {
-                "message": inner_message_to_json(message),
+                "message": message_json,
                 "sender": str(sender),
                 "recipient": str(recipient) if recipient is not None else None,
                 "type": "ResponseMessageEnvelope",
                 "timestamp": timestamp,
-                "id": id(message),
+                "id": _fallback_id("response", msg, timestamp),
+                "hash": digest,
             }
 
         case ThoughtMessage(content=content, senderName=senderName):
+            digest = content_hash([senderName, content])
             return {
                 "message": content,
                 "sender": senderName,
                 "recipient": None,
                 "type": "ThoughtMessage",
                 "timestamp": timestamp,
-                "id": id(msg),
+                "id": _fallback_id("thought", msg, timestamp),
+                "hash": digest,
             }
 
 
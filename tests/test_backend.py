@@ -12,8 +12,11 @@ from autogen_core import EVENT_LOGGER_NAME
 from autogen_ext.models.openai import OpenAIChatCompletionClient
 
 from agdebugger.backend import BackendRuntimeManager
+from agdebugger.checkpoint import CheckpointPolicy, CheckpointRetention
+from agdebugger.history_log import HistoryLog, read_history_log
 
 from .setup.local_agent import LocalAgent
+from .test_events import parse_frame
 
 
 def get_agent_team():
@@ -26,12 +29,12 @@ def get_agent_team():
     return team
 
 
-async def create_backend() -> BackendRuntimeManager:
+async def create_backend(**kwargs) -> BackendRuntimeManager:
     groupchat = get_agent_team()
     logger = logging.getLogger(EVENT_LOGGER_NAME)
     logger.setLevel(logging.DEBUG)
 
-    backend = BackendRuntimeManager(groupchat, logger)
+    backend = BackendRuntimeManager(groupchat, logger, **kwargs)
     await backend.async_initialize()
 
     return backend
@@ -111,3 +114,344 @@ async def test_edit_and_revert_message():
 
     assert backend.unprocessed_messages_count == 1
     assert len(backend.intervention_handler.history) == 0
+
+
+@pytest.mark.asyncio
+async def test_background_checkpoints_and_revert():
+    """Checkpoints written off the hot path are all present after a revert barrier"""
+
+    backend = await create_backend(background_checkpoints=True)
+    start_message = GroupChatStart(
+        messages=[
+            TextMessage(
+                source="user",
+                content="0",
+            )
+        ]
+    )
+    recipient = backend.groupchat._group_chat_manager_topic_type
+
+    await backend.send_message(start_message, recipient)
+    backend.start_processing()
+    await asyncio.sleep(0)
+    await backend.stop_processing()
+
+    num_messages = len(backend.intervention_handler.history)
+    await backend.flush_checkpoints()
+    assert len(backend.agent_checkpoints) == num_messages
+    assert backend.get_checkpoint_metrics()["timings"]["count"] == num_messages
+
+    await backend.revert_message(2)
+    assert len(backend.intervention_handler.history) == 3
+    assert sorted(backend.agent_checkpoints.keys()) == [0, 1, 2]
+
+
+async def run_step_by_step(backend: BackendRuntimeManager) -> None:
+    start_message = GroupChatStart(
+        messages=[
+            TextMessage(
+                source="user",
+                content="0",
+            )
+        ]
+    )
+    recipient = backend.groupchat._group_chat_manager_topic_type
+
+    await backend.send_message(start_message, recipient)
+    await asyncio.sleep(0)
+    while backend.unprocessed_messages_count > 0:
+        await backend.process_next()
+        # let the delivered message be fully handled before the next step
+        while len(backend.runtime._background_tasks) > 0:
+            await asyncio.sleep(0)
+
+
+def states_by_agent_type(state):
+    return {agent_id.split("/")[0]: agent_state for agent_id, agent_state in state.items()}
+
+
+@pytest.mark.asyncio
+async def test_sparse_checkpoints_replay_on_revert():
+    """Reverting to a timestamp without a checkpoint replays from the nearest earlier one"""
+
+    full_backend = await create_backend()
+    await run_step_by_step(full_backend)
+
+    sparse_backend = await create_backend(checkpoint_policy=CheckpointPolicy(every_n=4))
+    await run_step_by_step(sparse_backend)
+
+    assert len(sparse_backend.intervention_handler.history) == len(full_backend.intervention_handler.history)
+    assert len(sparse_backend.agent_checkpoints) < len(sparse_backend.intervention_handler.history)
+
+    for target in [7, 5]:
+        assert target not in sparse_backend.agent_checkpoints
+        expected = states_by_agent_type(full_backend.agent_checkpoints[target])
+
+        await sparse_backend.revert_message(target)
+        actual = states_by_agent_type(await sparse_backend.runtime.save_state())
+
+        assert actual == expected
+
+
+@pytest.mark.asyncio
+async def test_revert_reloads_only_changed_agents():
+    """Agents that did not change since the revert target keep their live state"""
+
+    backend = await create_backend()
+    await run_step_by_step(backend)
+
+    target = len(backend.intervention_handler.history) - 2
+    expected = states_by_agent_type(backend.agent_checkpoints[target])
+
+    await backend.revert_message(target)
+    assert states_by_agent_type(await backend.runtime.save_state()) == expected
+
+    restore = backend.get_checkpoint_metrics()["restore"]
+    assert restore["agents_skipped"] > 0
+    assert restore["agents_loaded"] < len(backend.agent_checkpoints.manifest(target))
+
+
+@pytest.mark.asyncio
+async def test_retention_thins_checkpoints_and_pins_branch_base():
+    full_backend = await create_backend()
+    await run_step_by_step(full_backend)
+
+    thinned_backend = await create_backend(checkpoint_retention=CheckpointRetention(keep_recent=2))
+    await run_step_by_step(thinned_backend)
+
+    num_messages = len(thinned_backend.intervention_handler.history)
+    assert len(thinned_backend.agent_checkpoints) < num_messages
+    assert thinned_backend.agent_checkpoints.latest_timestamp == num_messages - 1
+
+    target = 5
+    await thinned_backend.revert_message(target)
+    retention = thinned_backend.checkpoint_writer.retention
+    assert retention is not None
+    assert target + 1 in retention.pinned
+    actual = states_by_agent_type(await thinned_backend.runtime.save_state())
+    assert actual == states_by_agent_type(full_backend.agent_checkpoints[target])
+
+    # reverting to before the previous branch base drops its pin
+    await thinned_backend.revert_message(2)
+    assert retention.pinned == {3}
+
+
+def record_full_snapshots(backend: BackendRuntimeManager):
+    snapshots = {}
+    checkpoint_agents = backend.checkpoint_agents
+
+    async def checkpoint_and_record(timestamp, message):
+        snapshots[timestamp] = await backend.runtime.save_state()
+        await checkpoint_agents(timestamp, message)
+
+    backend.intervention_handler.checkpointFunc = checkpoint_and_record
+    return snapshots
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("step", [True, False])
+async def test_checkpoints_only_save_recipients(step):
+    """Saving only agents that received messages still yields the full runtime state"""
+
+    backend = await create_backend()
+    snapshots = record_full_snapshots(backend)
+
+    if step:
+        await run_step_by_step(backend)
+    else:
+        await backend.send_message(
+            GroupChatStart(messages=[TextMessage(source="user", content="0")]),
+            backend.groupchat._group_chat_manager_topic_type,
+        )
+        backend.start_processing()
+        await asyncio.sleep(0)
+        await backend.stop_processing()
+
+    assert len(snapshots) == len(backend.agent_checkpoints)
+    for timestamp, snapshot in snapshots.items():
+        assert backend.agent_checkpoints[timestamp] == snapshot
+
+    capture = backend.get_checkpoint_metrics()["capture"]
+    assert capture["agents_saved"] < capture["agents_total"]
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_metrics():
+    backend = await create_backend()
+    await run_step_by_step(backend)
+    num_messages = len(backend.intervention_handler.history)
+    await backend.revert_message(3)
+
+    metrics = backend.get_checkpoint_metrics()
+    assert metrics["durations"]["save"]["count"] == num_messages
+    assert metrics["durations"]["restore"]["count"] == 1
+    assert metrics["resident_bytes"] > 0
+    assert sorted(metrics["snapshot_sizes"].keys()) == [0, 1, 2, 3]
+    assert all(size > 0 for size in metrics["snapshot_sizes"][3].values())
+
+    text = backend.get_checkpoint_metrics_prometheus()
+    assert "agdebugger_checkpoint_save_seconds_count " in text
+    assert 'agdebugger_checkpoint_resident_bytes{tier="hot"}' in text
+    assert "agdebugger_checkpoint_agent_state_bytes{agent=" in text
+
+
+@pytest.mark.asyncio
+async def test_history_updates_since_cursor():
+    backend = await create_backend()
+    await run_step_by_step(backend)
+    num_messages = len(backend.intervention_handler.history)
+
+    first = backend.get_history_updates(-1, limit=3)
+    assert first["truncated_from"] == 0
+    assert [m["timestamp"] for m in first["messages"]] == [0, 1, 2]
+    assert first["has_more"]
+
+    rest = backend.get_history_updates(first["current_session"], first["last_timestamp"])
+    assert [m["timestamp"] for m in rest["messages"]] == list(range(3, num_messages))
+    assert not rest["has_more"]
+
+    unchanged = backend.get_history_updates(rest["current_session"], rest["last_timestamp"])
+    assert unchanged["messages"] == [] and unchanged["sessions"] == {} and unchanged["truncated_from"] is None
+
+    await backend.revert_message(4)
+    after_revert = backend.get_history_updates(rest["current_session"], rest["last_timestamp"])
+    assert after_revert["truncated_from"] == 5
+    assert list(after_revert["sessions"].keys()) == [rest["current_session"]]
+    assert after_revert["messages"] == []
+
+    page = backend.get_history_range(1, 4, limit=2)
+    assert [m["timestamp"] for m in page["messages"]] == [1, 2]
+    assert page["next"] == 3
+
+
+@pytest.mark.asyncio
+async def test_history_log_recovers_session(tmp_path):
+    path = str(tmp_path / "session.log")
+    backend = await create_backend(history_log=HistoryLog(path))
+    await run_step_by_step(backend)
+    await backend.revert_message(4)
+    backend.close()
+
+    recovered = read_history_log(path)
+    assert recovered.messages == list(backend.intervention_handler.history)
+    assert sorted(recovered.checkpoints) == sorted(backend.agent_checkpoints.keys())
+    for timestamp, snapshot in recovered.checkpoints.items():
+        assert snapshot == backend.agent_checkpoints[timestamp]
+
+
+
+@pytest.mark.asyncio
+async def test_reverted_sessions_share_history():
+    backend = await create_backend()
+    await run_step_by_step(backend)
+    full = [m["timestamp"] for m in backend.get_current_history()]
+
+    await backend.revert_message(6)
+    await backend.revert_message(3)
+
+    sessions = backend.prior_histories
+    assert [m["timestamp"] for m in sessions[0].messages] == full
+    assert [m["timestamp"] for m in sessions[1].messages] == full[:7]
+    # the second session only stores what it added after its fork, which is nothing
+    assert sessions.node(1).fork_timestamp == 7 and sessions.node(1).messages == []
+    assert [m["timestamp"] for m in backend.get_current_history()] == full[:4]
+
+
+@pytest.mark.asyncio
+async def test_agent_history_view():
+    backend = await create_backend()
+    await run_step_by_step(backend)
+
+    def sender_type(m):
+        return m["sender"].split("/")[0] if m["sender"] else None
+
+    assert "group_topic" in backend.subscribed_topics("LOCAL_AGENT_1")
+    outbox = backend.get_agent_history("LOCAL_AGENT_1", direction="outbox")
+    assert outbox and all(sender_type(m) == "LOCAL_AGENT_1" for m in outbox)
+    inbox = backend.get_agent_history("LOCAL_AGENT_1", direction="inbox")
+    assert inbox and all(sender_type(m) != "LOCAL_AGENT_1" for m in inbox)
+    everything = backend.get_agent_history("LOCAL_AGENT_1")
+    assert [m["timestamp"] for m in everything] == sorted(m["timestamp"] for m in inbox + outbox)
+
+    page = backend.get_history_view(agent="LOCAL_AGENT_1", limit=2)
+    assert page["messages"] == everything[:2]
+    assert page["next"] == everything[2]["timestamp"]
+
+    topic = backend.get_topic_history("output_topic")
+    assert topic and len(topic) < len(backend.get_current_history())
+
+
+@pytest.mark.asyncio
+async def test_find_identical_messages_across_sessions():
+    backend = await create_backend()
+    await run_step_by_step(backend)
+    first = backend.get_current_history()[0]
+
+    # re-send the first message unchanged into a new session
+    await backend.edit_and_revert_message(None, 0)
+    await run_step_by_step(backend)
+    resent = backend.get_current_history()[0]
+
+    assert resent["id"] != first["id"]
+    assert resent["hash"] == first["hash"]
+    # the start message is also forwarded to the team, with the same content
+    found = backend.find_identical_messages(first["hash"])
+    assert {"session": 0, "timestamp": first["timestamp"]} in found
+    assert {"session": 1, "timestamp": resent["timestamp"]} in found
+    assert {entry["session"] for entry in found} == {0, 1}
+
+
+@pytest.mark.asyncio
+async def test_events_push_history_and_queue_deltas():
+    backend = await create_backend()
+    subscriber = backend.events.subscribe()
+    event, snapshot = parse_frame(subscriber.queue.get_nowait())
+    assert event == "snapshot"
+    assert snapshot["history"]["messages"] == [] and snapshot["queue"] == []
+    assert snapshot["status"] == {"num_tasks": 0, "loop_running": False}
+
+    await run_step_by_step(backend)
+    await asyncio.sleep(0)
+
+    pushed = []
+    while not subscriber.queue.empty():
+        pushed.append(parse_frame(subscriber.queue.get_nowait()))
+    history = [m["timestamp"] for event, data in pushed if event == "history" for m in data["messages"]]
+    assert history == list(range(len(backend.intervention_handler.history)))
+    assert [data for event, data in pushed if event == "queue"][-1] == []
+
+    await backend.revert_message(2)
+    await asyncio.sleep(0)
+    event, update = parse_frame(subscriber.queue.get_nowait())
+    assert event == "history" and update["truncated_from"] == 3
+    backend.events.unsubscribe(subscriber)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_omits_unchanged_sections():
+    backend = await create_backend()
+    first = backend.get_snapshot()
+    assert set(first["sections"]) == {"agents", "topics", "queue", "counters", "loop_running"}
+    assert first["sections"]["agents"] == backend.agent_names
+
+    assert backend.get_snapshot(first["version"])["sections"] == {}
+
+    await run_step_by_step(backend)
+    changed = backend.get_snapshot(first["version"])
+    assert changed["version"] > first["version"]
+    assert set(changed["sections"]) == {"counters"}
+    assert changed["sections"]["counters"]["history_version"] == backend.intervention_handler.history.version
+
+
+@pytest.mark.asyncio
+async def test_history_update_records():
+    backend = await create_backend()
+    await run_step_by_step(backend)
+    await backend.revert_message(3)
+
+    records = list(backend.iter_history_updates(-1))
+    update = backend.get_history_updates(-1)
+    assert records[0] == {"kind": "update", **{k: v for k, v in update.items() if k not in ("sessions", "messages")}}
+    assert [r["session"] for r in records if r["kind"] == "session"] == [0]
+    current = [r["message"] for r in records if r["kind"] == "message" and r["session"] == update["current_session"]]
+    assert current == update["messages"]
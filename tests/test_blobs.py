@@ -0,0 +1,72 @@
+import io
+import pickle
+
+import PIL.Image
+from autogen_agentchat.messages import MultiModalMessage
+from autogen_core import Image
+
+from agdebugger.blobs import BlobStore, blob_dir_for, dumps_with_blobs, iter_blob_refs, load_pickle_with_blobs
+from agdebugger.serialization import deserialize, serialize
+
+
+def make_image(size=128):
+    return Image(PIL.Image.effect_noise((size, size), 64).convert("RGB"))
+
+
+def test_serialize_replaces_images_with_blob_refs():
+    image = make_image()
+    message = MultiModalMessage(source="user", content=["look at this", image])
+
+    serialized = serialize(message)
+    ref = serialized["content"][1]["data"]
+    assert ref["type"] == "BlobRef"
+    assert ref["media_type"] == "image/png"
+    assert len(pickle.dumps(serialized)) < 1024
+
+    deserialized = deserialize(serialized)
+    assert isinstance(deserialized, MultiModalMessage)
+    assert deserialized.content[0] == "look at this"
+    assert isinstance(deserialized.content[1], Image)
+    assert deserialized.content[1].to_base64() == image.to_base64()
+
+
+def test_blob_store_dedups_and_thumbnails():
+    store = BlobStore()
+    data = make_image().to_base64()
+
+    first = store.put_text(data)
+    second = store.put_text(data)
+    assert first == second
+    assert len(store) == 1
+    assert store.put_text("too short") is None
+    assert first is not None
+
+    thumbnail = PIL.Image.open(io.BytesIO(store.thumbnail(first["hash"], 32)))
+    assert max(thumbnail.size) == 32
+
+
+def test_pickle_with_blobs(tmp_path):
+    image = make_image()
+    history = [MultiModalMessage(source="user", content=["a", image]), {"screenshot": image.to_base64()}]
+
+    path = tmp_path / "history.pickle"
+    data = dumps_with_blobs(history, BlobStore(blob_dir_for(str(path))))
+    path.write_bytes(data)
+
+    assert len(data) < len(pickle.dumps(history)) // 10
+    loaded = load_pickle_with_blobs(str(path))
+    assert loaded[0].content[1].to_base64() == image.to_base64()
+    assert loaded[1] == history[1]
+
+
+def test_retain_drops_unreferenced_blobs():
+    store = BlobStore()
+    kept = store.put_text(make_image().to_base64())
+    dropped = store.put_text(make_image(64).to_base64())
+    assert kept is not None and dropped is not None
+    store.thumbnail(dropped["hash"], 16)
+
+    live = list(iter_blob_refs({"messages": [{"content": ["text", {"data": kept}]}]}))
+    assert live == [kept["hash"]]
+    assert store.retain(live) == 1
+    assert kept["hash"] in store and dropped["hash"] not in store
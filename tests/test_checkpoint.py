@@ -0,0 +1,266 @@
+import asyncio
+import os
+import pickle
+import threading
+
+import pytest
+
+from agdebugger.checkpoint import (
+    CheckpointPolicy,
+    CheckpointRetention,
+    CheckpointStore,
+    CheckpointWriter,
+    DictDelta,
+    ListAppend,
+    apply_state_diff,
+    diff_state,
+)
+from agdebugger.history_log import HistoryLog, read_history_log
+
+
+def make_snapshot(num_messages, counter=0):
+    return {
+        "manager/team": {
+            "message_thread": [{"content": str(i)} for i in range(num_messages)],
+            "current_turn": num_messages,
+        },
+        "agent/team": {"counter": counter},
+    }
+
+
+def test_diff_state_appended_list():
+    old = make_snapshot(2)["manager/team"]
+    new = make_snapshot(4)["manager/team"]
+
+    delta = diff_state(old, new)
+    assert isinstance(delta, DictDelta)
+    thread = delta.nested["message_thread"]
+    assert isinstance(thread, ListAppend)
+    assert thread.items == [{"content": "2"}, {"content": "3"}]
+    assert delta.changed == {"current_turn": 4}
+
+    assert apply_state_diff(pickle.loads(pickle.dumps(old)), delta) == new
+
+
+def test_diff_state_equal():
+    assert diff_state(make_snapshot(3), make_snapshot(3)) is None
+
+
+def test_store_round_trip():
+    store = CheckpointStore()
+    snapshots = {ts: make_snapshot(ts, counter=ts // 2) for ts in range(10)}
+    for ts, snapshot in snapshots.items():
+        store[ts] = snapshot
+
+    assert len(store) == 10
+    assert max(store.keys()) == 9
+    for ts, snapshot in snapshots.items():
+        assert store[ts] == snapshot
+
+    # unchanged agent states share a single blob between timestamps
+    assert len({store.manifest(ts)["agent/team"] for ts in range(10)}) == 5
+    assert store.num_blobs == 15
+
+
+def test_store_truncate_and_continue():
+    store = CheckpointStore.from_snapshots({ts: make_snapshot(ts) for ts in range(10)})
+
+    store.truncate(5)
+    assert sorted(store.keys()) == [0, 1, 2, 3, 4]
+    assert store.num_blobs == 6
+
+    store[5] = make_snapshot(2, counter=7)
+    assert store[5] == make_snapshot(2, counter=7)
+    assert store[4] == make_snapshot(4)
+
+
+def test_store_pickle():
+    store = CheckpointStore.from_snapshots({ts: make_snapshot(ts) for ts in range(5)})
+    loaded = pickle.loads(pickle.dumps(store))
+
+    assert loaded[4] == make_snapshot(4)
+    loaded[5] = make_snapshot(6)
+    assert loaded[5] == make_snapshot(6)
+
+
+def test_store_dedups_repeated_states():
+    store = CheckpointStore()
+    store[0] = make_snapshot(1)
+    store[1] = make_snapshot(2)
+    store[2] = make_snapshot(1)
+
+    assert store.manifest(0) == store.manifest(2)
+    assert store.num_blobs == 3
+    assert store[2] == make_snapshot(1)
+
+
+def test_checkpoint_policy_parse():
+    assert CheckpointPolicy.parse("all") == CheckpointPolicy(every_n=1)
+    assert CheckpointPolicy.parse("every:10,turns") == CheckpointPolicy(every_n=10, turn_boundaries=True)
+    assert CheckpointPolicy.parse("turns") == CheckpointPolicy(every_n=None, turn_boundaries=True)
+    assert CheckpointPolicy.parse("budget:2MB") == CheckpointPolicy(every_n=1, max_bytes=2 * 1024**2)
+
+
+def test_store_tiers_spill_and_reload(tmp_path):
+    snapshots = {ts: make_snapshot(ts * 20, counter=ts) for ts in range(30)}
+    store = CheckpointStore(memory_budget=4096, spill_path=str(tmp_path / "spill.sqlite"))
+    for ts, snapshot in snapshots.items():
+        store[ts] = snapshot
+
+    tiers = store.tier_stats()
+    assert tiers["warm"]["blobs"] > 0
+    assert tiers["cold"]["blobs"] > 0
+    assert store.nbytes <= 4096
+    assert (tmp_path / "spill.sqlite").exists()
+
+    for ts, snapshot in snapshots.items():
+        assert store[ts] == snapshot
+
+    store.truncate(3)
+    assert store[2] == snapshots[2]
+    assert store.tier_stats()["cold"]["blobs"] + store.tier_stats()["warm"]["blobs"] <= store.num_blobs
+
+    loaded = pickle.loads(pickle.dumps(store))
+    assert loaded.tier_stats()["cold"]["blobs"] == 0
+    assert loaded[2] == snapshots[2]
+
+
+def test_store_close_removes_temporary_spill():
+    store = CheckpointStore(memory_budget=4096)
+    for ts in range(30):
+        store[ts] = make_snapshot(ts * 20, counter=ts)
+    assert store._spill is not None
+    spill_dir = os.path.dirname(store._spill.path)
+
+    cold = store.tier_stats()["cold"]
+    assert cold["blobs"] > 0
+    store.truncate(3)
+    store.collect_garbage()
+    # released cold blobs are subtracted by their stored size
+    assert store.tier_stats()["cold"]["bytes"] < cold["bytes"]
+    remaining = [blob_hash for blob_hash, blob in store._blobs.items() if blob.tier == "cold"]
+    assert store.tier_stats()["cold"]["bytes"] == store._spill.nbytes(remaining)
+
+    store.close()
+    assert not os.path.exists(spill_dir)
+
+
+def test_retention_thins_logarithmically():
+    retention = CheckpointRetention(keep_recent=8)
+    dropped = set(retention.select(range(1000), head=999))
+    kept = [ts for ts in range(1000) if ts not in dropped]
+
+    assert all(ts in kept for ts in range(992, 1000))
+    assert 0 in kept
+    assert len(kept) < 100
+
+    # thinning as the head moves on stays as sparse as thinning everything at once
+    for head in range(1000, 2000):
+        kept.append(head)
+        dropped = set(retention.select(kept, head=head))
+        kept = [ts for ts in kept if ts not in dropped]
+    assert all(ts in kept for ts in range(1992, 2000))
+    assert len(kept) < 100
+
+    retention.pin(501)
+    assert max(ts for ts in kept if ts <= 501) not in retention.select(kept, head=1999)
+
+    retention.pin(1500)
+    retention.unpin_from(1000)
+    assert retention.pinned == {501}
+
+
+def test_store_drop_frees_intermediate_deltas():
+    snapshots = {ts: make_snapshot(ts, counter=ts) for ts in range(20)}
+    store = CheckpointStore.from_snapshots(snapshots)
+    blobs_before = store.num_blobs
+
+    store.drop(range(1, 19))
+    assert sorted(store.keys()) == [0, 19]
+    assert store.num_blobs == 4 < blobs_before
+    assert store[0] == snapshots[0]
+    assert store[19] == snapshots[19]
+
+    store[20] = make_snapshot(21, counter=20)
+    assert store[20] == make_snapshot(21, counter=20)
+
+
+def test_store_partial_checkpoints_and_change_index():
+    store = CheckpointStore()
+    store[0] = make_snapshot(1)
+    store.set_partial(1, {"agent/team": {"counter": 1}})
+    store.set_partial(2, {"manager/team": make_snapshot(3)["manager/team"]})
+
+    assert store[1] == make_snapshot(1, counter=1)
+    assert store[2] == make_snapshot(3, counter=1)
+    assert store.last_changed("agent/team") == 1
+    assert store.last_changed("manager/team") == 2
+    assert store.last_changed("manager/team", 1) == 0
+
+    store.truncate(2)
+    assert store.last_changed("manager/team") == 0
+
+
+def test_store_bounds_delta_chains():
+    store = CheckpointStore(max_chain=8)
+    for ts in range(300):
+        store[ts] = make_snapshot(ts, counter=ts)
+
+    blobs = store._blobs.values()
+    assert max(blob.depth for blob in blobs) <= 8
+    # full states are written along the way, not only the first one
+    assert sum(blob.parent is None for blob in blobs) > 2
+    assert all(blob.chain_nbytes <= blob.state_nbytes for blob in blobs)
+    assert store[299] == make_snapshot(299, counter=299)
+    assert store[150] == make_snapshot(150, counter=150)
+
+    store.drop(range(1, 299, 2))
+    assert max(blob.depth for blob in store._blobs.values()) <= 8
+    assert store[298] == make_snapshot(298, counter=298)
+
+
+def test_store_timestamp_index():
+    store = CheckpointStore()
+    for ts in (10, 30, 20):
+        store[ts] = make_snapshot(ts, counter=ts)
+
+    assert list(store) == [10, 20, 30]
+    assert store.latest_timestamp == 30
+    assert [store.nearest_at_or_before(ts) for ts in (5, 10, 25, 99)] == [None, 10, 20, 30]
+
+    del store[30]
+    assert store.latest_timestamp == 20 and store.nearest_at_or_before(99) == 20
+    assert store.last_changed("agent/team") == 20
+
+    store.truncate(15)
+    assert list(store) == [10]
+    store.set_partial(40, {"agent/team": {"counter": 40}})
+    assert store[40] == {**make_snapshot(10, counter=10), "agent/team": {"counter": 40}}
+    assert pickle.loads(pickle.dumps(store)).nearest_at_or_before(50) == 40
+
+
+@pytest.mark.asyncio
+async def test_background_writer_logs_and_barrier_cancels(tmp_path):
+    path = str(tmp_path / "session.log")
+    log = HistoryLog(path)
+    writer = CheckpointWriter(CheckpointStore(), background=True, history_log=log)
+
+    # hold the worker so the later writes are still queued when the barrier runs
+    release = threading.Event()
+    assert writer._executor is not None
+    writer._executor.submit(release.wait)
+    writer.write(10, make_snapshot(1))
+    writer.write(20, make_snapshot(2))
+    assert writer.last_timestamp == 20
+
+    barrier = asyncio.ensure_future(writer.barrier(10))
+    await asyncio.sleep(0)
+    release.set()
+    await barrier
+    assert list(writer.store) == [10]
+    # the cancelled write never happened, so the policy counts from the one that did
+    assert writer.last_timestamp == 10
+
+    writer.close()
+    log.close()
+    assert list(read_history_log(path).checkpoints) == [10]
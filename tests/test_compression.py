@@ -0,0 +1,94 @@
+import gzip
+import json
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from agdebugger.compression import CompressionMiddleware, negotiate_encoding
+from agdebugger.encoding import NDJSON_MEDIA_TYPE, iter_ndjson
+
+RECORDS = [{"timestamp": i, "content": "hello " * 20} for i in range(500)]
+
+
+def make_client():
+    async def large(request):
+        return JSONResponse(RECORDS)
+
+    async def small(request):
+        return JSONResponse({"status": "ok"})
+
+    async def stream(request):
+        return StreamingResponse(iter_ndjson(RECORDS, chunk_size=4096), media_type=NDJSON_MEDIA_TYPE)
+
+    async def events(request):
+        return StreamingResponse(iter([b"event: a\ndata: " + b"1" * 2000 + b"\n\n"]), media_type="text/event-stream")
+
+    app = Starlette(
+        routes=[Route("/large", large), Route("/small", small), Route("/stream", stream), Route("/events", events)]
+    )
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding("gzip, deflate", ["zstd", "br", "gzip"]) == "gzip"
+    assert negotiate_encoding("gzip;q=0.5, br", ["zstd", "br", "gzip"]) == "br"
+    assert negotiate_encoding("*", ["zstd", "br", "gzip"]) == "zstd"
+    assert negotiate_encoding("gzip;q=0, identity", ["gzip"]) is None
+    assert negotiate_encoding("", ["gzip"]) is None
+
+
+def test_compresses_large_responses_only():
+    client = make_client()
+    large = client.get("/large", headers={"Accept-Encoding": "gzip"})
+    assert large.headers["content-encoding"] == "gzip"
+    assert large.json() == RECORDS
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+    plain = client.get("/large", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+
+def test_streams_compressed_ndjson():
+    client = make_client()
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        body = gzip.decompress(b"".join(response.iter_raw()))
+    assert [json.loads(line) for line in body.splitlines()] == RECORDS
+
+    events = client.get("/events", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in events.headers
+
+
+def decompressor(encoding):
+    if encoding == "br":
+        return pytest.importorskip("brotli").decompress
+    if encoding == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        # streamed frames do not record their size, so decompress them as a stream
+        return lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return gzip.decompress
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "br", "zstd"])
+def test_encodings_round_trip(encoding):
+    decompress = decompressor(encoding)
+    client = make_client()
+
+    with client.stream("GET", "/large", headers={"Accept-Encoding": encoding}) as response:
+        assert response.headers["content-encoding"] == encoding
+        assert response.headers["vary"] == "Accept-Encoding"
+        raw = b"".join(response.iter_raw())
+    assert int(response.headers["content-length"]) == len(raw)
+    assert json.loads(decompress(raw)) == RECORDS
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": encoding}) as response:
+        assert response.headers["content-encoding"] == encoding
+        assert "content-length" not in response.headers
+        body = decompress(b"".join(response.iter_raw()))
+    assert [json.loads(line) for line in body.splitlines()] == RECORDS
@@ -0,0 +1,71 @@
+import enum
+import json
+import pathlib
+import uuid
+from decimal import Decimal
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+
+from agdebugger import encoding
+from agdebugger.encoding import ResponseCache, dumps
+from agdebugger.types import EditQueueMessage, HistorySessionNode, MessageHistorySession, ScoreResult
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+def sample():
+    score = ScoreResult(passed=True, first_timestamp=3, expected="a", actual=None)
+    return {
+        "sessions": {
+            0: HistorySessionNode(parent=None, fork_timestamp=None, messages=[{"timestamp": 0}], score=score),
+        },
+        "current": MessageHistorySession(
+            messages=[{"timestamp": 1, "content": "héllo\nworld"}],
+            current_session_reset_from=1,
+            next_session_starts_at=None,
+            current_session_score=None,
+        ),
+        "edits": [EditQueueMessage(idx=0, body={"content": "m", "time": 1.5})],
+        "values": [Color.RED, uuid.UUID(int=1), Decimal("3"), Decimal("1.25"), pathlib.PurePosixPath("/tmp/a")],
+    }
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_matches_jsonable_encoder(monkeypatch, use_orjson):
+    if use_orjson and encoding.orjson is None:
+        pytest.skip("orjson is not installed")
+    if not use_orjson:
+        monkeypatch.setattr(encoding, "orjson", None)
+
+    assert json.loads(dumps(sample())) == json.loads(json.dumps(jsonable_encoder(sample())))
+
+
+def test_response_cache_reencodes_for_new_versions():
+    cache = ResponseCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"n": len(builds)}
+
+    first = cache.get("key", 1, build, etag=lambda content: f'"{content["n"]}"')
+    assert cache.get("key", 1, build) is first
+    assert json.loads(first.body) == {"n": 1} and first.etag == '"1"'
+
+    second = cache.get("key", 2, build)
+    assert json.loads(second.body) == {"n": 2}
+    assert cache.stats() == {"entries": 1, "bytes": len(second.body), "hits": 1, "misses": 2}
+
+
+def test_response_cache_evicts_least_recently_used():
+    cache = ResponseCache(max_bytes=25)
+    cache.get("a", 0, lambda: "a" * 10)
+    cache.get("b", 0, lambda: "b" * 10)
+    cache.get("a", 0, lambda: "unused")
+    cache.get("c", 0, lambda: "c" * 10)
+    assert len(cache) == 2
+    assert cache.get("a", 0, lambda: "rebuilt").body == b'"' + b"a" * 10 + b'"'
+    assert cache.nbytes <= 25
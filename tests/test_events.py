@@ -0,0 +1,89 @@
+import asyncio
+import json
+from collections.abc import AsyncGenerator
+
+import pytest
+
+from agdebugger.events import EventChannel, VersionedState
+
+
+def parse_frame(frame):
+    fields = dict(line.split(": ", 1) for line in frame.decode("utf-8").strip().split("\n"))
+    return fields["event"], json.loads(fields["data"])
+
+
+def counter_channel(**kwargs):
+    state = {"count": 0, "computed": 0}
+
+    def delta():
+        state["computed"] += 1
+        return {"count": state["count"]}
+
+    channel = EventChannel(**kwargs)
+    channel.add_section("counter", delta, lambda: {"count": state["count"]}, ["incremented"])
+    return channel, state
+
+
+@pytest.mark.asyncio
+async def test_subscriber_gets_snapshot_then_coalesced_deltas():
+    channel, state = counter_channel()
+    # nobody is subscribed, so nothing is computed
+    channel.emit("incremented")
+    channel.flush()
+    assert state["computed"] == 0
+
+    subscriber = channel.subscribe()
+    assert parse_frame(subscriber.queue.get_nowait()) == ("snapshot", {"counter": {"count": 0}})
+
+    for _ in range(5):
+        state["count"] += 1
+        channel.emit("incremented")
+    channel.emit("unrelated")
+    await asyncio.sleep(0)
+
+    assert parse_frame(subscriber.queue.get_nowait()) == ("counter", {"count": 5})
+    assert subscriber.queue.empty()
+    assert state["computed"] == 1
+
+    channel.unsubscribe(subscriber)
+    assert channel.num_subscribers == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_resyncs_from_snapshot():
+    channel, state = counter_channel(max_pending=2)
+    stream = channel.stream()
+    assert isinstance(stream, AsyncGenerator)
+    assert parse_frame(await anext(stream))[0] == "snapshot"
+
+    for _ in range(4):
+        state["count"] += 1
+        channel.emit("incremented")
+        channel.flush()
+
+    # the deltas it fell behind on are replaced by a snapshot of the current state
+    assert parse_frame(await anext(stream)) == ("snapshot", {"counter": {"count": 4}})
+    await stream.aclose()
+    assert channel.num_subscribers == 0
+
+
+def test_versioned_state_sends_changed_sections():
+    state = {"count": 0, "name": "a"}
+    versioned = VersionedState()
+    versioned.add_section("count", lambda: state["count"], ["incremented"])
+    versioned.add_section("name", lambda: state["name"])
+
+    first = versioned.since()
+    assert first["sections"] == {"count": 0, "name": "a"}
+    version = first["version"]
+
+    # an event that does not change the value keeps the version
+    versioned.emit("incremented")
+    assert versioned.since(version) == {"version": version, "versions": first["versions"], "sections": {}}
+
+    state["count"] += 1
+    versioned.emit("incremented")
+    changed = versioned.since(version)
+    assert changed["version"] == version + 1
+    assert changed["sections"] == {"count": 1}
+    assert changed["versions"]["name"] == first["versions"]["name"]
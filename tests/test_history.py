@@ -0,0 +1,195 @@
+import pickle
+
+import pytest
+from autogen_agentchat.messages import TextMessage
+from autogen_agentchat.teams._group_chat._events import GroupChatRequestPublish
+from autogen_core import AgentId, TopicId
+
+from agdebugger.history import HistoryStore
+from agdebugger.types import AGEPublishMessage, AGESendMessage, TimeStampedMessage
+
+MANAGER = AgentId("manager", "team")
+AGENT = AgentId("agent", "team")
+
+
+def make_history(num_messages):
+    history = HistoryStore()
+    for ts in range(num_messages):
+        if ts % 2 == 0:
+            message = AGESendMessage(
+                message=TextMessage(source="manager", content=str(ts)),
+                sender=MANAGER,
+                recipient=AGENT,
+                message_id=str(ts),
+            )
+        else:
+            message = AGEPublishMessage(
+                message=GroupChatRequestPublish(), sender=AGENT, topic_id=TopicId("group", "team"), message_id=str(ts)
+            )
+        history.append(TimeStampedMessage(message=message, timestamp=ts * 10))
+    return history
+
+
+def test_lookup_and_range():
+    history = make_history(10)
+
+    record = history.get(30)
+    assert record is not None and isinstance(record.message, AGEPublishMessage)
+    assert record.message.message_id == "3"
+    assert history.get(31) is None
+    assert [m.timestamp for m in history.range(25, 55)] == [30, 40, 50]
+
+
+def test_truncate_keeps_indexes_consistent():
+    history = make_history(10)
+    history.truncate(45)
+
+    assert len(history) == 5
+    assert history[-1].timestamp == 40
+    assert [m.timestamp for m in history.query(sender="agent")] == [10, 30]
+
+    history.append(TimeStampedMessage(message=history[0].message, timestamp=100))
+    assert [m.timestamp for m in history.query(recipient="agent")] == [0, 20, 40, 100]
+
+    with pytest.raises(ValueError):
+        history.append(TimeStampedMessage(message=history[0].message, timestamp=100))
+
+
+def test_query_combines_filters():
+    history = make_history(10)
+
+    assert [m.timestamp for m in history.query(topic="group", start=20, end=70)] == [30, 50]
+    assert [m.timestamp for m in history.query(sender="manager", message_type="TextMessage")] == [0, 20, 40, 60, 80]
+    assert history.query(sender="manager", topic="group") == []
+    assert history.keys("type") == ["GroupChatRequestPublish", "TextMessage"]
+
+
+def test_pickles_as_list():
+    history = make_history(3)
+    loaded = pickle.loads(pickle.dumps(history))
+
+    assert isinstance(loaded, list)
+    assert HistoryStore(loaded) == history
+
+
+def test_json_is_cached_until_history_changes():
+    history = make_history(4)
+
+    first = history.to_json()
+    assert history.to_json() is first
+    assert first[1] is history.query_json(sender="agent")[0]
+    assert [m["timestamp"] for m in first] == [0, 10, 20, 30]
+
+    history.truncate(20)
+    truncated = history.to_json()
+    assert truncated is not first
+    assert truncated[1] is first[1]
+    assert [m["timestamp"] for m in truncated] == [0, 10]
+
+    history.invalidate(10)
+    assert history.to_json()[1] is not first[1]
+
+
+def test_records_share_interned_ids_and_round_trip():
+    history = make_history(6)
+    assert history[0].message.sender is history[2].message.sender
+    assert isinstance(history[1].message, AGEPublishMessage) and isinstance(history[3].message, AGEPublishMessage)
+    assert history[1].message.topic_id is history[3].message.topic_id
+    assert not hasattr(history[0], "__dict__")
+
+    loaded = pickle.loads(pickle.dumps(history))
+    assert loaded == list(history)
+    assert loaded[0].message.sender is history[0].message.sender
+
+
+def test_records_load_from_dict_state():
+    # history files pickled before records had slots hold a field dict
+    record = TimeStampedMessage.__new__(TimeStampedMessage)
+    record.__setstate__({"message": make_history(1)[0].message, "timestamp": 7})
+    assert record.timestamp == 7
+    assert record.message.sender == MANAGER
+
+
+def test_columns_follow_append_and_truncate():
+    history = make_history(10)
+    history.truncate(60)
+    history.append(
+        TimeStampedMessage(
+            message=AGESendMessage(
+                message=TextMessage(source="manager", content="hello"), sender=MANAGER, recipient=AGENT, message_id="x"
+            ),
+            timestamp=90,
+        )
+    )
+
+    stats = history.columns.stats()
+    assert stats["count"] == 7
+    assert stats["counts"]["sender"] == {"manager": 4, "agent": 3}
+    assert stats["counts"]["recipient"] == {"agent": 4}
+    assert stats["counts"]["topic"] == {"group": 3}
+    assert stats["counts"]["kind"] == {"send": 4, "publish": 3}
+    assert stats["counts"]["type"] == {"TextMessage": 4, "GroupChatRequestPublish": 3}
+    assert stats["content_length"]["by_sender"] == {"manager": len("0" + "2" + "4" + "hello"), "agent": 0}
+    assert stats["gaps"]["reverts"] == 7 - 1 and stats["gaps"]["reverted_messages"] == 9 * 5 + 39
+    assert stats["gaps"]["mean_seconds"] >= 0
+    # messages loaded into a history were recorded at an unknown time
+    assert HistoryStore(list(history)).columns.stats()["gaps"]["mean_seconds"] is None
+
+
+def test_columns_numpy_matches_python():
+    pytest.importorskip("numpy")
+    history = make_history(20)
+    history.truncate(150)
+    assert history.columns._stats_numpy() == history.columns._stats_python()
+
+
+@pytest.mark.parametrize("method", ["_stats_python", "_stats_numpy"])
+def test_columns_stats_values(method):
+    if method == "_stats_numpy":
+        pytest.importorskip("numpy")
+    history = make_history(20)
+    history.truncate(150)
+
+    stats = getattr(history.columns, method)()
+    # timestamps 0..140: eight sends from the manager, seven publishes by the agent
+    assert stats["count"] == 15
+    assert (stats["first_timestamp"], stats["last_timestamp"]) == (0, 140)
+    assert stats["counts"]["sender"] == {"manager": 8, "agent": 7}
+    assert stats["counts"]["kind"] == {"send": 8, "publish": 7}
+    assert stats["content_length"] == {
+        "total": 11,
+        "mean": 11 / 15,
+        "max": 2,
+        "by_sender": {"manager": 11, "agent": 0},
+    }
+    assert stats["gaps"]["reverts"] == 14 and stats["gaps"]["reverted_messages"] == 14 * 9
+    assert 0 <= stats["gaps"]["mean_seconds"] <= stats["gaps"]["max_seconds"]
+
+
+def test_agent_and_topic_views():
+    history = make_history(10)
+    # even timestamps are sends from the manager to the agent, odd ones publishes by the agent to "group"
+    assert [m.timestamp for m in history.view(agent="agent", direction="outbox")] == [10, 30, 50, 70, 90]
+    assert [m.timestamp for m in history.view(agent="agent", direction="inbox")] == [0, 20, 40, 60, 80]
+    # the manager receives the agent's publishes through its subscription
+    manager_inbox = history.view(agent="manager", subscribed_topics=["group"], direction="inbox")
+    assert [m.timestamp for m in manager_inbox] == [10, 30, 50, 70, 90]
+    # the agent does not receive its own publishes
+    assert len(history.view(agent="agent", subscribed_topics=["group"], direction="inbox")) == 5
+    assert len(history.view(agent="agent")) == 10
+
+    assert [m.timestamp for m in history.view(topic="group", start=20, limit=2)] == [30, 50]
+    assert [m["timestamp"] for m in history.view_json(agent="manager", start=15, end=65)] == [20, 40, 60]
+
+    # a topic narrows an agent view to its publishes on that topic
+    assert [m.timestamp for m in history.view(agent="agent", topic="group", start=20, limit=2)] == [30, 50]
+    assert history.view(agent="manager", topic="group", direction="outbox") == []
+    manager_view = history.view(agent="manager", subscribed_topics=["group", "group"], topic="group", limit=3)
+    assert [m.timestamp for m in manager_view] == [10, 30, 50]
+
+    history.truncate(40)
+    assert [m.timestamp for m in history.view(agent="agent")] == [0, 10, 20, 30]
+    assert [m.timestamp for m in history.view(agent="manager", subscribed_topics=["group"])] == [0, 10, 20, 30]
+
+    with pytest.raises(ValueError):
+        history.view(agent="agent", direction="sideways")  # type: ignore[arg-type]
@@ -0,0 +1,80 @@
+import os
+
+from agdebugger.history_log import HistoryLog, archive_history_log, is_history_log, read_history_log
+
+from .test_history import make_history
+
+
+def test_replay_messages_checkpoints_and_truncations(tmp_path):
+    path = str(tmp_path / "session.log")
+    history = make_history(6)
+
+    log = HistoryLog(path)
+    for m in history:
+        log.append_checkpoint(m.timestamp, {f"agent/{m.timestamp}": {"n": m.timestamp}})
+        log.append_message(m)
+    log.truncate_history(30)
+    log.truncate_checkpoints(40)
+    log.close()
+
+    assert is_history_log(path)
+    recovered = read_history_log(path)
+    assert recovered.messages == list(history.range(None, 30))
+    assert sorted(recovered.checkpoints) == [0, 10, 20, 30]
+    # partial checkpoints carry over the agents saved before them
+    assert recovered.checkpoints[20] == {"agent/0": {"n": 0}, "agent/10": {"n": 10}, "agent/20": {"n": 20}}
+
+
+def test_torn_tail_is_dropped_and_log_continues(tmp_path):
+    path = str(tmp_path / "session.log")
+    history = make_history(3)
+
+    log = HistoryLog(path)
+    log.append_message(history[0])
+    log.append_message(history[1])
+    log.close()
+
+    # simulate a crash midway through writing the last record
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 5)
+
+    log = HistoryLog(path)
+    assert log.records == 1
+    log.append_message(history[2])
+    log.close()
+
+    assert [m.timestamp for m in read_history_log(path).messages] == [0, 20]
+
+
+def test_reset_starts_over(tmp_path):
+    path = str(tmp_path / "session.log")
+    log = HistoryLog(path)
+    log.append_message(make_history(1)[0])
+    log.close()
+
+    log = HistoryLog(path, reset=True)
+    assert log.empty
+    log.close()
+    assert read_history_log(path).messages == []
+
+
+def test_archive_keeps_log_with_records(tmp_path):
+    path = str(tmp_path / "session.log")
+    HistoryLog(path).close()
+    # an empty log has nothing to keep
+    assert archive_history_log(path) is None
+
+    history = make_history(2)
+    log = HistoryLog(path)
+    log.append_message(history[0])
+    log.close()
+
+    archived = archive_history_log(path)
+    assert archived is not None and archived == path + ".1"
+    assert not os.path.exists(path)
+    assert read_history_log(archived).messages == [history[0]]
+
+    log = HistoryLog(path)
+    log.append_message(history[1])
+    log.close()
+    assert archive_history_log(path) == path + ".2"
@@ -0,0 +1,56 @@
+import json
+import logging
+
+from agdebugger.log import RingBufferHandler
+
+
+def make_logger(handler, name="test.ring"):
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def test_ring_buffer_keeps_last_records():
+    handler = RingBufferHandler(capacity=3)
+    logger = make_logger(handler)
+    for i in range(5):
+        logger.info("message %d", i)
+
+    assert handler.first_seq == 2 and handler.last_seq == 4 and handler.count == 3
+    assert [r.seq for r in handler.records()] == [2, 3, 4]
+    # records evicted since the cursor are skipped
+    assert [r.seq for r in handler.records(after=0)] == [2, 3, 4]
+    assert [r.seq for r in handler.records(after=2, limit=1)] == [3]
+    assert handler.records(after=4) == []
+    assert handler.get_log_messages(after=3)[0] == {
+        "seq": 4,
+        "message": "message %d",
+        "level": "INFO",
+        "name": "test.ring",
+        "time": handler.records(after=3)[0].time,
+    }
+
+
+def test_filters_by_level_and_name():
+    handler = RingBufferHandler(level=logging.INFO, names=["test.keep"])
+    make_logger(handler, "test.keep.child").debug("too low")
+    make_logger(handler, "test.keep.child").info("kept")
+    make_logger(handler, "test.keeper").info("other logger")
+    make_logger(handler, "test.keep").warning("kept too")
+
+    assert [r.message for r in handler.records()] == ["kept", "kept too"]
+
+
+def test_spills_evicted_records(tmp_path):
+    spill = tmp_path / "logs.jsonl"
+    handler = RingBufferHandler(capacity=2, spill_path=str(spill))
+    logger = make_logger(handler)
+    for i in range(4):
+        logger.info(f"message {i}")
+    handler.close()
+
+    spilled = [json.loads(line) for line in spill.read_text().splitlines()]
+    assert [r["message"] for r in spilled] == ["message 0", "message 1"]
+    assert [r.message for r in handler.records()] == ["message 2", "message 3"]
@@ -0,0 +1,64 @@
+import asyncio
+from dataclasses import dataclass
+
+import pytest
+from autogen_core import (
+    AgentId,
+    DefaultTopicId,
+    MessageContext,
+    RoutedAgent,
+    SingleThreadedAgentRuntime,
+    TopicId,
+    default_subscription,
+    message_handler,
+)
+
+from agdebugger.replay import replay_messages
+from agdebugger.types import AGEPublishMessage, TimeStampedMessage
+
+
+@dataclass
+class Ping:
+    content: str
+
+
+@default_subscription
+class PausingAgent(RoutedAgent):
+    def __init__(self, started: asyncio.Event, resume: asyncio.Event) -> None:
+        super().__init__("pauses while handling a message")
+        self.started = started
+        self.resume = resume
+        self.received: list[str] = []
+
+    @message_handler
+    async def on_ping(self, message: Ping, ctx: MessageContext) -> None:
+        self.received.append(message.content)
+        self.started.set()
+        await self.resume.wait()
+        await self.publish_message(Ping("reply"), DefaultTopicId())
+
+
+@pytest.mark.asyncio
+async def test_replay_leaves_external_calls_to_the_runtime():
+    started, resume = asyncio.Event(), asyncio.Event()
+    runtime = SingleThreadedAgentRuntime()
+    await PausingAgent.register(runtime, "pausing", lambda: PausingAgent(started, resume))
+    topic = TopicId("default", "default")
+    recorded = [TimeStampedMessage(AGEPublishMessage(Ping("recorded"), None, topic, "m0"), 0)]
+
+    replay = asyncio.create_task(replay_messages(runtime, recorded))
+    await started.wait()
+    # a publish from outside the replay, e.g. the UI, is queued while the replay is running
+    await runtime.publish_message(Ping("external"), topic)
+    assert runtime._message_queue.qsize() == 1
+
+    resume.set()
+    await replay
+    # the replayed handler's own publish is part of the recorded history, so it is dropped
+    assert runtime._message_queue.qsize() == 1
+
+    await runtime.publish_message(Ping("after"), topic)
+    assert runtime._message_queue.qsize() == 2
+    agent = await runtime._get_agent(AgentId("pausing", "default"))
+    assert isinstance(agent, PausingAgent)
+    assert agent.received == ["recorded"]
@@ -0,0 +1,83 @@
+from autogen_agentchat.messages import MultiModalMessage, TextMessage
+from autogen_agentchat.teams._group_chat._events import GroupChatStart
+from autogen_core import AgentId
+
+from agdebugger.history import HistoryStore
+from agdebugger.search import SearchIndex, parse_query
+from agdebugger.types import AGESendMessage, TimeStampedMessage
+
+TEXTS = [
+    "I typed 'current weather in Seattle' into the browser search bar.",
+    "The weather in Seattle is rainy.",
+    "Searching for the current weather forecast",
+    "Seattle weather: 12C and cloudy",
+]
+
+
+def make_index():
+    index = SearchIndex()
+    for ts, text in enumerate(TEXTS):
+        index.add(ts * 2, TextMessage(source="agent", content=text))
+    return index
+
+
+def test_parse_query():
+    terms = parse_query('^"I typed" weath* seattle')
+    assert [(t.tokens, t.prefix, t.anchored) for t in terms] == [
+        (["i", "typed"], False, True),
+        (["weath"], True, False),
+        (["seattle"], False, False),
+    ]
+
+
+def test_word_prefix_and_phrase_search():
+    index = make_index()
+    assert index.search("seattle") == [0, 2, 6]
+    assert index.search("Seattle weather") == [0, 2, 6]
+    assert index.search('"weather in seattle"') == [0, 2]
+    assert index.search('"seattle weather"') == [6]
+    assert index.search("search*") == [0, 4]
+    assert index.search('"current weath*"') == [0, 4]
+    assert index.search("seattle", limit=2) == [0, 2]
+    assert index.search("snow") == []
+    assert index.search("") == []
+
+
+def test_anchored_search_matches_start_of_text():
+    index = make_index()
+    assert index.search('^"I typed \'current weather in Seattle\'"') == [0]
+    assert index.search("^seattle") == [6]
+
+
+def test_truncate_removes_postings():
+    index = make_index()
+    index.truncate(4)
+    assert index.search("seattle") == [0, 2]
+    assert index.search("search*") == [0]
+    assert index.tokens_with_prefix("forec") == []
+
+    index.add(5, TextMessage(source="agent", content="forecast for Seattle"))
+    assert index.search("seattle forecast") == [5]
+
+
+def test_history_search_indexes_nested_messages():
+    history = HistoryStore()
+    start = GroupChatStart(messages=[TextMessage(source="user", content="Find the weather in Seattle")])
+    image_message = MultiModalMessage(source="surfer", content=["Here is the Seattle forecast"])
+    for ts, message in enumerate([start, image_message]):
+        history.append(
+            TimeStampedMessage(
+                message=AGESendMessage(
+                    message=message, sender=None, recipient=AgentId("agent", "team"), message_id=str(ts)
+                ),
+                timestamp=ts,
+            )
+        )
+
+    assert [m.timestamp for m in history.search("seattle")] == [0, 1]
+    assert [m["timestamp"] for m in history.search_json('"seattle forecast"')] == [1]
+    # the source of a message is not part of its text
+    assert history.search("surfer") == []
+
+    history.truncate(1)
+    assert history.search("forecast") == []
@@ -94,3 +94,47 @@ if __name__ == "__main__":
     test_serialize_and_deserialize_group_chat_message()
     test_serialize_and_deserialize_group_chat_agent_response()
     test_serialize_and_deserialize_group_chat_termination()
+
+
+def test_message_json_has_stable_id_and_content_hash():
+    import pickle
+
+    from autogen_core import AgentId
+
+    from agdebugger.types import AGEResponseMessage, AGESendMessage
+    from agdebugger.utils import message_to_json
+
+    record = AGESendMessage(
+        message=TextMessage(source="user", content="hi"),
+        sender=None,
+        recipient=AgentId("agent", "team"),
+        message_id="message-1",
+    )
+    serialized = message_to_json(record, 0)
+    assert serialized["id"] == "message-1"
+    # memoized by message id while the message is unchanged
+    assert message_to_json(record, 0)["message"] is serialized["message"]
+
+    copy = pickle.loads(pickle.dumps(record))
+    assert message_to_json(copy, 0)["hash"] == serialized["hash"]
+
+    # same content from another run, with another id
+    other_run = AGESendMessage(
+        message=TextMessage(source="user", content="hi"),
+        sender=None,
+        recipient=AgentId("agent", "other-team"),
+        message_id="message-2",
+    )
+    assert message_to_json(other_run, 0)["hash"] == serialized["hash"]
+
+    # an edited message keeps its id but not its hash
+    record.message = TextMessage(source="user", content="edited")
+    assert message_to_json(record, 0)["hash"] != serialized["hash"]
+
+    # identical responses have the same hash but their own ids
+    response = AGEResponseMessage(message=None, sender=AgentId("agent", "team"), recipient=None)
+    first, second = message_to_json(response, 3), message_to_json(response, 5)
+    assert first["hash"] == second["hash"]
+    assert (first["id"], second["id"]) == ("response-3", "response-5")
+    queued = AGEResponseMessage(message=None, sender=AgentId("agent", "team"), recipient=None)
+    assert message_to_json(queued)["id"] != message_to_json(response)["id"]
@@ -0,0 +1,50 @@
+import pytest
+
+from agdebugger.sessions import SessionTree
+
+
+def messages(*timestamps):
+    return [{"timestamp": ts} for ts in timestamps]
+
+
+def timestamps(session):
+    return [m["timestamp"] for m in session.messages]
+
+
+def test_sessions_share_messages_before_fork():
+    tree = SessionTree()
+    tree.add(0, parent=None, fork_timestamp=None, messages=messages(0, 1, 2, 3, 4))
+    # reverted to 2: keeps 0-2 and continues from 5
+    tree.add(1, parent=0, fork_timestamp=3, messages=messages(5, 6))
+    # reverted to 5: keeps 0-2 and 5
+    tree.add(2, parent=1, fork_timestamp=6, messages=messages(7))
+
+    assert timestamps(tree[0]) == [0, 1, 2, 3, 4]
+    assert timestamps(tree[1]) == [0, 1, 2, 5, 6]
+    assert timestamps(tree[2]) == [0, 1, 2, 5, 7]
+    assert tree[2].current_session_reset_from == 6
+    assert sum(len(node.messages) for node in tree.nodes.values()) == 8
+
+
+def test_fork_before_parent_fork():
+    tree = SessionTree()
+    tree.add(0, parent=None, fork_timestamp=None, messages=messages(0, 1, 2, 3))
+    tree.add(1, parent=0, fork_timestamp=2, messages=messages(4, 5))
+    # edited the first message
+    tree.add(2, parent=1, fork_timestamp=0, messages=messages(6))
+
+    assert timestamps(tree[2]) == [6]
+    assert tree.render_messages(1, end=5) == messages(0, 1, 4)
+
+
+def test_rendered_sessions_are_cached_up_to_size():
+    tree = SessionTree(cache_size=1)
+    tree.add(0, parent=None, fork_timestamp=None, messages=messages(0))
+    tree.add(1, parent=0, fork_timestamp=1, messages=messages(1))
+    assert tree[0] is tree[0]
+    first = tree[0]
+    tree[1]
+    assert tree[0] is not first
+
+    with pytest.raises(KeyError):
+        tree.add(3, parent=2, fork_timestamp=0, messages=[])